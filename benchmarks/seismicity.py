@@ -0,0 +1,369 @@
+#!/usr/bin/env python
+#
+# ======================================================================
+#
+#                           Brad T. Aagaard
+#                        U.S. Geological Survey
+#
+# ======================================================================
+#
+# Benchmarks of the seismicity package using synthetic catalogs.
+#
+# Records the fastest wall time and the peak traced memory of each
+# benchmark for each catalog size. Results can be saved as a baseline
+# and later runs compared against it; the script exits with a nonzero
+# status if a benchmark is slower or uses more memory than the baseline
+# by more than the tolerance.
+#
+# Example:
+#   benchmarks/seismicity.py --sizes 1000,10000 --save-baseline baseline.json
+#   benchmarks/seismicity.py --sizes 1000,10000 --baseline baseline.json
+
+import os
+import io
+import sys
+import copy
+import json
+import time
+import platform
+import argparse
+import tempfile
+import tracemalloc
+import contextlib
+
+import numpy
+import pytz
+
+from obspy.core.utcdatetime import UTCDateTime
+
+import synthetic
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from eqresponse.core.Parameters import Parameters
+from eqresponse.seismicity.Catalog import Catalog
+from eqresponse.seismicity.EventStore import EventStore
+from eqresponse.seismicity.Summary import Summary
+from eqresponse.seismicity.SummarySequences import SummarySequences
+
+SIZES = [1000, 10000, 100000, 1000000]
+
+# Largest catalog loaded with the ObsPy QuakeML reader.
+MAX_OBSPY_EVENTS = 10000
+
+DAY_TO_SECS = 24*3600.0
+YEAR_TO_SECS = 365.25*DAY_TO_SECS
+
+TIMEZONE = "US/Pacific"
+
+# ----------------------------------------------------------------------
+def mainshockEvent():
+    """
+    Create M7 mainshock in the middle of the synthetic catalogs.
+    """
+    from obspy.core.event import Event, Origin, Magnitude, CreationInfo
+
+    origin = Origin(time=UTCDateTime("2015-01-01T00:00:00"), longitude=synthetic.LONGITUDE, latitude=synthetic.LATITUDE, depth=8.0e+3)
+    magnitude = Magnitude(mag=7.0, magnitude_type="mw")
+    event = Event(origins=[origin], magnitudes=[magnitude], creation_info=CreationInfo(version="1", creation_time=UTCDateTime("2015-01-01T01:00:00")))
+    event.preferred_origin_id = origin.resource_id
+    event.preferred_magnitude_id = magnitude.resource_id
+    return event
+
+
+def loadedCatalog(filenames):
+    catalog = Catalog(filenames["quakeml"])
+    catalog.load(streaming=True, cache=True)
+    return catalog
+
+
+def summaryParams():
+    params = Parameters()
+    params.parameters = {
+        'catalog': ("USGS", ""),
+        'background': {
+            'longitude': synthetic.LONGITUDE,
+            'latitude': synthetic.LATITUDE,
+            'maxdist_km': 100.0,
+            },
+        'summary': {
+            'list_minmag': 5.0,
+            'distance_method': "geodesic",
+            },
+        }
+    return params
+
+
+# ----------------------------------------------------------------------
+# Benchmarks: name -> (setup(filenames, nevents) -> state, run(state)).
+
+def setupLoad(filenames, nevents):
+    return filenames["quakeml"]
+
+
+def runLoadStreaming(filename):
+    Catalog(filename).load(streaming=True)
+
+
+def runLoadObspy(filename):
+    Catalog(filename).load()
+
+
+def setupLoadGeoJSON(filenames, nevents):
+    return filenames["geojson"]
+
+
+def runLoadGeoJSON(filename):
+    Catalog(filename).load()
+
+
+def setupLoadFeeds(filenames, nevents):
+    return filenames["geojson"]
+
+
+def runLoadFeeds(filename):
+    Catalog().loadFeeds([filename], starttime="2015-01-01T00:00:00", endtime="2015-02-01T00:00:00", longitude=synthetic.LONGITUDE, latitude=synthetic.LATITUDE, maxdist=0.5, minmag=1.0)
+
+
+def storeFilename(filenames):
+    return os.path.splitext(filenames["geojson"])[0] + ".sqlite"
+
+
+def setupIngest(filenames, nevents):
+    filename = storeFilename(filenames) + ".ingest"
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.isfile(filename + suffix):
+            os.remove(filename + suffix)
+    return (filename, filenames["geojson"])
+
+
+def runIngest(state):
+    (filename, feed) = state
+    store = EventStore(filename)
+    store.ingest(feed)
+    store.close()
+
+
+def setupLoadStore(filenames, nevents):
+    filename = storeFilename(filenames)
+    store = EventStore(filename)
+    store.ingest(filenames["geojson"])
+    store.close()
+    return filename
+
+
+def runLoadStore(filename):
+    Catalog().loadStore(filename, starttime="2015-01-01T00:00:00", endtime="2015-02-01T00:00:00", longitude=synthetic.LONGITUDE, latitude=synthetic.LATITUDE, maxdist=0.5, minmag=1.0)
+
+
+def setupLoadSidecar(filenames, nevents):
+    Catalog(filenames["quakeml"]).load(streaming=True, cache=True)
+    return filenames["quakeml"]
+
+
+def runLoadSidecar(filename):
+    Catalog(filename).load(cache=True)
+
+
+def setupDistance(filenames, nevents):
+    return (loadedCatalog(filenames), mainshockEvent())
+
+
+def runDistanceGeodesic(state):
+    (catalog, mainshock) = state
+    catalog.addDistanceAzimuth(mainshock, method="geodesic")
+
+
+def runDistanceUTM(state):
+    (catalog, mainshock) = state
+    catalog.addDistanceAzimuth(mainshock, method="utm")
+
+
+def setupCatalog(filenames, nevents):
+    return loadedCatalog(filenames)
+
+
+def runHypocenterMag(catalog):
+    catalog.getHypocenterMag()
+
+
+def setupTally(filenames, nevents):
+    catalog = loadedCatalog(filenames)
+    summary = Summary(summaryParams(), UTCDateTime("2020-01-01T00:00:00"), pytz.timezone(TIMEZONE), mainshockEvent(), Catalog(None), catalog, Catalog(None), Catalog(None))
+    return (summary, catalog.table)
+
+
+def runTally(state):
+    (summary, table) = state
+    with contextlib.redirect_stdout(io.StringIO()):
+        summary._printTally(table, [DAY_TO_SECS, 7*DAY_TO_SECS, 30*DAY_TO_SECS, YEAR_TO_SECS], "after_mainshock")
+
+
+def setupSequences(filenames, nevents):
+    background = loadedCatalog(filenames)
+    background.params = {
+        'label': "Background",
+        'minmag': 0.0,
+        'start': "2010-01-01T00:00:00",
+        'end': "2020-01-01T00:00:00",
+        }
+    table = background.table
+    mask = (table["time"] >= UTCDateTime("2015-01-01").timestamp) & (table["time"] < UTCDateTime("2015-02-01").timestamp)
+    sequence = background.select(numpy.nonzero(mask)[0])
+    sequence.params = {
+        'label': "Sequence",
+        'minmag': 0.0,
+        'start': "2015-01-01T00:00:00",
+        'end': "2015-02-01T00:00:00",
+        }
+    summary = SummarySequences(summaryParams(), UTCDateTime("2020-01-01T00:00:00"), pytz.timezone(TIMEZONE))
+    return (summary, background, [sequence])
+
+
+def runSequences(state):
+    (summary, background, sequences) = state
+    with contextlib.redirect_stdout(io.StringIO()):
+        summary.show(background, sequences)
+
+
+def setupParameters(filenames, nevents):
+    from eqresponse.apps.SeismicityApp import SeismicityApp
+
+    user = {
+        'mainshock': "bm0000001",
+        'aftershocks': {'minmag': 2.0, 'maxdist_km': 50.0},
+        'fetch': {'max_concurrent': 8},
+        }
+    return (SeismicityApp().defaults, user)
+
+
+def runParameters(state):
+    (defaults, user) = state
+    for i in range(100):
+        params = Parameters()
+        params.parameters = copy.deepcopy(user)
+        params.initialize(defaults)
+
+
+BENCHMARKS = [
+    ("Catalog.load(streaming)", setupLoad, runLoadStreaming, None),
+    ("Catalog.load(obspy)", setupLoad, runLoadObspy, MAX_OBSPY_EVENTS),
+    ("Catalog.load(sidecar)", setupLoadSidecar, runLoadSidecar, None),
+    ("Catalog.load(geojson)", setupLoadGeoJSON, runLoadGeoJSON, None),
+    ("Catalog.loadFeeds", setupLoadFeeds, runLoadFeeds, None),
+    ("EventStore.ingest", setupIngest, runIngest, None),
+    ("Catalog.loadStore", setupLoadStore, runLoadStore, None),
+    ("Catalog.addDistanceAzimuth(geodesic)", setupDistance, runDistanceGeodesic, None),
+    ("Catalog.addDistanceAzimuth(utm)", setupDistance, runDistanceUTM, None),
+    ("Catalog.getHypocenterMag", setupCatalog, runHypocenterMag, None),
+    ("Summary._printTally", setupTally, runTally, None),
+    ("SummarySequences.show", setupSequences, runSequences, None),
+    ]
+
+# Benchmarks that do not depend on the catalog size.
+FIXED_BENCHMARKS = [
+    ("Parameters.initialize(x100)", setupParameters, runParameters),
+    ]
+
+
+# ----------------------------------------------------------------------
+def measure(setup, run, filenames, nevents, repeat):
+    """
+    Returns fastest wall time (s) and peak traced memory (bytes) of run.
+    """
+    best = None
+    for i in range(repeat):
+        state = setup(filenames, nevents)
+        t0 = time.perf_counter()
+        run(state)
+        elapsed = time.perf_counter() - t0
+        if best is None or elapsed < best:
+            best = elapsed
+
+    state = setup(filenames, nevents)
+    tracemalloc.start()
+    run(state)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return (best, peak)
+
+
+def compare(results, baseline, timeTolerance, memoryTolerance):
+    """
+    Returns list of benchmarks exceeding the baseline by more than the
+    tolerances.
+    """
+    regressions = []
+    for (key, result) in results.items():
+        if not key in baseline:
+            continue
+        reference = baseline[key]
+        if result["time"] > timeTolerance*reference["time"]:
+            regressions.append("%s: time %.4f s > %.4f s" % (key, result["time"], reference["time"]))
+        if result["peak_bytes"] > memoryTolerance*reference["peak_bytes"]:
+            regressions.append("%s: peak memory %.1f MB > %.1f MB" % (key, 1.0e-6*result["peak_bytes"], 1.0e-6*reference["peak_bytes"]))
+    return regressions
+
+
+def report(key, result, baseline):
+    line = "%-50s %10.4f s %10.1f MB" % (key, result["time"], 1.0e-6*result["peak_bytes"])
+    if key in baseline:
+        line += "   (baseline %.4f s, %.1f MB)" % (baseline[key]["time"], 1.0e-6*baseline[key]["peak_bytes"])
+    print(line)
+    sys.stdout.flush()
+    return
+
+
+# ======================================================================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", action="store", dest="sizes", default=",".join([str(n) for n in SIZES]))
+    parser.add_argument("--data-dir", action="store", dest="data_dir", default=os.path.join(tempfile.gettempdir(), "eqresponse-benchmarks"))
+    parser.add_argument("--repeat", action="store", dest="repeat", type=int, default=3)
+    parser.add_argument("--filter", action="store", dest="filter", help="Run only benchmarks whose name contains this string.")
+    parser.add_argument("--baseline", action="store", dest="baseline")
+    parser.add_argument("--save-baseline", action="store", dest="save_baseline")
+    parser.add_argument("--time-tolerance", action="store", dest="time_tolerance", type=float, default=1.5)
+    parser.add_argument("--memory-tolerance", action="store", dest="memory_tolerance", type=float, default=1.2)
+    args = parser.parse_args()
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, "r") as fin:
+            baseline = json.load(fin)["results"]
+
+    results = {}
+    for (name, setup, run) in FIXED_BENCHMARKS:
+        if args.filter and not args.filter in name:
+            continue
+        elapsed, peak = measure(setup, run, None, 0, args.repeat)
+        results[name] = {"time": elapsed, "peak_bytes": peak}
+        report(name, results[name], baseline)
+
+    for nevents in [int(n) for n in args.sizes.split(",")]:
+        filenames = synthetic.generate(nevents, args.data_dir)
+        for (name, setup, run, maxEvents) in BENCHMARKS:
+            if args.filter and not args.filter in name:
+                continue
+            if not maxEvents is None and nevents > maxEvents:
+                continue
+            key = "%s/%d" % (name, nevents)
+            elapsed, peak = measure(setup, run, filenames, nevents, args.repeat)
+            results[key] = {"time": elapsed, "peak_bytes": peak}
+            report(key, results[key], baseline)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as fout:
+            json.dump({
+                "python": platform.python_version(),
+                "numpy": numpy.__version__,
+                "machine": platform.machine(),
+                "results": results,
+                }, fout, indent=2, sort_keys=True)
+
+    regressions = compare(results, baseline, args.time_tolerance, args.memory_tolerance)
+    for regression in regressions:
+        print("REGRESSION %s" % regression)
+    sys.exit(1 if len(regressions) > 0 else 0)
+
+
+# End of file
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+#
+# ======================================================================
+#
+#                           Brad T. Aagaard
+#                        U.S. Geological Survey
+#
+# ======================================================================
+#
+# Check import time of the application modules against a startup budget.
+#
+# Each module is imported in a fresh interpreter several times and the
+# fastest time is reported. Also checks that modules needed only for
+# fetching or plotting are not imported at startup. Exits with a nonzero
+# status if a check fails.
+
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+# Modules imported by the command line entry points.
+MODULES = [
+    "eqresponse.apps.SeismicityApp",
+    "eqresponse.apps.SequencesApp",
+    "eqresponse.apps.IdentifyApp",
+]
+
+# Modules that must not be loaded at startup.
+DEFERRED = [
+    "matplotlib",
+    "obspy.clients.fdsn",
+    "requests",
+    "pyproj",
+    "obspyutils",
+]
+
+SCRIPT = """
+import sys
+import time
+import json
+t0 = time.perf_counter()
+import %(module)s
+elapsed = time.perf_counter() - t0
+loaded = [name for name in %(deferred)r if name in sys.modules]
+print(json.dumps({"elapsed": elapsed, "loaded": loaded}))
+"""
+
+# ----------------------------------------------------------------------
+def measure(module, repeat):
+    """
+    Import module in fresh interpreters. Returns the fastest import time
+    and the deferred modules that were loaded.
+    """
+    env = dict(os.environ)
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env["PYTHONPATH"] = os.pathsep.join([root] + [p for p in env.get("PYTHONPATH", "").split(os.pathsep) if p])
+    best = None
+    loaded = []
+    for i in range(repeat):
+        output = subprocess.check_output([sys.executable, "-c", SCRIPT % {"module": module, "deferred": DEFERRED}], env=env)
+        result = json.loads(output.decode("utf-8").strip().splitlines()[-1])
+        if best is None or result["elapsed"] < best:
+            best = result["elapsed"]
+        loaded = result["loaded"]
+    return (best, loaded)
+
+
+# ======================================================================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--budget", action="store", dest="budget", type=float, default=0.4, help="Import time budget in seconds.")
+    parser.add_argument("--repeat", action="store", dest="repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    ok = True
+    for module in MODULES:
+        elapsed, loaded = measure(module, args.repeat)
+        status = "ok"
+        if elapsed > args.budget:
+            status = "OVER BUDGET"
+            ok = False
+        if len(loaded) > 0:
+            status = "LOADED %s" % ", ".join(loaded)
+            ok = False
+        print("%-36s %6.3f s  %s" % (module, elapsed, status))
+
+    sys.exit(0 if ok else 1)
+
+
+# End of file
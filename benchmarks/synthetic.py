@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+#
+# ======================================================================
+#
+#                           Brad T. Aagaard
+#                        U.S. Geological Survey
+#
+# ======================================================================
+#
+# Synthetic earthquake catalogs for benchmarks.
+#
+# Events are scattered around a center point with Gutenberg-Richter
+# distributed magnitudes (b = 1) and uniformly distributed origin times.
+# Catalogs are written as QuakeML and as USGS GeoJSON feeds.
+
+import os
+
+import numpy
+
+# Center of synthetic seismicity.
+LONGITUDE = -122.0
+LATITUDE = 37.0
+
+# Half-width of region in degrees.
+HALF_WIDTH_DEG = 1.0
+
+START_TIME = "2010-01-01T00:00:00"
+DURATION_DAYS = 3650.0
+
+MIN_MAG = 0.0
+MAX_MAG = 7.5
+
+MAG_TYPES = ["md", "ml", "mw"]
+
+# Number of events written per block.
+BLOCK_SIZE = 10000
+
+QUAKEML_HEADER = """<?xml version='1.0' encoding='utf-8'?>
+<q:quakeml xmlns:q="http://quakeml.org/xmlns/quakeml/1.2" xmlns="http://quakeml.org/xmlns/bed/1.2">
+  <eventParameters publicID="smi:local/catalog/synthetic">
+"""
+
+QUAKEML_EVENT = """    <event publicID="quakeml:earthquake.usgs.gov/fdsnws/event/1/query?eventid=%(eventid)s&amp;format=quakeml">
+      <preferredOriginID>smi:local/origin/%(eventid)s</preferredOriginID>
+      <preferredMagnitudeID>smi:local/magnitude/%(eventid)s</preferredMagnitudeID>
+      <origin publicID="smi:local/origin/%(eventid)s">
+        <time><value>%(time)sZ</value></time>
+        <longitude><value>%(lon).5f</value></longitude>
+        <latitude><value>%(lat).5f</value></latitude>
+        <depth><value>%(depth).1f</value></depth>
+      </origin>
+      <magnitude publicID="smi:local/magnitude/%(eventid)s">
+        <mag><value>%(mag).2f</value></mag>
+        <type>%(magtype)s</type>
+      </magnitude>
+      <creationInfo><creationTime>%(updated)sZ</creationTime></creationInfo>
+    </event>
+"""
+
+QUAKEML_FOOTER = """    <creationInfo><creationTime>%(created)sZ</creationTime></creationInfo>
+  </eventParameters>
+</q:quakeml>
+"""
+
+GEOJSON_FEATURE = """{"type":"Feature","properties":{"mag":%(mag).2f,"place":"synthetic","time":%(timeMs)d,"updated":%(updatedMs)d,"status":"reviewed","type":"earthquake","magType":"%(magtype)s"},"geometry":{"type":"Point","coordinates":[%(lon).5f,%(lat).5f,%(depthKm).2f]},"id":"%(eventid)s"}"""
+
+# ----------------------------------------------------------------------
+class SyntheticCatalog(object):
+    """
+    Synthetic catalog with event arrays generated from a seed.
+    """
+
+    def __init__(self, nevents, seed=0):
+        rng = numpy.random.default_rng(seed)
+        self.nevents = nevents
+
+        t0 = numpy.datetime64(START_TIME, "us").astype(numpy.int64)*1.0e-6
+        self.time = numpy.sort(t0 + DURATION_DAYS*86400.0*rng.random(nevents))
+        self.updated = self.time + 3600.0*rng.random(nevents)
+        self.longitude = LONGITUDE + HALF_WIDTH_DEG*(2.0*rng.random(nevents)-1.0)
+        self.latitude = LATITUDE + HALF_WIDTH_DEG*(2.0*rng.random(nevents)-1.0)
+        self.depth = 20.0e+3*rng.random(nevents)
+        self.mag = numpy.minimum(MIN_MAG - numpy.log10(1.0-rng.random(nevents)), MAX_MAG)
+        self.magtype = rng.integers(0, len(MAG_TYPES), nevents)
+        return
+
+
+    def eventId(self, index):
+        return "bm%07d" % index
+
+
+    def writeQuakeML(self, filename):
+        """
+        Write catalog to QuakeML file.
+        """
+        times = SyntheticCatalog._isoformat(self.time)
+        updated = SyntheticCatalog._isoformat(self.updated)
+        with open(filename, "w") as fout:
+            fout.write(QUAKEML_HEADER)
+            for istart in range(0, self.nevents, BLOCK_SIZE):
+                lines = []
+                for i in range(istart, min(istart+BLOCK_SIZE, self.nevents)):
+                    lines.append(QUAKEML_EVENT % {
+                        'eventid': self.eventId(i),
+                        'time': times[i],
+                        'lon': self.longitude[i],
+                        'lat': self.latitude[i],
+                        'depth': self.depth[i],
+                        'mag': self.mag[i],
+                        'magtype': MAG_TYPES[self.magtype[i]],
+                        'updated': updated[i],
+                        })
+                fout.write("".join(lines))
+            fout.write(QUAKEML_FOOTER % {'created': updated[-1] if self.nevents > 0 else START_TIME})
+        return
+
+
+    def writeGeoJSON(self, filename):
+        """
+        Write catalog to GeoJSON file in the format of the USGS feeds.
+        """
+        generatedMs = int(1000.0*numpy.max(self.updated)) if self.nevents > 0 else 0
+        with open(filename, "w") as fout:
+            fout.write('{"type":"FeatureCollection","metadata":{"generated":%d,"title":"synthetic","count":%d},"features":[' % (generatedMs, self.nevents))
+            for istart in range(0, self.nevents, BLOCK_SIZE):
+                lines = []
+                for i in range(istart, min(istart+BLOCK_SIZE, self.nevents)):
+                    lines.append(GEOJSON_FEATURE % {
+                        'eventid': self.eventId(i),
+                        'timeMs': int(1000.0*self.time[i]),
+                        'updatedMs': int(1000.0*self.updated[i]),
+                        'lon': self.longitude[i],
+                        'lat': self.latitude[i],
+                        'depthKm': 1.0e-3*self.depth[i],
+                        'mag': self.mag[i],
+                        'magtype': MAG_TYPES[self.magtype[i]],
+                        })
+                if istart > 0:
+                    fout.write(",")
+                fout.write(",".join(lines))
+            fout.write("]}\n")
+        return
+
+
+    @staticmethod
+    def _isoformat(seconds):
+        return numpy.datetime_as_string((1.0e+6*seconds).astype("datetime64[us]"), unit="ms")
+
+
+def generate(nevents, directory, seed=0):
+    """
+    Write synthetic QuakeML and GeoJSON catalogs with nevents events to
+    directory unless they already exist. Returns the filenames.
+    """
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    filenames = {
+        "quakeml": os.path.join(directory, "synthetic_%d.xml" % nevents),
+        "geojson": os.path.join(directory, "synthetic_%d.geojson" % nevents),
+        }
+    catalog = None
+    for (format, filename) in filenames.items():
+        if os.path.isfile(filename):
+            continue
+        if catalog is None:
+            catalog = SyntheticCatalog(nevents, seed)
+        tmpFilename = filename + ".tmp"
+        if format == "quakeml":
+            catalog.writeQuakeML(tmpFilename)
+        else:
+            catalog.writeGeoJSON(tmpFilename)
+        os.replace(tmpFilename, filename)
+    return filenames
+
+
+# End of file
@@ -7,6 +7,7 @@ fi
 
 
 FEEDDIR=$HOME/projects/eqresponse-python/data/feeds
+BINDIR=$(dirname $0)
 
 if [ $selection == "month" ]; then
   curl -o ${FEEDDIR}/all_month.xml -O https://earthquake.usgs.gov/earthquakes/feed/v1.0/summary/all_month.quakeml
@@ -24,4 +25,7 @@ else
   echo "Unknown selection '$selection'."
   exit 1
 fi
+
+# Accumulate the events in the event store (feeds are overwritten).
+${BINDIR}/eqresponse_ingest --quiet --store ${FEEDDIR}/events.sqlite ${FEEDDIR}/all_${selection}.geojson || exit 1
 exit 0
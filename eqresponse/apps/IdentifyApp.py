@@ -7,15 +7,19 @@
 #
 
 
-from obspy.clients.fdsn import Client
+import pytz
+
 from obspy.core.utcdatetime import UTCDateTime
 
+from eqresponse.core.TimeFormatter import TimeFormatter
 from eqresponse.seismicity.Catalog import Catalog
-
-import re
+from eqresponse.core.Profiler import Profiler
 
 KM_TO_DEG = 1.0/111.0 # roughly 111 km per latitude degree
 
+# Same as str(UTCDateTime).
+UTC_FORMAT = "%Y-%m-%dT%H:%M:%S.%fZ"
+
 # ----------------------------------------------------------------------
 class IdentifyApp(object):
     """Application for quickly listing earthquakes near a location over a
@@ -25,7 +29,9 @@ class IdentifyApp(object):
 
     def __init__(self, showProgress=True):
         self.showProgress = showProgress
-
+        self.profiler = Profiler(enabled=False)
+        self.cache = None
+        self.cacheTTL = 0.0
         return
 
 
@@ -36,37 +42,46 @@ class IdentifyApp(object):
         (datacenterName, datacenterCatalog) = datacenter.split("/")
 
         catalog = Catalog()
-        catalog.fetch(
-            starttime=UTCDateTime(starttime), 
-            endtime=UTCDateTime(endtime),
-            longitude=longitude,
-            latitude=latitude,
-            maxdist=distkm*KM_TO_DEG,
-            minmag=minmag,
-            catalog=(datacenterName, datacenterCatalog)
-        )
-
-        print("Earthquakes M>=%3.1f:" % minmag)
-        for event in catalog.events:
-            self._printEvent(event)
+        with self.profiler.phase("fetch") as phase:
+            catalog.fetch(
+                starttime=UTCDateTime(starttime), 
+                endtime=UTCDateTime(endtime) if not endtime is None else None,
+                longitude=longitude,
+                latitude=latitude,
+                maxdist=distkm*KM_TO_DEG,
+                minmag=minmag,
+                catalog=(datacenterName, datacenterCatalog),
+                cache=self.cache,
+                ttl=self.cacheTTL
+            )
+            phase.addEvents("events", catalog.count())
+
+        with self.profiler.phase("print"):
+            print("Earthquakes M>=%3.1f:" % minmag)
+            if catalog.count() > 0:
+                self._printEvents(catalog.table)
         return
 
     
-    def _printEvent(self, event):
+    def _printEvents(self, table):
         """
+        Print events in table, with the origin times of all events
+        formatted together.
         """
-        magnitude = event.preferred_magnitude()
-        origin = event.preferred_origin()
-        evstr = event.resource_id.id
-        eventid = re.search("eventid=([A-Za-z]*[0-9]+)", evstr).groups()[0]
-        print("%(tstamp)s   %(lon)8.3f %(lat)6.3f %(depth)4.1fkm  %(mag)4.2f %(magtype)s  %(evid)s" % {
-            'tstamp': origin.time,
-            'lon': origin.longitude,
-            'lat': origin.latitude,
-            'depth': 1.0e-3*origin.depth,
-            'mag': magnitude.mag,
-            'magtype': magnitude.magnitude_type,
-            'evid': eventid})
+        tstamps = TimeFormatter(pytz.utc, UTC_FORMAT).format(table["time"])
+        data = table.data
+        rows = zip(tstamps, data["longitude"].tolist(), data["latitude"].tolist(), (1.0e-3*data["depth"]).tolist(), data["mag"].tolist(), table.magnitudeTypes(slice(None)), data["eventid"].tolist())
+        lines = []
+        for (tstamp, lon, lat, depth, mag, magType, eventid) in rows:
+            lines.append("%(tstamp)s   %(lon)8.3f %(lat)6.3f %(depth)4.1fkm  %(mag)4.2f %(magtype)s  %(evid)s" % {
+                'tstamp': tstamp,
+                'lon': lon,
+                'lat': lat,
+                'depth': depth,
+                'mag': mag,
+                'magtype': magType,
+                'evid': eventid})
+        print("\n".join(lines))
         return
 
 
@@ -8,16 +8,15 @@
 
 
 import os
+import sys
 
 import numpy
-import pytz
-import datetime
 import math
-import pyproj
 
-from obspy.clients.fdsn import Client
 from obspy.core.utcdatetime import UTCDateTime
 
+from eqresponse.core.ResponseCache import ResponseCache
+from eqresponse.core.Profiler import Profiler
 from eqresponse.seismicity.Catalog import Catalog
 from eqresponse.seismicity.Summary import Summary
 from eqresponse.core.Parameters import Parameters
@@ -26,6 +25,22 @@ KM_TO_DEG = 1.0/111.0 # roughly 111 km per latitude degree
 DAY_TO_SECS = 24*3600.0
 YEAR_TO_SECS = 365.25*DAY_TO_SECS
 
+# Order in which overlapping events are assigned to catalogs (after the mainshock).
+CATALOG_PRIORITY = ["significant", "foreshocks", "historical", "aftershocks"]
+
+# ----------------------------------------------------------------------
+class FetchError(Exception):
+    """
+    Error fetching one or more catalogs.
+    """
+
+    def __init__(self, errors):
+        self.errors = errors
+        msg = "; ".join(["%s: %s" % (label, errors[label]) for label in sorted(errors.keys())])
+        Exception.__init__(self, "Error fetching catalogs (%s)." % msg)
+        return
+
+
 # ----------------------------------------------------------------------
 class SeismicityApp(object):
     """
@@ -39,6 +54,7 @@ class SeismicityApp(object):
         self.params = None
         self.tz = None
         self.now = None
+        self.profiler = Profiler(enabled=False)
 
         # Default values of None mean the parameter is based on mainshock values (magnitude).
         self.defaults = {
@@ -47,6 +63,8 @@ class SeismicityApp(object):
             "time_zone": "US/Pacific",
             "fault_azimuth": 143.0,
             "qfaults_region": "sf",
+            "streaming_parser": False,
+            "sidecar_cache": True,
             "foreshocks": {
                 "maxdist_km": 5.0,
                 "minmag": 1.0,
@@ -55,6 +73,8 @@ class SeismicityApp(object):
             "aftershocks": {
                 "maxdist_km": 10.0,
                 "minmag": 0.0,
+                "incremental": False,
+                "source": "fdsn",
             },
             "significant": {
                 "maxdist_km": 20.0,
@@ -72,13 +92,24 @@ class SeismicityApp(object):
                 "aftershocks_list_minmag": 3.0,
                 "historical_list_minmag": 3.0,
                 "significant_list_minmag": 4.0,
+                "distance_method": "geodesic",
+                "format": "text",
             },
             'plot_map': {
                 "width_pixels": 1200,
                 "height_pixels": 1200,
                 "zoom_level": None,
                 "height_km": None,
-                "marker_scale": 0.05
+                "marker_scale": 0.05,
+                "max_points": 20000,
+                "tiles": {
+                    "source": None,
+                    "attribution": None,
+                    "user_agent": None,
+                    "directory": "~/.cache/eqresponse/tiles",
+                    "max_mb": 500.0,
+                    "max_concurrent": 8,
+                },
             },
             'plot_time': {
                 'width': 8.0,
@@ -86,17 +117,55 @@ class SeismicityApp(object):
                 'color': 'blue',
                 'color_edge': 'fg',
                 'marker_scale': 0.08,
+                'max_points': 20000,
+                'dpi': 150,
                 },
             'plot_freqmag': {
                 'width': 5.0,
                 'height': 5.0,
+                'bin_width': 0.1,
+                'bootstrap_samples': 1000,
                 },
             'plot_xsections': {
                 'width': 5.0,
                 'height': 5.0,
                 'marker_scale': 40.0,
+                'max_points': 20000,
+                'dpi': 150,
+                },
+            'render': {
+                'max_workers': 4,
+                },
+            'fetch': {
+                'max_concurrent': 4,
+                'max_events': 10000,
+                'maxdist_scale': 1.0,
+                },
+            'cache': {
+                'directory': "~/.cache/eqresponse/fdsn",
+                'max_mb': 200.0,
+                'ttl_hours': {
+                    'significant': 720.0,
+                    'historical': 720.0,
+                    'foreshocks': 1.0,
+                    'aftershocks': 0.05,
+                    },
+                },
+            'daemon': {
+                'interval_secs': 60.0,
+                'plots': ["plot_time", "plot_xsections", "plot_map", "plot_freqmag"],
+                },
+            'feeds': {
+                'directory': "~/projects/eqresponse-python/data/feeds",
+                'files': ["all_hour.geojson", "all_day.geojson", "all_week.geojson", "all_month.geojson"],
+                'store': "~/projects/eqresponse-python/data/feeds/events.sqlite",
                 },
             'files': {
+                'summary': "summary.txt",
+                'plot_time': "time.png",
+                'plot_xsections': "xsections.png",
+                'plot_map': "map.png",
+                'plot_freqmag': "freqmag.png",
                 'mainshock': "mainshock.xml",
                 'foreshocks': "foreshocks.xml",
                 'aftershocks': "aftershocks.xml",
@@ -113,6 +182,10 @@ class SeismicityApp(object):
         self.aftershocks = Catalog(self.params.get("files/aftershocks"))
         self.historical = Catalog(self.params.get("files/historical"))
         self.significant = Catalog(self.params.get("files/significant"))
+
+        self.cache = None
+        if self.params.get("cache/directory"):
+            self.cache = ResponseCache(self.params.get("cache/directory"), maxBytes=int(self.params.get("cache/max_mb")*1024**2))
         return
 
     
@@ -145,48 +218,40 @@ class SeismicityApp(object):
         if self.showProgress:
             print("Fetching mainshock information from data center...")
 
-        datacenter = self.params.get("catalog")[0]
-        if datacenter == "USGS":
-            services = {'station': None,
-                        'event': "http://earthquake.usgs.gov/fdsnws/event/1",
-                        'dataselect': None}
-            client = Client(datacenter, service_mappings=services, debug=False)
-        else:
-            client = Client(datacenter)
-        catalog = client.get_events(eventid=self.params.get("mainshock"))
-        event = catalog.events[0]
+        from eqresponse.core import ClientRegistry
 
-        event.write(self.params.get("files/mainshock"), format="QUAKEML")
+        with self.profiler.phase("fetch_mainshock") as phase:
+            client = ClientRegistry.getClient(self.params.get("catalog")[0])
+            catalog = client.getEvents(eventid=self.params.get("mainshock"))
+            event = catalog.events[0]
 
+            event.write(self.params.get("files/mainshock"), format="QUAKEML")
+            phase.addEvents("mainshock", 1)
         return
 
 
     def fetchAftershocks(self):
         """
         Fetch event information.
-        """
-        if self.showProgress:
-            print("Fetching aftershock event information from data center...")
 
+        If aftershocks/source is "feeds" or "store", the aftershocks are
+        selected from the downloaded GeoJSON feed files or the event store
+        accumulated from them and merged into the aftershock file instead.
+        """
         mainshock = self._loadMainshock()
-        origin = mainshock.preferred_origin()
+        if self.params.get("aftershocks/source") in ("feeds", "store"):
+            if self.showProgress:
+                print("Updating aftershock event information from %s..." % self.params.get("aftershocks/source"))
+            self._updateAftershocksFromFeeds(mainshock)
+            return
 
-        params = self.params.get("aftershocks")
-        minmag = params['minmag']
-        maxdist = params['maxdist_km']*KM_TO_DEG
-        if "max_duration_days" in params.keys():
-            endtime = origin.time + params['max_duration_days']*DAY_TO_SECS
+        if self.showProgress:
+            print("Fetching aftershock event information from data center...")
+        query = self._aftershocksQuery(mainshock)
+        if self.params.get("aftershocks/incremental"):
+            self.aftershocks.fetchUpdates(**query)
         else:
-            endtime = self.now
-
-        self.aftershocks.fetch(
-            starttime=origin.time+1, 
-            endtime=endtime,
-            longitude=origin.longitude,
-            latitude=origin.latitude,
-            maxdist=maxdist,
-            minmag=minmag,
-            catalog=self.params.get("catalog"))
+            self.aftershocks.fetch(**query)
         return
 
 
@@ -202,7 +267,7 @@ class SeismicityApp(object):
 
         params = self.params.get("significant")
         minmag = params['minmag']
-        maxdist = params['maxdist_km']*KM_TO_DEG
+        maxdist = params['maxdist_km']*self.params.get("fetch/maxdist_scale")*KM_TO_DEG
         starttime = origin.time - params['years']*YEAR_TO_SECS
 
         self.significant.fetch(
@@ -212,7 +277,11 @@ class SeismicityApp(object):
             latitude=origin.latitude,
             maxdist=maxdist,
             minmag=minmag,
-            catalog=self.params.get("catalog"))
+            catalog=self.params.get("catalog"),
+            maxEvents=self.params.get("fetch/max_events"),
+            maxConcurrent=self.params.get("fetch/max_concurrent"),
+            cache=self.cache,
+            ttl=self._cacheTTL("significant"))
         return
 
 
@@ -228,7 +297,7 @@ class SeismicityApp(object):
 
         params = self.params.get("foreshocks")
         minmag = params['minmag']
-        maxdist = params['maxdist_km']*KM_TO_DEG
+        maxdist = params['maxdist_km']*self.params.get("fetch/maxdist_scale")*KM_TO_DEG
         starttime = origin.time - params['days']*DAY_TO_SECS
 
         self.foreshocks.fetch(
@@ -238,7 +307,11 @@ class SeismicityApp(object):
             latitude=origin.latitude,
             maxdist=maxdist,
             minmag=minmag,
-            catalog=self.params.get("catalog"))
+            catalog=self.params.get("catalog"),
+            maxEvents=self.params.get("fetch/max_events"),
+            maxConcurrent=self.params.get("fetch/max_concurrent"),
+            cache=self.cache,
+            ttl=self._cacheTTL("foreshocks"))
         return
 
 
@@ -254,7 +327,7 @@ class SeismicityApp(object):
 
         params = self.params.get("historical")
         minmag = params['minmag']
-        maxdist = params['maxdist_km']*KM_TO_DEG
+        maxdist = params['maxdist_km']*self.params.get("fetch/maxdist_scale")*KM_TO_DEG
         starttime = origin.time - params['years']*YEAR_TO_SECS
 
         self.historical.fetch(
@@ -264,23 +337,463 @@ class SeismicityApp(object):
             latitude=origin.latitude,
             maxdist=maxdist,
             minmag=minmag,
-            catalog=self.params.get("catalog"))
+            catalog=self.params.get("catalog"),
+            maxEvents=self.params.get("fetch/max_events"),
+            maxConcurrent=self.params.get("fetch/max_concurrent"),
+            cache=self.cache,
+            ttl=self._cacheTTL("historical"))
+        return
+
+
+    def fetchCatalogs(self, labels, maxConcurrent=None):
+        """
+        Fetch catalogs ("significant", "historical", "foreshocks",
+        "aftershocks") concurrently.
+
+        A catalog without events in its window is written as an empty
+        catalog. All queries are issued, even if some fail; network and
+        data center errors are collected and raised together in a
+        FetchError. Other errors are raised as is.
+        """
+        from concurrent.futures import ThreadPoolExecutor, as_completed
+        import time
+        from requests.exceptions import RequestException
+        from obspy.core.event import Catalog as EventCatalog, CreationInfo
+        from obspy.clients.fdsn.header import FDSNException, FDSNNoDataException
+        from eqresponse.seismicity.EventTable import EventTable
+
+        fetchers = {
+            "significant": self.fetchSignificant,
+            "historical": self.fetchHistorical,
+            "foreshocks": self.fetchForeshocks,
+            "aftershocks": self.fetchAftershocks,
+            }
+        if maxConcurrent is None:
+            maxConcurrent = self.params.get("fetch/max_concurrent")
+
+        def fetchCatalog(label):
+            catalog = getattr(self, label)
+            try:
+                fetchers[label]()
+            except FDSNNoDataException:
+                catalog.events = EventCatalog(creation_info=CreationInfo(creation_time=UTCDateTime()))
+                catalog.table = EventTable.fromEvents(catalog.events)
+                catalog.write()
+            catalog.load(self.params.get("streaming_parser"), self.params.get("sidecar_cache"))
+            return catalog.count()
+
+        # Load mainshock and set dynamic defaults before starting threads.
+        self._loadMainshock()
+
+        tstart = time.time()
+        errors = {}
+        with self.profiler.phase("fetch"), ThreadPoolExecutor(max_workers=max(1, maxConcurrent)) as executor:
+            futures = dict([(executor.submit(fetchCatalog, label), label) for label in labels])
+            for future in as_completed(futures):
+                label = futures[future]
+                error = future.exception()
+                if error is None:
+                    if self.showProgress:
+                        print("Finished fetching %s (%d events, %.1f s)." % (label, future.result(), time.time()-tstart))
+                elif isinstance(error, (FDSNException, RequestException, OSError)):
+                    errors[label] = error
+                    if self.showProgress:
+                        print("Error fetching %s: %s" % (label, error))
+                else:
+                    raise error
+        if len(errors) > 0:
+            raise FetchError(errors)
+        return
+
+
+    def fetchCombined(self, labels=None):
+        """
+        Fetch significant, historical, foreshock, and aftershock catalogs
+        with one query per cache TTL and partition the events locally.
+
+        Catalogs with the same cache TTL (significant and historical, by
+        default) share a query covering their union (largest distance,
+        smallest minimum magnitude, and full time span), so it may return
+        more events than the individual queries combined; large queries
+        are split into time windows by Catalog.fetch. Events returned by
+        more than one query are merged by event id. Each event
+        is assigned to at most one catalog with priority mainshock >
+        significant > foreshocks > historical > aftershocks.
+        """
+        from obspy.core.event import Catalog as EventCatalog
+        from obspy.clients.fdsn.header import FDSNNoDataException
+        from eqresponse.seismicity.EventTable import EventTable
+
+        if labels is None:
+            labels = CATALOG_PRIORITY
+        if self.showProgress:
+            print("Fetching combined seismicity information from data center...")
+
+        with self.profiler.phase("fetch_combined") as phase:
+            mainshock = self._loadMainshock()
+            origin = mainshock.preferred_origin()
+            t0 = origin.time.timestamp
+
+            # Selection criteria: (starttime, endtime, maxdist_km, minmag).
+            # Aftershocks without a maximum duration are open-ended
+            # (endtime is infinite).
+            criteria = {}
+            scale = self.params.get("fetch/maxdist_scale")
+            for label in labels:
+                params = self.params.get(label)
+                if label == "aftershocks":
+                    if "max_duration_days" in params.keys():
+                        endtime = (origin.time + params['max_duration_days']*DAY_TO_SECS).timestamp
+                    else:
+                        endtime = numpy.inf
+                    criteria[label] = (t0+1, endtime, scale*params['maxdist_km'], params['minmag'])
+                elif label == "foreshocks":
+                    criteria[label] = (t0-params['days']*DAY_TO_SECS, t0-1, scale*params['maxdist_km'], params['minmag'])
+                else:
+                    criteria[label] = (t0-params['years']*YEAR_TO_SECS, t0-1, scale*params['maxdist_km'], params['minmag'])
+
+            # One query per cache TTL, so catalogs that are revalidated
+            # often (aftershocks) do not force revalidation of the long
+            # queries before the mainshock.
+            groups = {}
+            for label in criteria.keys():
+                groups.setdefault(self._cacheTTL(label), []).append(criteria[label])
+            combined = Catalog()
+            for ttl in sorted(groups.keys(), reverse=True):
+                group = groups[ttl]
+                endtime = max([c[1] for c in group])
+                catalog = Catalog()
+                try:
+                    catalog.fetch(
+                        starttime=UTCDateTime(min([c[0] for c in group])),
+                        endtime=UTCDateTime(endtime) if numpy.isfinite(endtime) else None,
+                        longitude=origin.longitude,
+                        latitude=origin.latitude,
+                        maxdist=max([c[2] for c in group])*KM_TO_DEG,
+                        minmag=min([c[3] for c in group]),
+                        catalog=self.params.get("catalog"),
+                        maxEvents=self.params.get("fetch/max_events"),
+                        maxConcurrent=self.params.get("fetch/max_concurrent"),
+                        cache=self.cache,
+                        ttl=ttl)
+                except FDSNNoDataException:
+                    continue
+                combined.merge(catalog)
+            if combined.count() == 0:
+                combined.events = EventCatalog()
+                combined.table = EventTable()
+            with self.profiler.phase("distance"):
+                combined.addDistanceAzimuth(mainshock, self.params.get("summary/distance_method"))
+
+            # Event id index of catalog assignments, in priority order.
+            owner = {self.mainshock.table["eventid"][0]: "mainshock"}
+            table = combined.table
+            for label in [label for label in CATALOG_PRIORITY if label in criteria]:
+                (starttime, endtime, maxdist, minmag) = criteria[label]
+                # Same distance metric (spherical degrees) as the queries.
+                mask = EventTable.selectionMask(table.data, longitude=origin.longitude, latitude=origin.latitude, maxdist=maxdist*KM_TO_DEG)
+                mask &= (table["time"] >= starttime) & (table["time"] <= endtime) & (table["mag"] >= minmag)
+                indices = [i for i in numpy.nonzero(mask)[0] if not table["eventid"][i] in owner]
+                for i in indices:
+                    owner[table["eventid"][i]] = label
+                subset = combined.select(indices)
+                catalog = getattr(self, label)
+                catalog.events = subset.events
+                catalog.table = subset.table
+                catalog.write()
+                phase.addEvents(label, len(indices))
+                if self.showProgress:
+                    print("Selected %d %s." % (len(indices), label))
+        return
+
+
+    def plotTime(self):
+        """
+        Plot magnitude and cumulative number of foreshocks and aftershocks
+        versus time.
+        """
+        self.plotFigures(["plot_time"])
+        return
+
+
+    def plotXSections(self):
+        """
+        Plot cross sections of foreshocks and aftershocks along and
+        perpendicular to the fault strike.
+        """
+        self.plotFigures(["plot_xsections"])
+        return
+
+
+    def plotMap(self):
+        """
+        Plot map of the catalogs around the mainshock on a tiled basemap.
+        """
+        self.plotFigures(["plot_map"])
+        return
+
+
+    def plotGutenbergRichter(self):
+        """
+        Plot frequency-magnitude distributions of the catalogs.
+        """
+        self.plotFigures(["plot_freqmag"])
+        return
+
+
+    def plotFigures(self, labels):
+        """
+        Render figures ("plot_time", "plot_xsections", "plot_map",
+        "plot_freqmag")
+        concurrently from a single load of the catalogs.
+
+        The event tables are shared with the rendering processes, so the
+        total time is close to that of the slowest figure.
+        """
+        from eqresponse.plot.Renderer import Renderer
+
+        with self.profiler.phase(labels[0] if len(labels) == 1 else "plot"):
+            mainshock = self._loadCatalogs()
+            origin = mainshock.preferred_origin()
+            mag = mainshock.preferred_magnitude().mag
+            title = self.params.get("title")
+
+            renderer = Renderer(self.params.get("render/max_workers"))
+            for label in CATALOG_PRIORITY:
+                renderer.addTable(label, getattr(self, label).table)
+            for label in labels:
+                kwargs = {
+                    "params": self.params.get(label),
+                    "filename": self.params.get("files/%s" % label),
+                    "title": title,
+                    }
+                if label == "plot_time":
+                    renderer.addFigure(label, SeismicityApp._renderTime, mainshock=(origin.time.timestamp, mag), **kwargs)
+                elif label == "plot_xsections":
+                    depthKm = 1.0e-3*origin.depth if not origin.depth is None else 0.0
+                    renderer.addFigure(label, SeismicityApp._renderXSections, epicenter=(origin.longitude, origin.latitude), strike=self.params.get("fault_azimuth"), mainshock=(depthKm, mag), **kwargs)
+                elif label == "plot_map":
+                    renderer.addFigure(label, SeismicityApp._renderMap, center=(origin.longitude, origin.latitude), mainshock=mag, **kwargs)
+                elif label == "plot_freqmag":
+                    renderer.addFigure(label, SeismicityApp._renderGutenbergRichter, **kwargs)
+                else:
+                    raise ValueError("Unknown figure '%s'." % label)
+            elapsed = renderer.run()
+            if self.showProgress:
+                for label in labels:
+                    print("Rendered %s (%.1f s)." % (self.params.get("files/%s" % label), elapsed[label]))
+        return
+
+
+    @staticmethod
+    def _renderTime(tables, params, mainshock, filename, title):
+        from eqresponse.plot.PlotTime import PlotTime
+
+        plot = PlotTime(params)
+        plot.addCatalog("Foreshocks", tables["foreshocks"], "gray")
+        plot.addCatalog("Aftershocks", tables["aftershocks"])
+        plot.addMainshock(*mainshock)
+        plot.save(filename, title=title)
+        return
+
+
+    @staticmethod
+    def _renderXSections(tables, params, epicenter, strike, mainshock, filename, title):
+        from eqresponse.plot.PlotXSections import PlotXSections
+
+        plot = PlotXSections(params, epicenter[0], epicenter[1], strike)
+        plot.addCatalog("Foreshocks", tables["foreshocks"], "gray")
+        plot.addCatalog("Aftershocks", tables["aftershocks"], "blue")
+        plot.addMainshock(*mainshock)
+        plot.save(filename, title=title)
+        return
+
+
+    @staticmethod
+    def _renderMap(tables, params, center, mainshock, filename, title):
+        from eqresponse.plot.PlotMap import PlotMap
+
+        plot = PlotMap(params, center[0], center[1], tiles=PlotMap.tileCache(params))
+        plot.addCatalog("Significant", tables["significant"], "orange")
+        plot.addCatalog("Historical", tables["historical"], "gray")
+        plot.addCatalog("Foreshocks", tables["foreshocks"], "green")
+        plot.addCatalog("Aftershocks", tables["aftershocks"], "blue")
+        plot.addMainshock(mainshock)
+        plot.save(filename, title=title)
+        return
+
+
+    @staticmethod
+    def _renderGutenbergRichter(tables, params, filename, title):
+        from eqresponse.seismicity.FreqMag import FreqMag
+        from eqresponse.plot.PlotGutenbergRichter import PlotGutenbergRichter
+
+        plot = PlotGutenbergRichter(params)
+        for label in ["aftershocks", "foreshocks", "historical", "significant"]:
+            table = tables[label]
+            if table.count() > 0:
+                plot.addCatalog(label.capitalize(), FreqMag(table["mag"], params['bin_width']))
+        plot.save(filename, title=title)
         return
 
 
     def printSummary(self):
+        """
+        Print summary as summary/format ("text", "json", or "geojson").
+        """
+        with self.profiler.phase("load") as phase:
+            mainshock = self._loadCatalogs()
+            for label in CATALOG_PRIORITY:
+                phase.addEvents(label, getattr(self, label).count())
+        with self.profiler.phase("distance"):
+            summary = Summary(self.params, self.now, self.tz, mainshock, self.foreshocks, self.aftershocks, self.historical, self.significant)
+        with self.profiler.phase("summary"):
+            format = self.params.get("summary/format")
+            if format == "text":
+                summary.show()
+            else:
+                sys.stdout.write(summary.dumps(format))
+        return
 
-        mainshock = self._loadMainshock()
-        self.foreshocks.load()
-        self.aftershocks.load()
-        self.historical.load()
-        self.significant.load()
-        
+
+    def writeSummary(self, filename=None):
+        """
+        Write summary as summary/format ("text", "json", or "geojson") to
+        file atomically.
+        """
+        import io
+        import contextlib
+
+        if filename is None:
+            filename = self.params.get("files/summary")
+        mainshock = self._loadCatalogs()
         summary = Summary(self.params, self.now, self.tz, mainshock, self.foreshocks, self.aftershocks, self.historical, self.significant)
-        summary.show()
+        format = self.params.get("summary/format")
+        if format == "text":
+            buffer = io.StringIO()
+            with contextlib.redirect_stdout(buffer):
+                summary.show()
+            text = buffer.getvalue()
+        else:
+            text = summary.dumps(format)
+        tmpFilename = filename + ".tmp"
+        with open(tmpFilename, "w") as fout:
+            fout.write(text)
+        os.replace(tmpFilename, filename)
         return
+
+
+    def runDaemon(self, interval=None, maxIterations=None, plotLabels=None):
+        """
+        Keep the mainshock and catalogs in memory and refresh the
+        aftershocks every interval seconds.
+
+        Each refresh fetches only new or updated aftershocks; distances
+        and azimuths are computed only for those events. The aftershock
+        file and the figures in plotLabels (default is daemon/plots) are
+        rewritten only if the aftershocks changed, and the summary is
+        rewritten atomically after every refresh.
+
+        Network, data center, and event store errors are reported and
+        the refresh is retried at the next interval; other errors are
+        raised.
+        """
+        import time
+        import sqlite3
+        import traceback
+        from requests.exceptions import RequestException
+        from obspy.clients.fdsn.header import FDSNException
+
+        if interval is None:
+            interval = self.params.get("daemon/interval_secs")
+        if plotLabels is None:
+            plotLabels = self.params.get("daemon/plots")
+
+        mainshock = self._loadCatalogs()
+        iteration = 0
+        while True:
+            tstart = time.time()
+            self.now = UTCDateTime()
+            try:
+                if self.params.get("aftershocks/source") in ("feeds", "store"):
+                    nupdates = self._updateAftershocksFromFeeds(mainshock, write=False)
+                else:
+                    nupdates = self.aftershocks.fetchUpdates(write=False, **self._aftershocksQuery(mainshock))
+            except (FDSNException, RequestException, OSError, sqlite3.OperationalError) as err:
+                nupdates = 0
+                print("Error updating aftershocks: %s" % err, file=sys.stderr)
+                traceback.print_exc()
+            if nupdates > 0:
+                self.aftershocks.write()
+            self.writeSummary()
+            if nupdates > 0 and len(plotLabels) > 0:
+                self.plotFigures(plotLabels)
+            if self.showProgress:
+                print("%s: %d new or updated aftershocks, %d total (%.2f s)." % (self.now, nupdates, self.aftershocks.count(), time.time()-tstart))
+
+            iteration += 1
+            if not maxIterations is None and iteration >= maxIterations:
+                break
+            time.sleep(max(0.0, interval - (time.time()-tstart)))
+        return
+
+
+    def _aftershocksQuery(self, mainshock):
+        origin = mainshock.preferred_origin()
+
+        params = self.params.get("aftershocks")
+        # Queries without an end time are open-ended, so the cache key
+        # does not change from run to run.
+        if "max_duration_days" in params.keys():
+            endtime = origin.time + params['max_duration_days']*DAY_TO_SECS
+        else:
+            endtime = None
+        return {
+            "starttime": origin.time+1,
+            "endtime": endtime,
+            "longitude": origin.longitude,
+            "latitude": origin.latitude,
+            "maxdist": params['maxdist_km']*self.params.get("fetch/maxdist_scale")*KM_TO_DEG,
+            "minmag": params['minmag'],
+            "catalog": self.params.get("catalog"),
+            "maxEvents": self.params.get("fetch/max_events"),
+            "maxConcurrent": self.params.get("fetch/max_concurrent"),
+            "cache": self.cache,
+            "ttl": self._cacheTTL("aftershocks"),
+            }
+
+
+    def _updateAftershocksFromFeeds(self, mainshock, write=True):
+        """
+        Merge new or updated aftershocks in the GeoJSON feed files (or the
+        event store if aftershocks/source is "store") into the aftershock
+        catalog. Returns the number of new or updated events.
+        """
+        query = self._aftershocksQuery(mainshock)
+        selection = dict([(key, query[key]) for key in ("starttime", "endtime", "longitude", "latitude", "maxdist", "minmag")])
+        if self.params.get("aftershocks/source") == "store":
+            return self.aftershocks.fetchStoreUpdates(os.path.expanduser(self.params.get("feeds/store")), write=write, **selection)
+
+        directory = os.path.expanduser(self.params.get("feeds/directory"))
+        filenames = [os.path.join(directory, filename) for filename in self.params.get("feeds/files")]
+        return self.aftershocks.fetchFeedUpdates(filenames, cache=self.params.get("sidecar_cache"), write=write, **selection)
+
+
+    def _loadCatalogs(self):
+        mainshock = self._loadMainshock()
+        streaming = self.params.get("streaming_parser")
+        cache = self.params.get("sidecar_cache")
+        self.foreshocks.load(streaming, cache)
+        self.aftershocks.load(streaming, cache)
+        self.historical.load(streaming, cache)
+        self.significant.load(streaming, cache)
+        return mainshock
     
 
+    def _cacheTTL(self, label):
+        return 3600.0*self.params.get("cache/ttl_hours/%s" % label)
+
+
     def _loadMainshock(self):
         self.mainshock.load()
         self._setDynamicDefaults()
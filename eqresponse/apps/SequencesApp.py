@@ -8,16 +8,15 @@
 
 
 import os
+import sys
+import math
 
 import numpy
-import pytz
-import datetime
-import math
-import pyproj
 
-from obspy.clients.fdsn import Client
 from obspy.core.utcdatetime import UTCDateTime
 
+from eqresponse.core.ResponseCache import ResponseCache
+from eqresponse.core.Profiler import Profiler
 from eqresponse.seismicity.Catalog import Catalog
 from eqresponse.seismicity.SummarySequences import SummarySequences
 from eqresponse.core.Parameters import Parameters
@@ -26,11 +25,6 @@ KM_TO_DEG = 1.0/111.0 # roughly 111 km per latitude degree
 DAY_TO_SECS = 24*3600.0
 YEAR_TO_SECS = 365.25*DAY_TO_SECS
 
-# :TODO: Remove sequences events from background.
-
-# :TODO: Consider optimizing retrieval by splitting background retrieval into 
-# time windows between sequences
-
 # ----------------------------------------------------------------------
 class SequencesApp(object):
     """
@@ -44,6 +38,7 @@ class SequencesApp(object):
         self.params = None
         self.tz = None
         self.now = None
+        self.profiler = Profiler(enabled=False)
 
         # Default values of None mean the parameter is based on mainshock values (magnitude).
         self.defaults = {
@@ -52,6 +47,8 @@ class SequencesApp(object):
             "time_zone": "US/Pacific",
             "fault_azimuth": 143.0,
             "qfaults_region": "sf",
+            "streaming_parser": False,
+            "sidecar_cache": True,
             "background": {
                 "start": None,
                 "end": None,
@@ -60,17 +57,28 @@ class SequencesApp(object):
                 "maxdist_km": 100.0,
                 "min_mag": 4.0,
                 "color": "gray",
+                "decluster": None,
             },
             "sequences": [],
             'summary': {
                 "list_minmag": 5.0,
+                "format": "text",
             },
             'plot_map': {
                 "width_pixels": 1200,
                 "height_pixels": 1200,
                 "zoom_level": None,
                 "height_km": 250,
-                "marker_scale": 0.05
+                "marker_scale": 0.05,
+                "max_points": 20000,
+                "tiles": {
+                    "source": None,
+                    "attribution": None,
+                    "user_agent": None,
+                    "directory": "~/.cache/eqresponse/tiles",
+                    "max_mb": 500.0,
+                    "max_concurrent": 8,
+                },
             },
             'plot_time': {
                 'width': 8.0,
@@ -78,18 +86,43 @@ class SequencesApp(object):
                 'color': 'blue',
                 'color_edge': 'fg',
                 'marker_scale': 0.08,
+                'max_points': 20000,
+                'dpi': 150,
                 },
             'plot_freqmag': {
                 'width': 5.0,
                 'height': 5.0,
+                'bin_width': 0.1,
+                'bootstrap_samples': 1000,
                 },
             'plot_xsections': {
                 'width': 5.0,
                 'height': 5.0,
                 'marker_scale': 40.0,
+                'max_points': 20000,
+                'dpi': 150,
+                },
+            'render': {
+                'max_workers': 4,
+                },
+            'fetch': {
+                'max_concurrent': 4,
+                'max_events': 10000,
+                },
+            'cache': {
+                'directory': "~/.cache/eqresponse/fdsn",
+                'max_mb': 200.0,
+                'ttl_hours': {
+                    'background': 24.0,
+                    'sequences': 24.0,
+                    },
                 },
             'files': {
                 'background': "background.xml",
+                'plot_time': "time.png",
+                'plot_xsections': "xsections.png",
+                'plot_map': "map.png",
+                'plot_freqmag': "freqmag.png",
                 'sequence': "sequence_%s.xml",
                 },
         }
@@ -107,6 +140,10 @@ class SequencesApp(object):
             sequence = Catalog(filename)
             setattr(sequence, "params", p)
             self.sequences.append(sequence)
+
+        self.cache = None
+        if self.params.get("cache/directory"):
+            self.cache = ResponseCache(self.params.get("cache/directory"), maxBytes=int(self.params.get("cache/max_mb")*1024**2))
         return
 
     
@@ -118,14 +155,19 @@ class SequencesApp(object):
             print("Fetching background event information from data center...")
 
         params = self.params.get("background")
-        self.background.fetch(
-            starttime=params['start'],
-            endtime=params['end'],
-            longitude=params['longitude'],
-            latitude=params['latitude'],
-            maxdist=params['maxdist_km']*KM_TO_DEG,
-            minmag=params['minmag'],
-            catalog=self.params.get("catalog"))
+        with self.profiler.phase("fetch_background"):
+            self.background.fetch(
+                starttime=params['start'],
+                endtime=params['end'],
+                longitude=params['longitude'],
+                latitude=params['latitude'],
+                maxdist=params['maxdist_km']*KM_TO_DEG,
+                minmag=params['minmag'],
+                catalog=self.params.get("catalog"),
+                maxEvents=self.params.get("fetch/max_events"),
+                maxConcurrent=self.params.get("fetch/max_concurrent"),
+                cache=self.cache,
+                ttl=3600.0*self.params.get("cache/ttl_hours/background"))
         return
 
 
@@ -138,26 +180,226 @@ class SequencesApp(object):
             if self.showProgress:
                 print("Fetching seismicity information for '%s' from data center..." % params['label'])
 
-            sequence.fetch(
-                starttime=params['start'],
-                endtime=params['end'],
-                longitude=self.params.get("background/longitude"),
-                latitude=self.params.get("background/latitude"),
-                maxdist=self.params.get("background/maxdist_km")*KM_TO_DEG,
-                minmag=params['minmag'],
-                catalog=self.params.get("catalog"),
-            )
+            with self.profiler.phase("fetch_sequence:%s" % params['label']):
+                sequence.fetch(
+                    starttime=params['start'],
+                    endtime=params['end'],
+                    longitude=self.params.get("background/longitude"),
+                    latitude=self.params.get("background/latitude"),
+                    maxdist=self.params.get("background/maxdist_km")*KM_TO_DEG,
+                    minmag=params['minmag'],
+                    catalog=self.params.get("catalog"),
+                    maxEvents=self.params.get("fetch/max_events"),
+                    maxConcurrent=self.params.get("fetch/max_concurrent"),
+                    cache=self.cache,
+                    ttl=3600.0*self.params.get("cache/ttl_hours/sequences"),
+                )
+        return
+
+
+    def plotTime(self):
+        """
+        Plot magnitude and cumulative number of events in the background
+        and sequences versus time.
+        """
+        self.plotFigures(["plot_time"])
+        return
+
+
+    def plotXSections(self):
+        """
+        Plot cross sections of the background and sequences along and
+        perpendicular to the fault strike through the background center.
+        """
+        self.plotFigures(["plot_xsections"])
+        return
+
+
+    def plotMap(self):
+        """
+        Plot map of the background and sequences on a tiled basemap.
+        """
+        self.plotFigures(["plot_map"])
+        return
+
+
+    def plotGutenbergRichter(self):
+        """
+        Plot frequency-magnitude distributions of the background and
+        sequences.
+        """
+        self.plotFigures(["plot_freqmag"])
+        return
+
+
+    def plotFigures(self, labels):
+        """
+        Render figures ("plot_time", "plot_xsections", "plot_map",
+        "plot_freqmag")
+        concurrently from a single load of the catalogs.
+
+        The background is the same as in the summary, without the events
+        in the sequences (and declustered if background/decluster is
+        set), so events are not shown twice.
+        """
+        from eqresponse.plot.Renderer import Renderer
+
+        with self.profiler.phase(labels[0] if len(labels) == 1 else "plot"):
+            streaming = self.params.get("streaming_parser")
+            cache = self.params.get("sidecar_cache")
+            renderer = Renderer(self.params.get("render/max_workers"))
+
+            for catalog in [self.background] + self.sequences:
+                catalog.load(streaming, cache)
+            with self.profiler.phase("decluster"):
+                background = self._declusteredBackground()
+
+            # Catalogs in the figures: (table name, label, color)
+            catalogs = []
+            for (i, catalog) in enumerate([background] + self.sequences):
+                if catalog.count() > 0:
+                    name = "catalog%d" % i
+                    renderer.addTable(name, catalog.table)
+                    catalogs.append((name, catalog.params.get('label', "Background"), catalog.params.get('color')))
+
+            for label in labels:
+                kwargs = {
+                    "params": self.params.get(label),
+                    "catalogs": catalogs,
+                    "filename": self.params.get("files/%s" % label),
+                    "title": self.params.get("title"),
+                    }
+                if label == "plot_time":
+                    renderer.addFigure(label, SequencesApp._renderTime, **kwargs)
+                elif label == "plot_xsections":
+                    renderer.addFigure(label, SequencesApp._renderXSections, center=self._center(), strike=self.params.get("fault_azimuth"), **kwargs)
+                elif label == "plot_map":
+                    self.params.setDefault("plot_map/zoom_level", int(12-math.floor(self.params.get("plot_map/height_km")/75.0)))
+                    kwargs["params"] = self.params.get(label)
+                    renderer.addFigure(label, SequencesApp._renderMap, center=self._center(), **kwargs)
+                elif label == "plot_freqmag":
+                    renderer.addFigure(label, SequencesApp._renderGutenbergRichter, **kwargs)
+                else:
+                    raise ValueError("Unknown figure '%s'." % label)
+            elapsed = renderer.run()
+            if self.showProgress:
+                for label in labels:
+                    print("Rendered %s (%.1f s)." % (self.params.get("files/%s" % label), elapsed[label]))
+        return
+
+
+    @staticmethod
+    def _renderTime(tables, params, catalogs, filename, title):
+        from eqresponse.plot.PlotTime import PlotTime
+
+        plot = PlotTime(params)
+        for (name, label, color) in catalogs:
+            plot.addCatalog(label, tables[name], color)
+        plot.save(filename, title=title)
+        return
+
+
+    @staticmethod
+    def _renderXSections(tables, params, catalogs, center, strike, filename, title):
+        from eqresponse.plot.PlotXSections import PlotXSections
+
+        plot = PlotXSections(params, center[0], center[1], strike)
+        for (name, label, color) in catalogs:
+            plot.addCatalog(label, tables[name], color)
+        plot.save(filename, title=title)
+        return
+
+
+    @staticmethod
+    def _renderMap(tables, params, catalogs, center, filename, title):
+        from eqresponse.plot.PlotMap import PlotMap
+
+        plot = PlotMap(params, center[0], center[1], tiles=PlotMap.tileCache(params))
+        for (name, label, color) in catalogs:
+            plot.addCatalog(label, tables[name], color)
+        plot.save(filename, title=title)
         return
 
 
+    @staticmethod
+    def _renderGutenbergRichter(tables, params, catalogs, filename, title):
+        from eqresponse.seismicity.FreqMag import FreqMag
+        from eqresponse.plot.PlotGutenbergRichter import PlotGutenbergRichter
+
+        plot = PlotGutenbergRichter(params)
+        for (name, label, color) in catalogs:
+            plot.addCatalog(label, FreqMag(tables[name]["mag"], params['bin_width']), color)
+        plot.save(filename, title=title)
+        return
+
+
+    def _center(self):
+        """
+        Get center (longitude, latitude) of background region, defaulting
+        to the median epicenter of the background events.
+        """
+        longitude = self.params.get("background/longitude")
+        latitude = self.params.get("background/latitude")
+        if longitude is None or latitude is None:
+            table = self.background.table
+            if table is None or table.count() == 0:
+                return (0.0, 0.0)
+            longitude = float(numpy.nanmedian(table["longitude"]))
+            latitude = float(numpy.nanmedian(table["latitude"]))
+        return (longitude, latitude)
+
+
     def printSummary(self):
-        self.background.load()
-        for sequence in self.sequences:
-            sequence.load()
+        """
+        Print summary as summary/format ("text", "json", or "geojson").
+        """
+        streaming = self.params.get("streaming_parser")
+        cache = self.params.get("sidecar_cache")
+        with self.profiler.phase("load") as phase:
+            self.background.load(streaming, cache)
+            phase.addEvents("background", self.background.count())
+            for sequence in self.sequences:
+                sequence.load(streaming, cache)
+                phase.addEvents(sequence.params['label'], sequence.count())
+
+        with self.profiler.phase("decluster"):
+            background = self._declusteredBackground()
 
-        summary = SummarySequences(self.params, self.now, self.tz)
-        summary.show(self.background, self.sequences)
+        with self.profiler.phase("summary"):
+            summary = SummarySequences(self.params, self.now, self.tz)
+            format = self.params.get("summary/format")
+            if format == "text":
+                summary.show(background, self.sequences)
+            else:
+                sys.stdout.write(summary.dumps(background, self.sequences, format))
         return
+
+
+    def _declusteredBackground(self):
+        """
+        Get background catalog without the events in the sequences and,
+        if background/decluster is "gardner_knopoff" or "reasenberg",
+        without the events that depend on a larger event.
+        """
+        from eqresponse.seismicity.Decluster import Decluster
+
+        table = self.background.table
+        if table is None:
+            return self.background
+
+        mask = numpy.ones(table.count(), dtype=bool)
+        sequenceIds = [sequence.table["eventid"] for sequence in self.sequences if sequence.count() > 0]
+        if len(sequenceIds) > 0:
+            mask &= ~numpy.isin(table["eventid"], numpy.concatenate(sequenceIds))
+
+        method = self.params.get("background/decluster")
+        if method:
+            (clusters, independent) = Decluster(table, self.background.spatialIndex()).run(method)
+            mask &= independent
+
+        background = self.background.select(numpy.nonzero(mask)[0])
+        setattr(background, "params", self.background.params)
+        return background
     
 
 # End of file
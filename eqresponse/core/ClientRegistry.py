@@ -0,0 +1,155 @@
+# ======================================================================
+#
+#                           Brad T. Aagaard
+#                        U.S. Geological Survey
+#
+# ======================================================================
+#
+
+import io
+import threading
+
+import requests
+from obspy import read_events
+from obspy.clients.fdsn import Client
+from obspy.clients.fdsn.client import build_url, convert_to_string, raise_on_error
+from obspy.clients.fdsn.header import FDSNException
+
+from eqresponse.core import Profiler
+
+# Service mappings for data centers that need them.
+SERVICE_MAPPINGS = {
+    "USGS": {
+        'station': None,
+        'event': "http://earthquake.usgs.gov/fdsnws/event/1",
+        'dataselect': None,
+        },
+}
+
+# Maximum number of HTTP connections kept alive per host.
+POOL_SIZE = 16
+
+# ----------------------------------------------------------------------
+class PooledClient(Client):
+    """
+    FDSN client that keeps HTTP connections alive by sending event
+    queries through a shared requests session.
+
+    Service discovery (and other ObsPy client methods) use the ObsPy URL
+    openers as usual; queryEvents, getEvents, and countEvents build the
+    event service URL from the discovered services and send the request
+    through the session.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self._session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        self.serviceMappings = dict(kwargs.get("service_mappings") or {})
+        Client.__init__(self, *args, **kwargs)
+        return
+
+
+    def queryEvents(self, **params):
+        """
+        Get QuakeML (bytes) for FDSN event query parameters. Raises the
+        same exceptions as get_events (FDSNNoDataException if no events
+        match the query).
+        """
+        response = self._get(self._eventUrl("query", params))
+        if response.status_code != 200:
+            raise_on_error(response.status_code, io.BytesIO(response.content))
+        return response.content
+
+
+    def getEvents(self, filename=None, **params):
+        """
+        Get events matching FDSN event query parameters as in get_events.
+        If filename (path or file-like object) is given, the QuakeML
+        response is written to it instead of being parsed.
+        """
+        data = self.queryEvents(**params)
+        if filename is None:
+            return read_events(io.BytesIO(data), format="QUAKEML")
+        if hasattr(filename, "write"):
+            filename.write(data)
+        else:
+            with open(filename, "wb") as fout:
+                fout.write(data)
+        return None
+
+
+    def countEvents(self, **params):
+        """
+        Get number of events matching FDSN event query parameters from
+        the count method of the event service. Returns None if the data
+        center does not support it or the request fails.
+        """
+        try:
+            response = self._get(self._eventUrl("count", params))
+        except FDSNException:
+            return None
+        if response.status_code != 200:
+            return None
+        try:
+            return int(response.content.decode("ascii").strip())
+        except (UnicodeDecodeError, ValueError):
+            return None
+
+
+    def _eventUrl(self, method, params):
+        values = dict([(key, convert_to_string(value)) for (key, value) in params.items() if not value is None])
+        mappings = dict([(service, url.rstrip("/")) for (service, url) in self.serviceMappings.items() if url])
+        return build_url(self.base_url, "event", self.major_versions["event"], method, parameters=values, service_mappings=mappings, subpath=self.url_subpath)
+
+
+    def _get(self, url):
+        try:
+            response = self._session.get(url, headers=self.request_headers, timeout=self.timeout)
+        except requests.exceptions.RequestException as err:
+            raise_on_error(None, err)
+        Profiler.addBytes(len(response.content))
+        return response
+
+
+# ----------------------------------------------------------------------
+class ClientRegistry(object):
+    """
+    Process-wide registry of FDSN clients keyed by data center and
+    service mappings. Reusing clients avoids repeating service discovery
+    and reuses open HTTP connections.
+    """
+
+    def __init__(self):
+        self.clients = {}
+        self.lock = threading.Lock()
+        return
+
+
+    def get(self, datacenter, serviceMappings=None):
+        if serviceMappings is None:
+            serviceMappings = SERVICE_MAPPINGS.get(datacenter)
+        key = (datacenter, tuple(sorted((serviceMappings or {}).items())))
+        with self.lock:
+            if not key in self.clients:
+                self.clients[key] = PooledClient(datacenter, service_mappings=serviceMappings, debug=False)
+            return self.clients[key]
+
+
+    def clear(self):
+        with self.lock:
+            self.clients = {}
+        return
+
+
+_registry = ClientRegistry()
+
+def getClient(datacenter, serviceMappings=None):
+    """
+    Get shared FDSN client for data center.
+    """
+    return _registry.get(datacenter, serviceMappings)
+
+
+# End of file
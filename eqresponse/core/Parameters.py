@@ -55,8 +55,8 @@ class Parameters(object):
         from copy import deepcopy
 
         if isinstance(dst, dict) and isinstance(src, dict):
-            keysOverlap = src.viewkeys() & dst.viewkeys()
-            keysAll = src.viewkeys() | dst.viewkeys()
+            keysOverlap = set(src.keys()) & set(dst.keys())
+            keysAll = set(src.keys()) | set(dst.keys())
             return {k: Parameters._merge(dst[k], src[k]) if k in keysOverlap else
                              deepcopy(src[k] if k in src else dst[k]) for k in keysAll}
         return deepcopy(src)
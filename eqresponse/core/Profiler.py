@@ -0,0 +1,198 @@
+# ======================================================================
+#
+#                           Brad T. Aagaard
+#                        U.S. Geological Survey
+#
+# ======================================================================
+#
+
+import os
+import sys
+import json
+import time
+import threading
+import contextlib
+
+# Phases of all profilers that are currently open (bytes transferred
+# are added to each of them).
+_openPhases = []
+_lock = threading.Lock()
+
+# ----------------------------------------------------------------------
+class Phase(object):
+    """
+    Measurements for one phase of an application.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.wallSecs = 0.0
+        self.cpuSecs = 0.0
+        self.bytesReceived = 0
+        self.events = {}
+        self.peakMemoryBytes = None
+        self.maxRSSBytes = None
+        self.profileFilename = None
+        self.depth = 0
+        self._memoryStart = 0
+        return
+
+
+    def addEvents(self, label, count):
+        self.events[label] = self.events.get(label, 0) + count
+        return
+
+
+    def toDict(self):
+        return {
+            "name": self.name,
+            "depth": self.depth,
+            "wall_secs": self.wallSecs,
+            "cpu_secs": self.cpuSecs,
+            "bytes_received": self.bytesReceived,
+            "events": self.events,
+            "peak_memory_bytes": self.peakMemoryBytes,
+            "max_rss_bytes": self.maxRSSBytes,
+            "profile": self.profileFilename,
+            }
+
+
+# ----------------------------------------------------------------------
+class Profiler(object):
+    """
+    Record wall time, CPU time, bytes received from data centers, event
+    counts, and peak memory for each phase of an application.
+
+    Peak memory is the largest increase in memory traced by tracemalloc
+    during the phase; CPU time includes all threads of the process. If
+    profileDir is given, each top-level phase is also profiled with
+    cProfile and the statistics are written to profileDir/PHASE.prof.
+
+    A disabled profiler only yields empty phases, so applications can
+    always wrap their phases.
+    """
+
+    def __init__(self, enabled=True, traceMemory=True, profileDir=None):
+        self.enabled = enabled
+        self.traceMemory = traceMemory
+        self.profileDir = profileDir
+        self.phases = []
+        self._stack = []
+        return
+
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """
+        Context manager measuring a phase. Yields the Phase so the
+        caller can add event counts.
+        """
+        phase = Phase(name)
+        if not self.enabled:
+            yield phase
+            return
+
+        import tracemalloc
+
+        if self.traceMemory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            self._updatePeaks()
+            phase._memoryStart = tracemalloc.get_traced_memory()[0]
+            phase.peakMemoryBytes = 0
+
+        cprofile = None
+        if not self.profileDir is None and len(self._stack) == 0:
+            import cProfile
+            cprofile = cProfile.Profile()
+
+        phase.depth = len(self._stack)
+        self.phases.append(phase)
+        self._stack.append(phase)
+        with _lock:
+            _openPhases.append(phase)
+        wallStart = time.perf_counter()
+        cpuStart = time.process_time()
+        if not cprofile is None:
+            cprofile.enable()
+        try:
+            yield phase
+        finally:
+            if not cprofile is None:
+                cprofile.disable()
+            phase.wallSecs = time.perf_counter() - wallStart
+            phase.cpuSecs = time.process_time() - cpuStart
+            with _lock:
+                _openPhases.remove(phase)
+            if self.traceMemory:
+                self._updatePeaks()
+            self._stack.pop()
+            phase.maxRSSBytes = Profiler._maxRSS()
+            if not cprofile is None:
+                if not os.path.isdir(self.profileDir):
+                    os.makedirs(self.profileDir)
+                phase.profileFilename = os.path.join(self.profileDir, "%s.prof" % name)
+                cprofile.dump_stats(phase.profileFilename)
+        return
+
+
+    def report(self):
+        """
+        Get report as a dictionary. Phases are listed in the order they
+        started; nested phases have a larger depth.
+        """
+        return {
+            "argv": sys.argv,
+            "phases": [phase.toDict() for phase in self.phases],
+            }
+
+
+    def write(self, filename):
+        """
+        Write report as JSON.
+        """
+        if not self.enabled:
+            return
+        tmpFilename = filename + ".tmp"
+        with open(tmpFilename, "w") as fout:
+            json.dump(self.report(), fout, indent=2)
+        os.replace(tmpFilename, filename)
+        return
+
+
+    def _updatePeaks(self):
+        """
+        Fold the current tracemalloc peak into the open phases and reset
+        the peak so nested phases are measured separately.
+        """
+        import tracemalloc
+
+        current, peak = tracemalloc.get_traced_memory()
+        for phase in self._stack:
+            phase.peakMemoryBytes = max(phase.peakMemoryBytes, peak - phase._memoryStart)
+        tracemalloc.reset_peak()
+        return
+
+
+    @staticmethod
+    def _maxRSS():
+        try:
+            import resource
+        except ImportError:
+            return None
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports kilobytes, macOS reports bytes.
+        return maxrss if sys.platform == "darwin" else 1024*maxrss
+
+
+def addBytes(nbytes):
+    """
+    Add bytes received to all open phases.
+    """
+    with _lock:
+        for phase in _openPhases:
+            phase.bytesReceived += nbytes
+    return
+
+
+# End of file
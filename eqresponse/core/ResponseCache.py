@@ -0,0 +1,215 @@
+# ======================================================================
+#
+#                           Brad T. Aagaard
+#                        U.S. Geological Survey
+#
+# ======================================================================
+#
+
+import os
+import json
+import time
+import hashlib
+import threading
+
+# Overlap for revalidation queries to allow for clock differences.
+REVALIDATE_MARGIN_SECS = 60.0
+
+# ----------------------------------------------------------------------
+class ResponseCache(object):
+    """
+    On-disk cache of FDSN event query responses keyed by the normalized
+    query parameters.
+
+    A cached response younger than the time-to-live is returned as is.
+    An older response is revalidated by asking the data center for
+    events created or updated since the response was fetched and
+    merging them into the cached response. The cache is limited in size
+    by evicting the least recently used responses. The size of the
+    cache is tracked as responses are stored, so the metadata of all
+    responses is only read on the first eviction check and when the
+    size goes over the limit.
+    """
+
+    def __init__(self, directory, maxBytes=200*1024**2):
+        self.directory = os.path.expanduser(directory)
+        self.maxBytes = maxBytes
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        self._totalBytes = None
+        self._lock = threading.Lock()
+        return
+
+
+    def get(self, datacenter, query, ttl, fetchData, mergeData=None):
+        """
+        Get QuakeML response (bytes) for query, using fetchData(query) to
+        download it if necessary. fetchData returns an empty catalog
+        rather than raising an exception if no events match the query.
+
+        :param ttl: Time to live of cached response in seconds.
+        :param mergeData: Function mergeData(data, updates) merging the
+            response to the revalidation query (events updated since the
+            cached response was fetched) into the cached response. It
+            returns the merged response or None if there are no updates.
+            Stale responses are downloaded again if mergeData is None.
+        """
+        from obspy.clients.fdsn.header import FDSNException
+        from obspy.core.utcdatetime import UTCDateTime
+
+        key = self.key(datacenter, query)
+        meta = self._readMeta(key)
+        now = time.time()
+        if not meta is None:
+            if now - meta["fetched"] < ttl:
+                data = self._readData(key)
+                if not data is None:
+                    self._touch(key, meta, now)
+                    return data
+            elif not mergeData is None:
+                data = self._readData(key)
+                revalidateQuery = dict(query)
+                revalidateQuery["updatedafter"] = UTCDateTime(meta["fetched"] - REVALIDATE_MARGIN_SECS)
+                try:
+                    updates = fetchData(revalidateQuery) if not data is None else None
+                except FDSNException:
+                    # Data center cannot revalidate; download again.
+                    updates = None
+                if not updates is None:
+                    merged = mergeData(data, updates)
+                    if merged is None:
+                        meta["fetched"] = now
+                        self._touch(key, meta, now)
+                        return data
+                    self.put(key, merged, now)
+                    return merged
+
+        data = fetchData(query)
+        self.put(key, data, now)
+        return data
+
+
+    def put(self, key, data, fetched):
+        dataFilename, metaFilename = self._filenames(key)
+        oldMeta = self._readMeta(key)
+        self._writeAtomic(dataFilename, data)
+        meta = {
+            "fetched": fetched,
+            "accessed": fetched,
+            "size": len(data),
+            }
+        self._writeMeta(key, meta)
+        with self._lock:
+            if self._totalBytes is not None:
+                self._totalBytes += len(data) - (oldMeta["size"] if not oldMeta is None else 0)
+        self.evict()
+        return
+
+
+    def evict(self):
+        """
+        Remove least recently used responses until the cache size is
+        within the limit.
+        """
+        with self._lock:
+            if self._totalBytes is not None and self._totalBytes <= self.maxBytes:
+                return
+            self._totalBytes = self._sweep()
+        return
+
+
+    def _sweep(self):
+        """
+        Read metadata of all responses and remove least recently used
+        responses until the cache size is within the limit. Returns size
+        of cache in bytes.
+        """
+        entries = []
+        totalBytes = 0
+        for filename in os.listdir(self.directory):
+            if not filename.endswith(".json"):
+                continue
+            key = filename[:-5]
+            meta = self._readMeta(key)
+            if meta is None:
+                continue
+            entries.append((meta["accessed"], meta["size"], key))
+            totalBytes += meta["size"]
+        entries.sort()
+        for (accessed, size, key) in entries:
+            if totalBytes <= self.maxBytes:
+                break
+            for filename in self._filenames(key):
+                try:
+                    os.remove(filename)
+                except OSError:
+                    pass
+            totalBytes -= size
+        return totalBytes
+
+
+    @staticmethod
+    def key(datacenter, query):
+        """
+        Get cache key from data center and normalized query parameters.
+        Parameters that are None are omitted; queries that track the
+        current time should leave endtime unset (open-ended) rather than
+        pass the current time, which would change the key on every run.
+        """
+        items = [("datacenter", datacenter)]
+        for name in sorted(query.keys()):
+            value = query[name]
+            if value is None or name == "filename":
+                continue
+            if isinstance(value, float):
+                value = "%.6f" % value
+            items.append((name, str(value)))
+        return hashlib.sha1(json.dumps(items).encode("utf-8")).hexdigest()
+
+
+    def _touch(self, key, meta, now):
+        meta["accessed"] = now
+        self._writeMeta(key, meta)
+        return
+
+
+    def _filenames(self, key):
+        root = os.path.join(self.directory, key)
+        return (root + ".xml", root + ".json")
+
+
+    def _readData(self, key):
+        dataFilename, metaFilename = self._filenames(key)
+        try:
+            with open(dataFilename, "rb") as fin:
+                return fin.read()
+        except IOError:
+            return None
+
+
+    def _readMeta(self, key):
+        dataFilename, metaFilename = self._filenames(key)
+        try:
+            with open(metaFilename, "r") as fin:
+                return json.load(fin)
+        except (IOError, ValueError):
+            return None
+
+
+    def _writeMeta(self, key, meta):
+        dataFilename, metaFilename = self._filenames(key)
+        self._writeAtomic(metaFilename, json.dumps(meta).encode("utf-8"))
+        return
+
+
+    def _writeAtomic(self, filename, data):
+        import tempfile
+
+        fd, tmpFilename = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as fout:
+            fout.write(data)
+        os.replace(tmpFilename, filename)
+        return
+
+
+# End of file
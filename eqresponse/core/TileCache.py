@@ -0,0 +1,299 @@
+# ======================================================================
+#
+#                           Brad T. Aagaard
+#                        U.S. Geological Survey
+#
+# ======================================================================
+#
+
+import os
+import io
+import re
+import math
+import json
+import hashlib
+import warnings
+import threading
+
+import numpy
+
+TILE_PIXELS = 256
+
+# Color (RGB) of tiles that could not be fetched.
+MISSING_COLOR = (224, 224, 224)
+
+# ----------------------------------------------------------------------
+class TileCache(object):
+    """
+    On-disk cache of Web Mercator (slippy map) tiles keyed by (source,
+    zoom, x, y), and of basemaps stitched from them keyed by (source,
+    zoom, tile range).
+
+    The source is a URL template such as
+    "https://tile.example.org/{z}/{x}/{y}.png" or a path template (or
+    directory of {z}/{x}/{y}.png files) for local tiles. Missing tiles
+    are fetched concurrently. The cache is limited in size by evicting
+    the least recently used files; the modification time of a file is
+    its last access. The size of the cache is tracked as files are
+    written, so the directory is only scanned on the first eviction
+    check and when the size goes over the limit.
+
+    Tile servers such as tile.openstreetmap.org require a User-Agent
+    that identifies the application and how to contact its operator,
+    so remote sources require userAgent with an e-mail address or URL.
+    Check the usage policy of the tile server before using it.
+    """
+
+    def __init__(self, source, directory, maxBytes=500*1024**2, maxConcurrent=8, userAgent=None):
+        if not "{z}" in source:
+            source = os.path.join(source, "{z}", "{x}", "{y}.png")
+        self.source = source
+        self.userAgent = userAgent
+        if self._isRemote() and (userAgent is None or not re.search(r"@|https?://", userAgent)):
+            raise ValueError("Remote tile source '%s' requires a User-Agent with contact information (e-mail address or URL), for example 'eqresponse/1.0 (+mailto:operator@example.org)'." % source)
+        self.directory = os.path.expanduser(directory)
+        self.maxBytes = maxBytes
+        self.maxConcurrent = maxConcurrent
+        self.tileDirectory = os.path.join(self.directory, hashlib.sha1(source.encode("utf-8")).hexdigest()[:16])
+        self.basemapDirectory = os.path.join(self.directory, "basemaps")
+        for directory in (self.tileDirectory, self.basemapDirectory):
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+        self._session = None
+        self._totalBytes = None
+        self._lock = threading.Lock()
+        return
+
+
+    def basemap(self, zoom, xRange, yRange):
+        """
+        Get basemap (RGB uint8 array) stitched from tiles x in xRange and y
+        in yRange (inclusive) at zoom level.
+        """
+        key = hashlib.sha1(json.dumps([self.source, zoom, list(xRange), list(yRange)]).encode("utf-8")).hexdigest()
+        filename = os.path.join(self.basemapDirectory, key + ".npy")
+        try:
+            image = numpy.load(filename)
+            os.utime(filename)
+            return image
+        except (IOError, ValueError):
+            pass
+
+        tiles = [(zoom, x, y) for y in range(yRange[0], yRange[1]+1) for x in range(xRange[0], xRange[1]+1)]
+        filenames = self._fetchMissing(tiles)
+        nx = xRange[1] - xRange[0] + 1
+        ny = yRange[1] - yRange[0] + 1
+        image = numpy.empty((ny*TILE_PIXELS, nx*TILE_PIXELS, 3), dtype=numpy.uint8)
+        nmissing = 0
+        for (zoom, x, y) in tiles:
+            tile = TileCache._decode(filenames[(zoom, x, y)])
+            if tile is None:
+                tile = numpy.empty((TILE_PIXELS, TILE_PIXELS, 3), dtype=numpy.uint8)
+                tile[:] = MISSING_COLOR
+                nmissing += 1
+            i = (y - yRange[0])*TILE_PIXELS
+            j = (x - xRange[0])*TILE_PIXELS
+            image[i:i+TILE_PIXELS, j:j+TILE_PIXELS] = tile
+
+        # Basemaps with missing tiles are not cached, so the tiles are
+        # fetched again next time.
+        if nmissing == 0:
+            self._writeAtomic(filename, lambda fout: numpy.save(fout, image))
+        else:
+            warnings.warn("Could not load %d of %d map tiles from '%s'; missing tiles are drawn in gray." % (nmissing, len(tiles), self.source))
+        self.evict()
+        return image
+
+
+    def prefetch(self, tiles):
+        """
+        Fetch tiles (zoom, x, y) not in the cache concurrently.
+        """
+        self._fetchMissing(tiles)
+        self.evict()
+        return
+
+
+    def evict(self):
+        """
+        Remove least recently used tiles and basemaps until the cache size
+        is within the limit.
+        """
+        with self._lock:
+            if self._totalBytes is not None and self._totalBytes <= self.maxBytes:
+                return
+            self._totalBytes = self._sweep()
+        return
+
+
+    def _sweep(self):
+        """
+        Scan the cache and remove least recently used files until the cache
+        size is within the limit. Returns size of cache in bytes.
+        """
+        entries = []
+        totalBytes = 0
+        for (root, dirs, files) in os.walk(self.directory):
+            for name in files:
+                filename = os.path.join(root, name)
+                try:
+                    stat = os.stat(filename)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, filename))
+                totalBytes += stat.st_size
+        if totalBytes <= self.maxBytes:
+            return totalBytes
+        entries.sort()
+        for (accessed, size, filename) in entries:
+            if totalBytes <= self.maxBytes:
+                break
+            try:
+                os.remove(filename)
+            except OSError:
+                pass
+            totalBytes -= size
+        return totalBytes
+
+
+    @staticmethod
+    def tileCoordinates(longitude, latitude, zoom):
+        """
+        Get (fractional) tile coordinates of point at zoom level.
+        """
+        n = 2.0**zoom
+        lat = math.radians(latitude)
+        x = (longitude + 180.0)/360.0*n
+        y = (1.0 - math.log(math.tan(lat) + 1.0/math.cos(lat))/math.pi)/2.0*n
+        return (x, y)
+
+
+    @staticmethod
+    def tileCorner(x, y, zoom):
+        """
+        Get longitude and latitude of the upper left corner of tile.
+        """
+        n = 2.0**zoom
+        longitude = x/n*360.0 - 180.0
+        latitude = math.degrees(math.atan(math.sinh(math.pi*(1.0 - 2.0*y/n))))
+        return (longitude, latitude)
+
+
+    def _fetchMissing(self, tiles):
+        """
+        Fetch tiles not in the cache concurrently. Returns filename of each
+        tile in the cache (None if it could not be fetched).
+        """
+        from concurrent.futures import ThreadPoolExecutor
+
+        filenames = {}
+        missing = []
+        for tile in tiles:
+            filename = self._filename(*tile)
+            if os.path.isfile(filename):
+                os.utime(filename)
+                filenames[tile] = filename
+            else:
+                missing.append(tile)
+        if len(missing) == 0:
+            return filenames
+
+        if self._isRemote():
+            self._getSession()
+        with ThreadPoolExecutor(max_workers=max(1, min(self.maxConcurrent, len(missing)))) as executor:
+            for (tile, filename) in zip(missing, executor.map(self._fetch, missing)):
+                filenames[tile] = filename
+        return filenames
+
+
+    def _filename(self, zoom, x, y):
+        extension = os.path.splitext(self.source.split("?")[0])[1] or ".png"
+        return os.path.join(self.tileDirectory, str(zoom), str(x), "%d%s" % (y, extension))
+
+
+    def _fetch(self, tile):
+        """
+        Fetch tile from source into cache. Returns filename or None on
+        failure.
+        """
+        (zoom, x, y) = tile
+        location = self.source.format(z=zoom, x=x, y=y)
+        # requests exceptions are IOErrors.
+        try:
+            if self._isRemote():
+                response = self._getSession().get(location, timeout=30)
+                response.raise_for_status()
+                data = response.content
+            else:
+                if location.startswith("file://"):
+                    location = location[len("file://"):]
+                with open(location, "rb") as fin:
+                    data = fin.read()
+        except IOError:
+            return None
+
+        filename = self._filename(zoom, x, y)
+        directory = os.path.dirname(filename)
+        if not os.path.isdir(directory):
+            os.makedirs(directory, exist_ok=True)
+        self._writeAtomic(filename, lambda fout: fout.write(data))
+        return filename
+
+
+    def _isRemote(self):
+        return "://" in self.source and not self.source.startswith("file://")
+
+
+    def _getSession(self):
+        if self._session is None:
+            import requests
+
+            self._session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=self.maxConcurrent)
+            self._session.mount("http://", adapter)
+            self._session.mount("https://", adapter)
+            self._session.headers["User-Agent"] = self.userAgent
+        return self._session
+
+
+    def _writeAtomic(self, filename, write):
+        import tempfile
+
+        fd, tmpFilename = tempfile.mkstemp(dir=os.path.dirname(filename), suffix=".tmp")
+        with os.fdopen(fd, "wb") as fout:
+            write(fout)
+        try:
+            oldSize = os.path.getsize(filename)
+        except OSError:
+            oldSize = 0
+        os.replace(tmpFilename, filename)
+        with self._lock:
+            if self._totalBytes is not None:
+                self._totalBytes += os.path.getsize(filename) - oldSize
+        return
+
+
+    @staticmethod
+    def _decode(filename):
+        """
+        Decode tile image as RGB uint8 array.
+        """
+        if filename is None:
+            return None
+        from matplotlib.image import imread
+
+        try:
+            with open(filename, "rb") as fin:
+                image = imread(io.BytesIO(fin.read()))
+        except Exception:
+            return None
+        if image.dtype != numpy.uint8:
+            image = numpy.round(255.0*image).astype(numpy.uint8)
+        if image.ndim == 2:
+            image = numpy.dstack((image, image, image))
+        if image.shape[:2] != (TILE_PIXELS, TILE_PIXELS):
+            return None
+        return image[:, :, :3]
+
+
+# End of file
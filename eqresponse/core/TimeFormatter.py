@@ -0,0 +1,190 @@
+# ======================================================================
+#
+#                           Brad T. Aagaard
+#                        U.S. Geological Survey
+#
+# ======================================================================
+#
+
+import re
+import datetime
+
+import numpy
+
+LOCAL_FORMAT = "%a %b %d %Y %I:%M:%S %p %Z"
+
+DAY_TO_SECS = 24*3600
+
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+MONTHS = ["January", "February", "March", "April", "May", "June", "July", "August", "September", "October", "November", "December"]
+
+EPOCH = datetime.datetime(1970, 1, 1)
+
+# ----------------------------------------------------------------------
+class TimeFormatter(object):
+    """
+    Format arrays of POSIX times as local time strings.
+
+    The UTC offsets and abbreviations of the time zone are looked up in
+    a table of transitions, so all times are converted together with
+    array operations and each string is built with a single Python
+    format. Supported directives are %a %A %b %B %d %f %H %I %j %m %M
+    %p %S %y %Y %Z and %% (English names, as in the C locale). Fractions
+    of a second are truncated, as with strftime.
+
+    The transition table is built from the public utcoffset() and
+    tzname() of the tzinfo (pytz, zoneinfo, dateutil, ...) for the range
+    of times formatted so far. Offsets are sampled daily and each change
+    is located to the second, so a pair of transitions less than a day
+    apart that restore the same offset is missed. Times after the last
+    transition in the time zone data get whatever the tzinfo reports;
+    pytz tables end in 2037, after which pytz (and so this formatter)
+    uses the standard time offset, whereas zoneinfo continues the
+    daylight saving time rule.
+    """
+
+    def __init__(self, tz, fmt=LOCAL_FORMAT):
+        if not isinstance(tz, datetime.tzinfo):
+            raise TypeError("Time zone must be a tzinfo, not %s." % type(tz).__name__)
+        self.tz = tz
+        self.tableRange = None
+        (self.pyFormat, self.fields) = TimeFormatter._translate(fmt)
+        return
+
+
+    def format(self, times):
+        """
+        Get list of local time strings for POSIX times (s). NaN times give
+        empty strings.
+        """
+        times = numpy.asarray(times, dtype=numpy.float64)
+        strings = [""]*times.shape[0]
+        valid = numpy.nonzero(~numpy.isnan(times))[0]
+        if valid.shape[0] == 0:
+            return strings
+
+        micros = numpy.round(times[valid]*1.0e+6).astype(numpy.int64)
+        utc = micros // 1000000
+        self._coverRange(int(numpy.min(utc)), int(numpy.max(utc)))
+        index = numpy.maximum(numpy.searchsorted(self.transitions, utc, side="right") - 1, 0)
+        local = utc + self.offsets[index]
+
+        days = local // DAY_TO_SECS
+        seconds = local - days*DAY_TO_SECS
+        dates = days.astype("datetime64[D]")
+        months = dates.astype("datetime64[M]")
+        years = dates.astype("datetime64[Y]")
+        hours = seconds // 3600
+
+        values = {
+            "Y": lambda: years.astype(numpy.int64) + 1970,
+            "y": lambda: (years.astype(numpy.int64) + 1970) % 100,
+            "m": lambda: months.astype(numpy.int64) % 12 + 1,
+            "b": lambda: numpy.array([name[:3] for name in MONTHS])[months.astype(numpy.int64) % 12],
+            "B": lambda: numpy.array(MONTHS)[months.astype(numpy.int64) % 12],
+            "d": lambda: (dates - months).astype(numpy.int64) + 1,
+            "j": lambda: (dates - years).astype(numpy.int64) + 1,
+            "a": lambda: numpy.array([name[:3] for name in WEEKDAYS])[(days + 3) % 7],
+            "A": lambda: numpy.array(WEEKDAYS)[(days + 3) % 7],
+            "H": lambda: hours,
+            "I": lambda: (hours + 11) % 12 + 1,
+            "p": lambda: numpy.where(hours < 12, "AM", "PM"),
+            "M": lambda: (seconds // 60) % 60,
+            "S": lambda: seconds % 60,
+            "f": lambda: micros % 1000000,
+            "Z": lambda: self.names[index],
+            }
+        columns = [values[field]().tolist() for field in self.fields]
+        pyFormat = self.pyFormat
+        for (i, row) in zip(valid.tolist(), zip(*columns)):
+            strings[i] = pyFormat % row
+        return strings
+
+
+    def formatOne(self, tstamp):
+        """
+        Get local time string for a UTCDateTime, datetime (UTC), or POSIX
+        time. None gives an empty string.
+        """
+        if tstamp is None:
+            return ""
+        if isinstance(tstamp, datetime.datetime):
+            t = (tstamp.replace(tzinfo=None) - EPOCH).total_seconds()
+        elif hasattr(tstamp, "timestamp"):
+            t = tstamp.timestamp
+        else:
+            t = float(tstamp)
+        return self.format([t])[0]
+
+
+    def _coverRange(self, tmin, tmax):
+        """
+        Make sure the transition table covers POSIX times tmin to tmax (s).
+        """
+        if not self.tableRange is None and tmin >= self.tableRange[0] and tmax <= self.tableRange[1]:
+            return
+        if not self.tableRange is None:
+            tmin = min(tmin, self.tableRange[0])
+            tmax = max(tmax, self.tableRange[1])
+        (self.transitions, self.offsets, self.names) = TimeFormatter._transitionTable(self.tz, tmin, tmax)
+        self.tableRange = (tmin, tmax)
+        return
+
+
+    @staticmethod
+    def _transitionTable(tz, tmin, tmax):
+        """
+        Get UTC transition times (POSIX s), UTC offsets (s), and
+        abbreviations of time zone for POSIX times tmin to tmax (s).
+        """
+        def info(t):
+            local = datetime.datetime.fromtimestamp(t, tz)
+            return (int(local.utcoffset().total_seconds()), local.tzname())
+
+        start = (tmin // DAY_TO_SECS - 1)*DAY_TO_SECS
+        end = (tmax // DAY_TO_SECS + 2)*DAY_TO_SECS
+        current = info(start)
+        transitions = [numpy.iinfo(numpy.int64).min]
+        offsets = [current[0]]
+        names = [current[1]]
+        tprev = start
+        for t in range(start+DAY_TO_SECS, end+1, DAY_TO_SECS):
+            sample = info(t)
+            while sample != current:
+                # Bisect for the first second with a different offset or name.
+                (lo, hi) = (tprev, t)
+                while hi - lo > 1:
+                    mid = (lo + hi) // 2
+                    if info(mid) == current:
+                        lo = mid
+                    else:
+                        hi = mid
+                current = info(hi)
+                transitions.append(hi)
+                offsets.append(current[0])
+                names.append(current[1])
+                tprev = hi
+            tprev = t
+        return (numpy.array(transitions, dtype=numpy.int64), numpy.array(offsets, dtype=numpy.int64), numpy.array(names, dtype=object))
+
+
+    @staticmethod
+    def _translate(fmt):
+        """
+        Translate strftime format into Python format and list of fields.
+        """
+        widths = {"Y": "%d", "y": "%02d", "m": "%02d", "d": "%02d", "j": "%03d", "H": "%02d", "I": "%02d", "M": "%02d", "S": "%02d", "f": "%06d"}
+        fields = []
+
+        def replace(match):
+            directive = match.group(1)
+            if not directive in widths and not directive in "aAbBpZ":
+                raise ValueError("Unsupported time format directive '%%%s'." % directive)
+            fields.append(directive)
+            return widths.get(directive, "%s")
+
+        pyFormat = re.sub(r"%(.)", replace, fmt.replace("%%", "\0")).replace("\0", "%%")
+        return (pyFormat, fields)
+
+
+# End of file
@@ -9,7 +9,12 @@
 #
 
 __all__ = [
+    "ClientRegistry",
     "Parameters",
+    "Profiler",
+    "ResponseCache",
+    "TileCache",
+    "TimeFormatter",
 ]
 
 
@@ -0,0 +1,76 @@
+# ======================================================================
+#
+#                           Brad T. Aagaard
+#                        U.S. Geological Survey
+#
+# ======================================================================
+#
+
+import numpy
+
+# Colors of catalogs, in the order they are added.
+COLORS = ["blue", "red", "green", "orange", "purple", "gray"]
+
+# ----------------------------------------------------------------------
+class PlotGutenbergRichter(object):
+    """
+    Plot of frequency-magnitude distributions with maximum likelihood
+    Gutenberg-Richter fits and bootstrap b-value uncertainties.
+    """
+
+    def __init__(self, params):
+        self.params = params
+        self.catalogs = []
+        return
+
+
+    def addCatalog(self, label, freqmag, color=None):
+        """
+        Add frequency-magnitude distribution of catalog to plot.
+        """
+        if color is None:
+            color = COLORS[len(self.catalogs) % len(COLORS)]
+        self.catalogs.append((label, freqmag, color))
+        return
+
+
+    def save(self, filename, title=None):
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+        figure = Figure(figsize=(self.params['width'], self.params['height']))
+        FigureCanvasAgg(figure)
+        ax = figure.add_subplot(1, 1, 1)
+
+        nsamples = self.params['bootstrap_samples']
+        for (label, freqmag, color) in self.catalogs:
+            (bins, incremental, cumulative) = freqmag.counts()
+            if bins.shape[0] == 0:
+                continue
+            mask = incremental > 0
+            ax.semilogy(bins[mask], incremental[mask], marker="s", linestyle="none", markersize=3, markerfacecolor="none", markeredgecolor=color)
+            ax.semilogy(bins, cumulative, marker="o", linestyle="none", markersize=4, color=color)
+
+            mc = freqmag.completeness()
+            (a, b, sigmaB, nevents) = freqmag.bValue(mc)
+            if numpy.isnan(b):
+                legend = "%s (N=%d)" % (label, cumulative[0])
+            else:
+                bootstrap = freqmag.bootstrap(mc, nsamples=nsamples)
+                legend = "%s: b=%4.2f$\\pm$%4.2f, Mc=%3.1f (N=%d)" % (label, b, numpy.std(bootstrap), mc, nevents)
+                mags = numpy.array([mc, bins[-1]])
+                ax.semilogy(mags, 10.0**(a - b*mags), color=color, linestyle="-")
+            ax.plot([], [], color=color, marker="o", label=legend)
+
+        ax.set_xlabel("Magnitude")
+        ax.set_ylabel("Number of Earthquakes")
+        if not title is None:
+            ax.set_title(title)
+        ax.grid(True, which="major", linestyle=":")
+        ax.legend(loc="upper right", fontsize="small", numpoints=1)
+        figure.tight_layout()
+        figure.savefig(filename)
+        return
+
+
+# End of file
@@ -0,0 +1,175 @@
+# ======================================================================
+#
+#                           Brad T. Aagaard
+#                        U.S. Geological Survey
+#
+# ======================================================================
+#
+
+import math
+
+import numpy
+
+from eqresponse.plot.PlotTime import PlotTime
+
+KM_TO_DEG = 1.0/111.0 # roughly 111 km per latitude degree
+EARTH_RADIUS_M = 6378137.0 # Web Mercator sphere
+DPI = 100.0
+
+# ----------------------------------------------------------------------
+class PlotMap(object):
+    """
+    Map of epicenters on a tiled Web Mercator basemap centered on a
+    point (usually the mainshock epicenter).
+
+    The basemap is stitched from the tiles covering the map at
+    zoom_level by a TileCache, which keeps both the tiles and the
+    stitched basemap, so repeated maps of the same area do not download
+    or stitch tiles again. Without a tile cache, the map has no basemap.
+    """
+
+    def __init__(self, params, longitude, latitude, tiles=None):
+        self.params = params
+        self.longitude = longitude
+        self.latitude = latitude
+        self.tiles = tiles
+        self.catalogs = []
+        self.mainshock = None
+        return
+
+
+    def addCatalog(self, label, table, color=None):
+        """
+        Add events in table to plot.
+        """
+        self.catalogs.append((label, table, color))
+        return
+
+
+    def addMainshock(self, mag):
+        """
+        Add mainshock at center of map.
+        """
+        self.mainshock = mag
+        return
+
+
+    def extent(self):
+        """
+        Get extent of map (lonMin, lonMax, latMin, latMax).
+        """
+        params = self.params
+        dlat = 0.5*params['height_km']*KM_TO_DEG
+        dlon = dlat*params['width_pixels']/float(params['height_pixels'])/math.cos(math.radians(self.latitude))
+        return (self.longitude-dlon, self.longitude+dlon, self.latitude-dlat, self.latitude+dlat)
+
+
+    def tileRange(self, zoom):
+        """
+        Get ranges (inclusive) of x and y indices of tiles covering map.
+        """
+        from eqresponse.core.TileCache import TileCache
+
+        (lonMin, lonMax, latMin, latMax) = self.extent()
+        (x0, y0) = TileCache.tileCoordinates(lonMin, latMax, zoom)
+        (x1, y1) = TileCache.tileCoordinates(lonMax, latMin, zoom)
+        nmax = 2**zoom - 1
+        clip = lambda v: min(max(int(math.floor(v)), 0), nmax)
+        return ((clip(x0), clip(x1)), (clip(y0), clip(y1)))
+
+
+    def save(self, filename, title=None):
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.ticker import FuncFormatter
+
+        params = self.params
+        figure = Figure(figsize=(params['width_pixels']/DPI, params['height_pixels']/DPI))
+        FigureCanvasAgg(figure)
+        ax = figure.add_subplot(1, 1, 1)
+
+        (lonMin, lonMax, latMin, latMax) = self.extent()
+        (xMin, yMin) = PlotMap.toMercator(lonMin, latMin)
+        (xMax, yMax) = PlotMap.toMercator(lonMax, latMax)
+
+        if not self.tiles is None:
+            from eqresponse.core.TileCache import TileCache
+
+            zoom = params['zoom_level']
+            (xRange, yRange) = self.tileRange(zoom)
+            image = self.tiles.basemap(zoom, xRange, yRange)
+            (left, top) = PlotMap.toMercator(*TileCache.tileCorner(xRange[0], yRange[0], zoom))
+            (right, bottom) = PlotMap.toMercator(*TileCache.tileCorner(xRange[1]+1, yRange[1]+1, zoom))
+            ax.imshow(image, extent=(left, right, bottom, top), origin="upper", interpolation="antialiased", zorder=0)
+            if params['tiles'].get('attribution'):
+                ax.text(0.99, 0.01, params['tiles']['attribution'], transform=ax.transAxes, fontsize="x-small", ha="right", va="bottom", zorder=4)
+
+        for (label, table, color) in self.catalogs:
+            if table.count() == 0:
+                continue
+            indices = PlotTime.decimate(table["mag"], params['max_points'])
+            (x, y) = PlotMap.toMercator(table["longitude"][indices], table["latitude"][indices])
+            ax.scatter(x, y, s=self._markerSize(table["mag"][indices]), c=color, edgecolors="black", linewidths=0.25, alpha=0.7, label=label, zorder=2)
+
+        if not self.mainshock is None:
+            (x, y) = PlotMap.toMercator(self.longitude, self.latitude)
+            ax.scatter([x], [y], s=self._markerSize(numpy.array([self.mainshock])), marker="*", c="red", edgecolors="black", linewidths=0.5, zorder=3)
+
+        ax.set_xlim(xMin, xMax)
+        ax.set_ylim(yMin, yMax)
+        ax.set_aspect("equal")
+        ax.xaxis.set_major_formatter(FuncFormatter(lambda x, pos: "%.2f$^\\circ$" % PlotMap.fromMercator(x, 0.0)[0]))
+        ax.yaxis.set_major_formatter(FuncFormatter(lambda y, pos: "%.2f$^\\circ$" % PlotMap.fromMercator(0.0, y)[1]))
+        if not title is None:
+            ax.set_title(title)
+        if len(self.catalogs) > 1:
+            ax.legend(loc="upper right", fontsize="small", scatterpoints=1)
+        figure.tight_layout()
+        figure.savefig(filename, dpi=DPI)
+        return
+
+
+    @staticmethod
+    def tileCache(params):
+        """
+        Create tile cache from plot_map parameters (None if there is no
+        tile source). There is no default tile source; remote sources
+        also require tiles/user_agent with contact information.
+        """
+        from eqresponse.core.TileCache import TileCache
+
+        tiles = params['tiles']
+        if not tiles.get('source'):
+            return None
+        return TileCache(tiles['source'], tiles['directory'], maxBytes=int(tiles['max_mb']*1024**2), maxConcurrent=tiles['max_concurrent'], userAgent=tiles.get('user_agent'))
+
+
+    def _markerSize(self, mag):
+        """
+        Marker area (points**2) for magnitudes.
+        """
+        diameter = 72.0*self.params['marker_scale']*numpy.maximum(mag, 0.5)
+        return diameter**2
+
+
+    @staticmethod
+    def toMercator(longitude, latitude):
+        """
+        Convert longitude and latitude (degrees) to Web Mercator x and y (m).
+        """
+        x = EARTH_RADIUS_M*numpy.radians(longitude)
+        y = EARTH_RADIUS_M*numpy.log(numpy.tan(0.25*numpy.pi + 0.5*numpy.radians(latitude)))
+        return (x, y)
+
+
+    @staticmethod
+    def fromMercator(x, y):
+        """
+        Convert Web Mercator x and y (m) to longitude and latitude (degrees).
+        """
+        longitude = numpy.degrees(x/EARTH_RADIUS_M)
+        latitude = numpy.degrees(2.0*numpy.arctan(numpy.exp(y/EARTH_RADIUS_M)) - 0.5*numpy.pi)
+        return (longitude, latitude)
+
+
+# End of file
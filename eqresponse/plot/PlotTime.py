@@ -0,0 +1,149 @@
+# ======================================================================
+#
+#                           Brad T. Aagaard
+#                        U.S. Geological Survey
+#
+# ======================================================================
+#
+
+import numpy
+
+DAY_TO_SECS = 24*3600.0
+
+# Maximum number of points in cumulative count curves.
+MAX_CURVE_POINTS = 2000
+
+# ----------------------------------------------------------------------
+class PlotTime(object):
+    """
+    Plot of magnitude versus time with the cumulative number of events.
+
+    Scatter layers are rasterized, and if a catalog has more than
+    max_points events, the largest events and a random subset of the
+    smaller events are drawn. Cumulative counts always include all
+    events. Times are Matplotlib date numbers computed directly from the
+    POSIX times.
+    """
+
+    def __init__(self, params):
+        self.params = params
+        self.catalogs = []
+        self.mainshock = None
+        return
+
+
+    def addCatalog(self, label, table, color=None):
+        """
+        Add events in table to plot.
+        """
+        self.catalogs.append((label, table, color or self.params['color']))
+        return
+
+
+    def addMainshock(self, time, mag):
+        """
+        Add mainshock (POSIX time) to plot.
+        """
+        self.mainshock = (time, mag)
+        return
+
+
+    def save(self, filename, title=None):
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.dates import AutoDateLocator, ConciseDateFormatter
+
+        params = self.params
+        figure = Figure(figsize=(params['width'], params['height']))
+        FigureCanvasAgg(figure)
+        ax = figure.add_subplot(1, 1, 1)
+        axCount = ax.twinx()
+        edgeColor = "black" if params['color_edge'] == "fg" else params['color_edge']
+
+        for (label, table, color) in self.catalogs:
+            if table.count() == 0:
+                continue
+            t = PlotTime.dateNumbers(table["time"])
+            mag = table["mag"]
+
+            indices = PlotTime.decimate(mag, params['max_points'])
+            ax.scatter(t[indices], mag[indices], s=self._markerSize(mag[indices]), c=color, edgecolors=edgeColor, linewidths=0.25, alpha=0.8, rasterized=True, label=label, zorder=2)
+
+            (tCount, count) = PlotTime.cumulativeCount(t)
+            axCount.step(tCount, count, where="post", color=color, linewidth=1.0, zorder=1)
+
+        if not self.mainshock is None:
+            (time, mag) = self.mainshock
+            ax.scatter(PlotTime.dateNumbers(numpy.array([time])), [mag], s=self._markerSize(numpy.array([mag])), marker="*", c="red", edgecolors=edgeColor, linewidths=0.5, zorder=3)
+
+        locator = AutoDateLocator()
+        ax.xaxis.set_major_locator(locator)
+        ax.xaxis.set_major_formatter(ConciseDateFormatter(locator))
+        ax.set_ylabel("Magnitude")
+        axCount.set_ylabel("Cumulative Number of Earthquakes")
+        ax.set_zorder(axCount.get_zorder()+1)
+        ax.patch.set_visible(False)
+        if not title is None:
+            ax.set_title(title)
+        if len(self.catalogs) > 1:
+            ax.legend(loc="upper left", fontsize="small", scatterpoints=1)
+        figure.tight_layout()
+        figure.savefig(filename, dpi=params['dpi'])
+        return
+
+
+    def _markerSize(self, mag):
+        """
+        Marker area (points**2) for magnitudes.
+        """
+        diameter = 72.0*self.params['marker_scale']*numpy.maximum(mag, 0.5)
+        return diameter**2
+
+
+    @staticmethod
+    def dateNumbers(time):
+        """
+        Convert POSIX times (s) to Matplotlib date numbers (days since
+        the Matplotlib epoch, rcParams["date.epoch"]), as date2num.
+        """
+        from matplotlib.dates import get_epoch
+
+        epochDays = (numpy.datetime64(get_epoch(), "us") - numpy.datetime64("1970-01-01T00:00:00", "us")) / numpy.timedelta64(1, "D")
+        return numpy.asarray(time, dtype=numpy.float64) / DAY_TO_SECS - epochDays
+
+
+    @staticmethod
+    def decimate(mag, maxPoints, seed=0):
+        """
+        Get sorted indices of at most maxPoints events to display. The
+        largest events fill half of the points; the other half is a
+        uniform random sample of the remaining smaller events, so the
+        pattern of small events in time is preserved.
+        """
+        nevents = mag.shape[0]
+        if nevents <= maxPoints:
+            return numpy.arange(nevents)
+
+        order = numpy.argsort(-numpy.where(numpy.isnan(mag), -numpy.inf, mag), kind="stable")
+        nlarge = maxPoints // 2
+        rng = numpy.random.default_rng(seed)
+        sample = rng.choice(order[nlarge:], size=maxPoints-nlarge, replace=False)
+        return numpy.sort(numpy.concatenate((order[:nlarge], sample)))
+
+
+    @staticmethod
+    def cumulativeCount(t, maxPoints=MAX_CURVE_POINTS):
+        """
+        Get times and cumulative number of events, with at most maxPoints
+        points.
+        """
+        t = numpy.sort(t[~numpy.isnan(t)])
+        count = numpy.arange(1, t.shape[0]+1)
+        if t.shape[0] > maxPoints:
+            indices = numpy.unique(numpy.linspace(0, t.shape[0]-1, maxPoints).astype(numpy.int64))
+            t = t[indices]
+            count = count[indices]
+        return (t, count)
+
+
+# End of file
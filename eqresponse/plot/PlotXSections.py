@@ -0,0 +1,112 @@
+# ======================================================================
+#
+#                           Brad T. Aagaard
+#                        U.S. Geological Survey
+#
+# ======================================================================
+#
+
+import numpy
+
+from eqresponse.plot.PlotTime import PlotTime
+
+EARTH_RADIUS_KM = 6371.0
+
+# ----------------------------------------------------------------------
+class PlotXSections(object):
+    """
+    Cross sections of hypocenters along strike and perpendicular to
+    strike through a reference point (usually the mainshock epicenter).
+
+    Epicenters are projected onto the section with a local tangent plane
+    at the reference point, which is adequate over the distances of a
+    seismicity plot.
+    """
+
+    def __init__(self, params, longitude, latitude, strike):
+        self.params = params
+        self.longitude = longitude
+        self.latitude = latitude
+        self.strike = strike
+        self.catalogs = []
+        self.mainshock = None
+        return
+
+
+    def addCatalog(self, label, table, color=None):
+        """
+        Add events in table to plot.
+        """
+        self.catalogs.append((label, table, color))
+        return
+
+
+    def addMainshock(self, depthKm, mag):
+        """
+        Add mainshock at reference point to plot.
+        """
+        self.mainshock = (depthKm, mag)
+        return
+
+
+    def project(self, longitude, latitude):
+        """
+        Get distances (km) along strike and perpendicular to strike
+        (positive to the right of strike) from the reference point.
+        """
+        x = numpy.radians(longitude - self.longitude)*EARTH_RADIUS_KM*numpy.cos(numpy.radians(self.latitude))
+        y = numpy.radians(latitude - self.latitude)*EARTH_RADIUS_KM
+        strike = numpy.radians(self.strike)
+        along = x*numpy.sin(strike) + y*numpy.cos(strike)
+        across = x*numpy.cos(strike) - y*numpy.sin(strike)
+        return (along, across)
+
+
+    def save(self, filename, title=None):
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+        params = self.params
+        figure = Figure(figsize=(params['width'], params['height']))
+        FigureCanvasAgg(figure)
+        axes = figure.subplots(2, 1, sharey=True)
+
+        for (label, table, color) in self.catalogs:
+            if table.count() == 0:
+                continue
+            indices = PlotTime.decimate(table["mag"], params['max_points'])
+            (along, across) = self.project(table["longitude"][indices], table["latitude"][indices])
+            depth = 1.0e-3*table["depth"][indices]
+            size = self._markerSize(table["mag"][indices])
+            for (ax, x) in zip(axes, (along, across)):
+                ax.scatter(x, depth, s=size, c=color, edgecolors="black", linewidths=0.25, alpha=0.6, rasterized=True, label=label)
+
+        if not self.mainshock is None:
+            (depthKm, mag) = self.mainshock
+            for ax in axes:
+                ax.scatter([0.0], [depthKm], s=self._markerSize(numpy.array([mag])), marker="*", c="red", edgecolors="black", linewidths=0.5, zorder=3)
+
+        axes[0].set_title("Along strike (%.0f$^\\circ$)" % self.strike, fontsize="medium")
+        axes[1].set_title("Perpendicular to strike (%.0f$^\\circ$)" % ((self.strike+90.0) % 360.0), fontsize="medium")
+        for ax in axes:
+            ax.set_ylabel("Depth (km)")
+            ax.grid(True, linestyle=":")
+        axes[0].invert_yaxis()
+        axes[1].set_xlabel("Distance (km)")
+        if not title is None:
+            figure.suptitle(title)
+        if len(self.catalogs) > 1:
+            axes[0].legend(loc="lower left", fontsize="small", scatterpoints=1)
+        figure.tight_layout()
+        figure.savefig(filename, dpi=params['dpi'])
+        return
+
+
+    def _markerSize(self, mag):
+        """
+        Marker area (points**2) for magnitudes.
+        """
+        return self.params['marker_scale']*numpy.maximum(mag, 0.5)
+
+
+# End of file
@@ -0,0 +1,114 @@
+# ======================================================================
+#
+#                           Brad T. Aagaard
+#                        U.S. Geological Survey
+#
+# ======================================================================
+#
+
+import os
+import time
+
+import numpy
+
+from eqresponse.seismicity.EventTable import EventTable
+
+# Tables attached from shared memory in a worker process, by name.
+_sharedTables = {}
+_sharedMemory = []
+
+# ----------------------------------------------------------------------
+class Renderer(object):
+    """
+    Render several figures from the same event tables concurrently.
+
+    Each figure is a picklable function called as function(tables,
+    **kwargs), where tables maps names to EventTables. The tables are
+    copied once into shared memory and each worker process maps them
+    without copying, so only the function arguments are pickled. A
+    single figure (or maxWorkers=1) is rendered in this process.
+    """
+
+    def __init__(self, maxWorkers=None):
+        self.maxWorkers = maxWorkers or os.cpu_count() or 1
+        self.tables = {}
+        self.figures = []
+        return
+
+
+    def addTable(self, name, table):
+        """
+        Add event table shared by the figures. A table of None (catalog
+        not loaded) is added as an empty table.
+        """
+        self.tables[name] = table if not table is None else EventTable()
+        return
+
+
+    def addFigure(self, label, function, **kwargs):
+        """
+        Add figure rendered by function(tables, **kwargs).
+        """
+        self.figures.append((label, function, kwargs))
+        return
+
+
+    def run(self):
+        """
+        Render figures. Returns wall clock time (s) of each figure.
+        """
+        nworkers = min(self.maxWorkers, len(self.figures))
+        if nworkers <= 1:
+            return dict([(label, _render(function, kwargs, self.tables)) for (label, function, kwargs) in self.figures])
+
+        from concurrent.futures import ProcessPoolExecutor
+        from multiprocessing import shared_memory
+
+        segments = []
+        try:
+            specs = {}
+            for (name, table) in self.tables.items():
+                data = table.data
+                shm = shared_memory.SharedMemory(create=True, size=max(1, data.nbytes))
+                segments.append(shm)
+                numpy.ndarray(data.shape, dtype=data.dtype, buffer=shm.buf)[:] = data
+                specs[name] = (shm.name, data.dtype, data.shape, table.magTypes, table.creationTime)
+
+            with ProcessPoolExecutor(max_workers=nworkers, initializer=_attachTables, initargs=(specs,)) as executor:
+                futures = [(label, executor.submit(_renderShared, function, kwargs)) for (label, function, kwargs) in self.figures]
+                elapsed = dict([(label, future.result()) for (label, future) in futures])
+        finally:
+            for shm in segments:
+                shm.close()
+                shm.unlink()
+        return elapsed
+
+
+# ----------------------------------------------------------------------
+def _render(function, kwargs, tables):
+    tstart = time.time()
+    function(tables, **kwargs)
+    return time.time() - tstart
+
+
+def _attachTables(specs):
+    """
+    Map shared event tables in worker process. The mappings are kept
+    until the worker exits.
+    """
+    from multiprocessing import shared_memory
+
+    for (name, (shmName, dtype, shape, magTypes, creationTime)) in specs.items():
+        shm = shared_memory.SharedMemory(name=shmName)
+        _sharedMemory.append(shm)
+        data = numpy.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        data.flags.writeable = False
+        _sharedTables[name] = EventTable(data, magTypes, creationTime)
+    return
+
+
+def _renderShared(function, kwargs):
+    return _render(function, kwargs, _sharedTables)
+
+
+# End of file
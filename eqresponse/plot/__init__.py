@@ -0,0 +1,20 @@
+#!/usr/bin/env python
+#
+# ======================================================================
+#
+#                           Brad T. Aagaard
+#                        U.S. Geological Survey
+#
+# ======================================================================
+#
+
+__all__ = [
+    "PlotGutenbergRichter",
+    "PlotMap",
+    "PlotTime",
+    "PlotXSections",
+    "Renderer",
+]
+
+
+# End of file
@@ -7,17 +7,17 @@
 #
 
 import os
+import io
 import numpy
-import pytz
-import datetime
 import math
-import pyproj
 
 import obspy.core.event
-from obspy.clients.fdsn import Client
 from obspy.core.utcdatetime import UTCDateTime
 
-import obspyutils.momenttensor
+from eqresponse.seismicity.EventTable import EventTable
+from eqresponse.seismicity.CatalogCache import CatalogCache
+from eqresponse.seismicity.QuakeMLReader import QuakeMLReader
+from eqresponse.seismicity.GeoJSONReader import GeoJSONReader
 
 
 KM_TO_DEG = 1.0/111.0 # roughly 111 km per latitude degree
@@ -25,107 +25,483 @@ HOUR_TO_SECS = 3600.0
 DAY_TO_SECS = 24*HOUR_TO_SECS
 YEAR_TO_SECS = 365.25*DAY_TO_SECS
 
+MIN_MAG = -2.0
+
+# Maximum number of times a time window is split in half.
+MAX_WINDOW_SPLITS = 8
+
+# Overlap for incremental updates to allow for clock differences.
+UPDATE_MARGIN_SECS = 60.0
+
+# Resolution of update times in feeds (ms), for comparing update times
+# read from different formats.
+UPDATE_RESOLUTION_SECS = 1.0e-3
+
+# Projections used for distance and azimuth, keyed by mainshock epicenter.
+_projections = {}
+
 # ----------------------------------------------------------------------
 class Catalog(object):
 
 
     def __init__(self, filename=None):
-        self.events = None
+        self._events = None
+        self._eventsFilename = None
+        self._eventsFromTable = False
+        self.table = None
         self.filename = filename
+        self._distanceOrigin = None
+        self._spatialIndex = None
         return
 
 
-    def fetch(self, starttime, endtime, longitude, latitude, maxdist, minmag, catalog):
-        datacenter = catalog[0]
-        if datacenter == "USGS":
-            services = {'station': None,
-                        'event': "http://earthquake.usgs.gov/fdsnws/event/1",
-                        'dataselect': None}
-            client = Client(datacenter, service_mappings=services, debug=False)
-        else:
-            client = Client(datacenter, debug=False)
-        kwds = {}
+    @property
+    def events(self):
+        """
+        ObsPy catalog of events. If the table was loaded with the streaming
+        reader, the ObsPy events are read from the file on first access.
+        If the table was loaded from GeoJSON, the ObsPy events are created
+        from the table on first access.
+        """
+        if self._events is None and not self._eventsFilename is None:
+            self._events = Catalog._readEvents(self._eventsFilename, self.table)
+            self._eventsFilename = None
+        elif self._events is None and self._eventsFromTable and not self.table is None:
+            self._events = self.table.toEvents()
+            self._eventsFromTable = False
+        return self._events
+
+
+    @events.setter
+    def events(self, value):
+        self._events = value
+        self._eventsFilename = None
+        self._eventsFromTable = False
+        return
+
+
+    def count(self):
+        if self.table is None:
+            return 0
+        return self.table.count()
+
+
+    def fetch(self, starttime, endtime, longitude, latitude, maxdist, minmag, catalog, maxEvents=None, maxConcurrent=4, cache=None, ttl=0.0, **kwargs):
+        """
+        Fetch events from data center.
+
+        If maxEvents is given, the number of matching events is estimated
+        first. If it exceeds maxEvents, the time range is split into
+        windows that are fetched concurrently (at most maxConcurrent at a
+        time) and stitched back together in time order without
+        duplicates. Windows rejected by the data center as too large are
+        split in half until they succeed.
+
+        If cache (ResponseCache) is given, responses are reused for ttl
+        seconds and revalidated with the data center after that; events
+        created or updated since the response was fetched are merged
+        into it. Queries without matching events are cached as empty
+        catalogs.
+        """
+        client = Catalog._client(catalog[0])
+        query = dict(kwargs)
         if catalog[1] != "":
-            kwds = {"catalog": catalog[1]}
-        if not self.filename is None:
-            kwds['filename'] = self.filename
-            
-        self.events = client.get_events(
-            starttime=starttime, 
-            endtime=endtime, 
-            longitude=longitude, 
-            latitude=latitude, 
-            maxradius=maxdist,
-            minmagnitude=minmag,
-            orderby="time-asc",
-            **kwds)
+            query["catalog"] = catalog[1]
+        query.update({
+            "starttime": starttime,
+            "endtime": endtime,
+            "longitude": longitude,
+            "latitude": latitude,
+            "maxradius": maxdist,
+            "minmagnitude": minmag,
+            "orderby": "time-asc",
+            })
+
+        if not cache is None:
+            fetchData = lambda query: Catalog._fetchData(client, query, maxEvents, maxConcurrent)
+            data = cache.get(catalog[0], query, ttl, fetchData, Catalog._mergeData)
+            if not self.filename is None:
+                tmpFilename = self.filename + ".tmp"
+                with open(tmpFilename, "wb") as fout:
+                    fout.write(data)
+                os.replace(tmpFilename, self.filename)
+                self.events = None
+            else:
+                self.events = obspy.core.event.read_events(io.BytesIO(data), format="QUAKEML")
+            self._updateTable()
+        elif maxEvents is None or starttime is None:
+            if not self.filename is None:
+                query['filename'] = self.filename
+            self.events = client.getEvents(**query)
+            self._updateTable()
+        else:
+            self.events = Catalog._fetchWindowed(client, query, maxEvents, maxConcurrent)
+            self._updateTable()
+            if not self.filename is None:
+                self.write()
         return
 
 
-    def load(self):
-        if self.events is None:
-            if not os.path.isfile(self.filename):
-                return
-            
-            catalog = obspy.core.event.read_events(self.filename, format="QUAKEML")
-            catalogF = catalog.filter("magnitude >= -2.0")
-            catalogF = obspy.core.event.Catalog(catalogF, description=catalog.description, comments=catalog.comments, creation_info=catalog.creation_info)
-            self.events = catalogF
+    def fetchUpdates(self, starttime, endtime, longitude, latitude, maxdist, minmag, catalog, maxEvents=None, maxConcurrent=4, cache=None, ttl=0.0, write=True):
+        """
+        Fetch only events created or updated since the catalog file was
+        last written, merge them into the events in the file, and rewrite
+        the file atomically (if write is True). Fetches the entire catalog
+        if the file does not exist.
+
+        Events deleted at the data center after the original fetch are
+        not removed.
+
+        Returns the number of new or updated events.
+        """
+        from obspy.clients.fdsn.header import FDSNNoDataException
+
+        self.load()
+        if self.count() == 0:
+            self.fetch(starttime, endtime, longitude, latitude, maxdist, minmag, catalog, maxEvents, maxConcurrent, cache, ttl)
+            self.load()
+            return self.count()
+
+        queryTime = UTCDateTime()
+        kwds = {}
+        if not self.table.creationTime is None:
+            kwds["updatedafter"] = self.table.creationTime - UPDATE_MARGIN_SECS
+        else:
+            starttime = max(UTCDateTime(starttime), UTCDateTime(numpy.max(self.table["time"])))
+
+        updates = Catalog()
+        try:
+            updates.fetch(starttime, endtime, longitude, latitude, maxdist, minmag, catalog, maxEvents, maxConcurrent, **kwds)
+        except FDSNNoDataException:
+            pass
+        self.merge(updates)
+        self.events.creation_info = obspy.core.event.CreationInfo(creation_time=queryTime)
+        self.table.creationTime = queryTime
+        if write:
+            self.write()
+        return updates.count()
+
+
+    def merge(self, other):
+        """
+        Merge events from another catalog. An event with the same event id
+        as an existing event replaces it if it is at least as recently
+        updated. Events are kept in time order.
+        """
+        if other.count() == 0:
+            return
+        if self.count() == 0:
+            self.events = other.events
+            self.table = other.table
+            return
+
+        nevents = self.count()
+        events = list(self.events) + list(other.events)
+        table = EventTable.concatenate([self.table, other.table])
+        data = table.data
+        keep = numpy.ones(data.shape[0], dtype=bool)
+        index = dict([(eventId, i) for i,eventId in enumerate(data["eventid"][:nevents])])
+        for i in range(nevents, data.shape[0]):
+            eventId = data["eventid"][i]
+            j = index.get(eventId)
+            if j is None:
+                index[eventId] = i
+            elif data["updated"][i] < data["updated"][j]:
+                keep[i] = False
+            else:
+                keep[j] = False
+                index[eventId] = i
+
+        # Rows from the existing table keep their distance and azimuth.
+        indices = numpy.nonzero(keep)[0]
+        order = indices[numpy.argsort(data["time"][indices], kind="stable")]
+        creationInfo = other.events.creation_info or self.events.creation_info
+        self.events = obspy.core.event.Catalog([events[i] for i in order], creation_info=creationInfo)
+        self.table = table.select(order)
         return
 
 
-    def addDistanceAzimuth(self, mainshock):
-        if self.events is None:
+    def loadFeeds(self, filenames, starttime=None, endtime=None, longitude=None, latitude=None, maxdist=None, minmag=None, cache=False):
+        """
+        Load events from GeoJSON feed files (for example, the USGS
+        all_hour, all_day, all_week, and all_month summary feeds) and
+        select them locally with the same criteria as fetch (maxdist is
+        the great circle distance in degrees). Criteria that are None are
+        not applied.
+
+        An event in more than one feed is kept once, using the most
+        recently updated version. Missing feed files are skipped. Events
+        are in time order, and the creation time is the generation time
+        of the newest feed. The ObsPy events are created from the table
+        on first access.
+        """
+        tables = []
+        for filename in filenames:
+            feed = Catalog(filename)
+            feed.load(cache=cache)
+            if not feed.table is None:
+                tables.append(feed.table)
+        if len(tables) == 0:
+            self.events = None
+            self.table = None
             return
-        
-        from obspy.core import AttribDict
-        ns = "http://earthquake.usgs.gov/xmlns/1.0"
-        
-        origin = mainshock.preferred_origin()
-        utmZone = int(math.floor((origin.longitude+180)/6)+1)
-        proj = pyproj.Proj(proj="utm", zone=utmZone, ellps='WGS84')
-        x0,y0 = proj(origin.longitude, origin.latitude)
 
-        for event in self.events:
-            origin = event.preferred_origin()
-            xE,yE = proj(origin.longitude, origin.latitude)
-            dx = xE-x0
-            dy = yE-y0
+        table = EventTable.concatenate(tables)
+        data = table.data
+
+        # Last (most recently updated) row of each event id.
+        order = numpy.lexsort((data["updated"], data["eventid"]))
+        eventIds = data["eventid"][order]
+        last = numpy.ones(order.shape[0], dtype=bool)
+        last[:-1] = eventIds[1:] != eventIds[:-1]
+        indices = order[last]
+
+        mask = EventTable.selectionMask(data[indices], starttime, endtime, longitude, latitude, maxdist, minmag)
+        indices = indices[mask]
+        indices = indices[numpy.argsort(data["time"][indices], kind="stable")]
+
+        self.table = table.select(indices)
+        creationTimes = [feed.creationTime for feed in tables if not feed.creationTime is None]
+        self.table.creationTime = max(creationTimes) if len(creationTimes) > 0 else None
+        self._deferEvents(fromTable=True)
+        self._distanceOrigin = None
+        return
+
 
-            dist = ((xE-x0)**2 + (yE-y0)**2)**0.5                
-            distAttrib = AttribDict({'type': "attribute", 'namespace': ns, 'value': dist})
+    def fetchFeedUpdates(self, filenames, starttime=None, endtime=None, longitude=None, latitude=None, maxdist=None, minmag=None, cache=False, write=True):
+        """
+        Merge events selected from GeoJSON feed files (see loadFeeds) that
+        are new or more recently updated into the events in the catalog
+        file, and rewrite the file atomically (if write is True).
+
+        The feeds only cover the last month, so events in the file that
+        are older than the feeds are kept. Events deleted at the data
+        center are not removed.
+
+        Returns the number of new or updated events.
+        """
+        self.load()
+        updates = Catalog()
+        updates.loadFeeds(filenames, starttime, endtime, longitude, latitude, maxdist, minmag, cache)
+        return self._mergeUpdates(updates, write)
+
+
+    def loadStore(self, store, starttime=None, endtime=None, longitude=None, latitude=None, maxdist=None, minmag=None):
+        """
+        Load events from an EventStore (or the filename of one) matching
+        the same criteria as fetch (maxdist is the great circle distance
+        in degrees). Criteria that are None are not applied.
+
+        The ObsPy events are created from the table on first access.
+        """
+        from eqresponse.seismicity.EventStore import EventStore
+
+        opened = not isinstance(store, EventStore)
+        if opened:
+            store = EventStore(store)
+        try:
+            self.table = store.query(starttime, endtime, longitude, latitude, maxdist, minmag)
+        finally:
+            if opened:
+                store.close()
+        self._deferEvents(fromTable=True)
+        self._distanceOrigin = None
+        return
 
-            azimuth = 180.0*math.atan2(dx, dy)/math.pi
-            if azimuth < 0.0:
-                azimuth += 360.0
-            
-            azimuthAttrib = AttribDict({'type': "attribute", 'namespace': ns, 'value': azimuth})
 
-            if hasattr(event, 'extra'):
-                extraAttrib = event.extra
+    def fetchStoreUpdates(self, store, starttime=None, endtime=None, longitude=None, latitude=None, maxdist=None, minmag=None, write=True):
+        """
+        Merge events selected from an EventStore (see loadStore) that are
+        new or more recently updated into the events in the catalog file,
+        and rewrite the file atomically (if write is True).
+
+        Returns the number of new or updated events.
+        """
+        self.load()
+        updates = Catalog()
+        updates.loadStore(store, starttime, endtime, longitude, latitude, maxdist, minmag)
+        return self._mergeUpdates(updates, write)
+
+
+    def load(self, streaming=False, cache=False):
+        """
+        Load catalog from QuakeML file or GeoJSON file (filename ending in
+        .geojson, such as the USGS summary feeds).
+
+        With streaming=True, only the event table is extracted from the
+        QuakeML file; the full ObsPy events are read only if they are
+        accessed. GeoJSON files are always read directly into the event
+        table.
+
+        With cache=True, the event table is loaded from binary sidecar
+        files next to the file if they are up to date; otherwise the
+        sidecar files are written after parsing.
+        """
+        if self.table is None:
+            if not os.path.isfile(self.filename):
+                return
+
+            geojson = Catalog._isGeoJSON(self.filename)
+            sidecar = CatalogCache(self.filename) if cache else None
+            if not sidecar is None:
+                self.table = sidecar.load(minmag=MIN_MAG)
+                if not self.table is None:
+                    self._deferEvents(fromTable=geojson)
+                    return
+
+            if geojson:
+                self.table = GeoJSONReader(minmag=MIN_MAG).read(self.filename)
+                self._deferEvents(fromTable=True)
+            elif streaming:
+                self.table = QuakeMLReader(minmag=MIN_MAG).read(self.filename)
+                self._deferEvents(fromTable=False)
             else:
-                extraAttrib = AttribDict()
-                event.extra = extraAttrib
-                
-            extraAttrib.mainshock_distance = distAttrib
-            extraAttrib.mainshock_azimuth = azimuthAttrib
+                self.events = Catalog._readEvents(self.filename)
+                self._updateTable()
+
+            if not sidecar is None:
+                sidecar.save(self.table, minmag=MIN_MAG)
+        return
+
+
+    def select(self, indices, filename=None):
+        """
+        Create catalog with subset of events given by indices.
+
+        If the ObsPy events have not been read yet, the subset reads them
+        from the file (or creates them from the table) on first access.
+        """
+        catalog = Catalog(filename)
+        catalog.table = self.table.select(indices)
+        if self._events is None and not self._eventsFilename is None:
+            catalog._eventsFilename = self._eventsFilename
+        elif self._events is None and self._eventsFromTable:
+            catalog._eventsFromTable = True
+        else:
+            events = self.events
+            catalog.events = obspy.core.event.Catalog([events[i] for i in indices], creation_info=events.creation_info)
+        return catalog
+
+
+    def spatialIndex(self):
+        """
+        Get spatial index of epicenters. The index is built on first use
+        and rebuilt if the event table is replaced.
+        """
+        from eqresponse.seismicity.SpatialIndex import SpatialIndex
+
+        if self.table is None:
+            return None
+        if self._spatialIndex is None or not self._spatialIndex[0] is self.table:
+            self._spatialIndex = (self.table, SpatialIndex(self.table))
+        return self._spatialIndex[1]
+
+
+    def withinRadius(self, longitude, latitude, radiusKm):
+        """
+        Get indices of events with epicenters within radiusKm (geodesic
+        distance) of point.
+        """
+        if self.table is None:
+            return numpy.zeros((0,), dtype=numpy.int64)
+        return self.spatialIndex().withinRadius(longitude, latitude, radiusKm)
+
+
+    def withinBox(self, lonMin, lonMax, latMin, latMax):
+        """
+        Get indices of events with epicenters in bounding box.
+        """
+        if self.table is None:
+            return numpy.zeros((0,), dtype=numpy.int64)
+        return self.spatialIndex().withinBox(lonMin, lonMax, latMin, latMax)
+
+
+    def nearest(self, longitude, latitude, k=1):
+        """
+        Get indices and distances (m) of the k events nearest to point.
+        """
+        if self.table is None:
+            return (numpy.zeros((0,), dtype=numpy.int64), numpy.zeros((0,), dtype=numpy.float64))
+        return self.spatialIndex().nearest(longitude, latitude, k)
+
+
+    def addDistanceAzimuth(self, mainshock, method="geodesic"):
+        """
+        Compute distance (m) and azimuth (degrees) of all events from the
+        mainshock epicenter.
+
+        method = "geodesic": Distance along the WGS84 ellipsoid (valid at
+            any distance, including across UTM zone boundaries).
+        method = "utm": Cartesian distance in the UTM zone of the mainshock.
+
+        If distances were already computed for the same epicenter and
+        method, only events without a distance are updated.
+        """
+        if self.table is None:
+            return
+
+        origin = mainshock.preferred_origin()
+        distanceOrigin = (origin.longitude, origin.latitude, method)
+        data = self.table.data
+        if distanceOrigin == self._distanceOrigin:
+            rows = numpy.nonzero(numpy.isnan(data["distance"]))[0]
+            if rows.shape[0] == 0:
+                return
+        else:
+            rows = slice(None)
+        lon = data["longitude"][rows]
+        lat = data["latitude"][rows]
+
+        if method == "geodesic":
+            geod = Catalog._geodesic()
+            nevents = lon.shape[0]
+            azimuth, backAzimuth, dist = geod.inv(
+                numpy.full(nevents, origin.longitude), numpy.full(nevents, origin.latitude),
+                lon, lat)
+        elif method == "utm":
+            proj, x0, y0 = Catalog._utmProjection(origin.longitude, origin.latitude)
+            xE, yE = proj(lon, lat)
+            dx = xE - x0
+            dy = yE - y0
+            dist = numpy.hypot(dx, dy)
+            azimuth = numpy.degrees(numpy.arctan2(dx, dy))
+        else:
+            raise ValueError("Unknown distance method '%s'." % method)
+
+        data["distance"][rows] = dist
+        data["azimuth"][rows] = numpy.mod(azimuth, 360.0)
+        self._distanceOrigin = distanceOrigin
+        return
+    
 
+    def write(self, filename=None):
+        """
+        Write catalog to QuakeML file, including distance and azimuth from
+        the mainshock as extra attributes.
+        """
+        if filename is None:
+            filename = self.filename
+        if Catalog._isGeoJSON(filename):
+            raise ValueError("Cannot write catalog to GeoJSON file '%s'." % filename)
+        self._addExtraAttributes()
+        tmpFilename = filename + ".tmp"
+        self.events.write(tmpFilename, format="QUAKEML")
+        os.replace(tmpFilename, filename)
         return
     
     
     def getHypocenterMag(self):
-
-        from matplotlib.dates import date2num
-        
-        nevents = self.events.count()
-        hypocenters = numpy.zeros((nevents, 3), dtype=numpy.float)
-        mag = numpy.zeros((nevents,), dtype=numpy.float)
-        t = numpy.zeros((nevents,), dtype=numpy.float)
-        for i,event in enumerate(self.events):
-            origin = event.preferred_origin()
-            hypocenters[i,:] = (origin.longitude, origin.latitude, origin.depth)
-            t[i] = date2num(origin.time)
-            mag[i] = event.preferred_magnitude().mag
+        """
+        Get hypocenters, magnitudes, and origin times as Matplotlib date
+        numbers (days since the Matplotlib epoch, rcParams["date.epoch"]).
+        """
+        from matplotlib.dates import get_epoch
+
+        data = self.table.data
+        hypocenters = numpy.column_stack((data["longitude"], data["latitude"], data["depth"]))
+        mag = data["mag"].copy()
+        epochDays = (numpy.datetime64(get_epoch(), "us") - numpy.datetime64("1970-01-01T00:00:00", "us")) / numpy.timedelta64(1, "D")
+        t = data["time"] / DAY_TO_SECS - epochDays
         return (hypocenters, mag, t)
 
 
@@ -266,14 +642,269 @@ class Catalog(object):
         return lookup[ilookup]
     
 
+    def _addExtraAttributes(self):
+        """
+        Attach distance and azimuth in table to ObsPy events.
+        """
+        if self.table is None or self.events is None:
+            return
+
+        from obspy.core import AttribDict
+        ns = "http://earthquake.usgs.gov/xmlns/1.0"
+
+        data = self.table.data
+        for i,event in enumerate(self.events):
+            if numpy.isnan(data["distance"][i]):
+                continue
+            distAttrib = AttribDict({'type': "attribute", 'namespace': ns, 'value': float(data["distance"][i])})
+            azimuthAttrib = AttribDict({'type': "attribute", 'namespace': ns, 'value': float(data["azimuth"][i])})
+            if hasattr(event, 'extra'):
+                extraAttrib = event.extra
+            else:
+                extraAttrib = AttribDict()
+                event.extra = extraAttrib
+            extraAttrib.mainshock_distance = distAttrib
+            extraAttrib.mainshock_azimuth = azimuthAttrib
+        return
+
+
+    @staticmethod
+    def _utmProjection(longitude, latitude):
+        """
+        Get UTM projection for zone containing epicenter and projected
+        coordinates of epicenter. Projections are cached by epicenter.
+        """
+        key = ("utm", longitude, latitude)
+        if not key in _projections:
+            import pyproj
+            utmZone = int(math.floor((longitude+180)/6)+1)
+            proj = pyproj.Proj(proj="utm", zone=utmZone, ellps='WGS84')
+            x0,y0 = proj(longitude, latitude)
+            _projections[key] = (proj, x0, y0)
+        return _projections[key]
+
+
+    @staticmethod
+    def _geodesic():
+        key = ("geodesic",)
+        if not key in _projections:
+            import pyproj
+            _projections[key] = pyproj.Geod(ellps='WGS84')
+        return _projections[key]
+
+
+    @staticmethod
+    def _client(datacenter):
+        from eqresponse.core import ClientRegistry
+        return ClientRegistry.getClient(datacenter)
+
+
     @staticmethod
+    def _fetchData(client, query, maxEvents, maxConcurrent):
+        """
+        Fetch QuakeML (bytes) for query. If no events match the query, the
+        QuakeML document has an empty catalog.
+        """
+        from obspy.clients.fdsn.header import FDSNNoDataException
+
+        buffer = io.BytesIO()
+        if maxEvents is None or query["starttime"] is None:
+            queryTime = UTCDateTime()
+            try:
+                client.getEvents(filename=buffer, **query)
+            except FDSNNoDataException:
+                buffer = io.BytesIO()
+                events = obspy.core.event.Catalog(creation_info=obspy.core.event.CreationInfo(creation_time=queryTime))
+                events.write(buffer, format="QUAKEML")
+        else:
+            events = Catalog._fetchWindowed(client, query, maxEvents, maxConcurrent)
+            events.write(buffer, format="QUAKEML")
+        return buffer.getvalue()
+
+
+    @staticmethod
+    def _mergeData(data, updates):
+        """
+        Merge events in QuakeML updates (bytes) into QuakeML data (bytes)
+        by event id, as in merge. Returns the merged QuakeML or None if
+        there are no updates.
+        """
+        catalogUpdates = Catalog()
+        catalogUpdates.events = obspy.core.event.read_events(io.BytesIO(updates), format="QUAKEML")
+        if len(catalogUpdates.events) == 0:
+            return None
+        catalogUpdates._updateTable()
+
+        catalog = Catalog()
+        catalog.events = obspy.core.event.read_events(io.BytesIO(data), format="QUAKEML")
+        catalog._updateTable()
+        catalog.merge(catalogUpdates)
+        buffer = io.BytesIO()
+        catalog.events.write(buffer, format="QUAKEML")
+        return buffer.getvalue()
+
+
+    @staticmethod
+    def _fetchWindowed(client, query, maxEvents, maxConcurrent):
+        """
+        Fetch events in time windows sized so that each window holds
+        about maxEvents events.
+        """
+        from concurrent.futures import ThreadPoolExecutor
+
+        queryTime = UTCDateTime()
+        starttime = UTCDateTime(query["starttime"])
+        endtime = UTCDateTime(query["endtime"]) if not query["endtime"] is None else queryTime
+
+        count = Catalog._countEvents(client, query)
+        nwindows = 1
+        if not count is None and count > maxEvents:
+            nwindows = int(math.ceil(float(count)/maxEvents))
+        dt = (endtime - starttime) / nwindows
+        windows = [(starttime + i*dt, starttime + (i+1)*dt) for i in range(nwindows)]
+        windows[-1] = (windows[-1][0], endtime)
+
+        fetchWindow = lambda window: Catalog._fetchWindow(client, query, window[0], window[1])
+        if nwindows > 1:
+            with ThreadPoolExecutor(max_workers=max(1, maxConcurrent)) as executor:
+                results = list(executor.map(fetchWindow, windows))
+        else:
+            results = [fetchWindow(windows[0])]
+
+        # Events at window boundaries are returned by both windows.
+        events = []
+        eventIds = set()
+        for windowEvents in results:
+            for event in windowEvents:
+                if not event.resource_id.id in eventIds:
+                    eventIds.add(event.resource_id.id)
+                    events.append(event)
+        return obspy.core.event.Catalog(events, creation_info=obspy.core.event.CreationInfo(creation_time=queryTime))
+
+
+    @staticmethod
+    def _fetchWindow(client, query, starttime, endtime, depth=0):
+        """
+        Fetch events in time window, splitting the window in half if the
+        data center rejects the request as too large.
+        """
+        from obspy.clients.fdsn.header import FDSNNoDataException, FDSNRequestTooLargeException, FDSNTimeoutException, FDSNBadRequestException
+
+        windowQuery = dict(query)
+        windowQuery["starttime"] = starttime
+        windowQuery["endtime"] = endtime
+        try:
+            return list(client.getEvents(**windowQuery))
+        except FDSNNoDataException:
+            return []
+        except (FDSNRequestTooLargeException, FDSNTimeoutException, FDSNBadRequestException) as err:
+            if isinstance(err, FDSNBadRequestException) and not "limit" in str(err).lower():
+                raise
+            if depth >= MAX_WINDOW_SPLITS:
+                raise
+            tmid = starttime + 0.5*(endtime - starttime)
+            return Catalog._fetchWindow(client, query, starttime, tmid, depth+1) + Catalog._fetchWindow(client, query, tmid, endtime, depth+1)
+
+
+    @staticmethod
+    def _countEvents(client, query):
+        """
+        Get number of matching events from the count method of the event
+        service. Returns None if the data center does not support it.
+        """
+        params = {}
+        for key in ("starttime", "endtime", "longitude", "latitude", "maxradius", "minmagnitude", "catalog", "updatedafter"):
+            if not query.get(key) is None:
+                value = query[key]
+                if key in ("starttime", "endtime", "updatedafter"):
+                    value = str(UTCDateTime(value))
+                params[key] = value
+        return client.countEvents(**params)
+
+
+    @staticmethod
+    def _readEvents(filename, table=None):
+        """
+        Read ObsPy events from QuakeML file. If table is given, select the
+        events in the table in the same order.
+        """
+        catalog = obspy.core.event.read_events(filename, format="QUAKEML")
+        if table is None:
+            events = catalog.filter("magnitude >= %3.1f" % MIN_MAG)
+        else:
+            eventsById = dict([(EventTable.eventId(event), event) for event in catalog])
+            events = [eventsById[eventId] for eventId in table["eventid"]]
+        return obspy.core.event.Catalog(events, description=catalog.description, comments=catalog.comments, creation_info=catalog.creation_info)
+
+
+    @staticmethod
+    def _isGeoJSON(filename):
+        return filename.lower().endswith(".geojson")
+
+
+    def _mergeUpdates(self, updates, write):
+        """
+        Merge events in updates that are new or more recently updated.
+        Returns the number of new or updated events.
+        """
+        if updates.table is None:
+            return 0
+
+        changed = self._changedIndices(updates.table)
+        self.merge(updates.select(changed))
+        if self.table is None:
+            return 0
+        creationTime = updates.table.creationTime
+        if not creationTime is None and (self.table.creationTime is None or creationTime > self.table.creationTime):
+            self.events.creation_info = obspy.core.event.CreationInfo(creation_time=creationTime)
+            self.table.creationTime = creationTime
+        if write:
+            self.write()
+        return changed.shape[0]
+
+
+    def _changedIndices(self, table):
+        """
+        Get indices of events in table that are not in the catalog or are
+        more recently updated than in the catalog. Events in the catalog
+        without an update time are older than any update, as in
+        EventStore.
+        """
+        if self.count() == 0:
+            return numpy.arange(table.count())
+        data = self.table.data
+        order = numpy.argsort(data["eventid"])
+        eventIds = data["eventid"][order]
+        pos = numpy.minimum(numpy.searchsorted(eventIds, table["eventid"]), eventIds.shape[0]-1)
+        found = eventIds[pos] == table["eventid"]
+        updated = data["updated"][order[pos]]
+        newer = (table["updated"] > updated + UPDATE_RESOLUTION_SECS) | (numpy.isnan(updated) & ~numpy.isnan(table["updated"]))
+        return numpy.nonzero(~found | newer)[0]
+
+
+    def _deferEvents(self, fromTable):
+        """
+        Create the ObsPy events on first access from the table (fromTable
+        is True) or by reading the file.
+        """
+        self._events = None
+        self._eventsFilename = None if fromTable else self.filename
+        self._eventsFromTable = fromTable
+        return
+
+
+    def _updateTable(self):
+        if self.events is None:
+            self.table = None
+        else:
+            self.table = EventTable.fromEvents(self.events)
+        return
+
+
     def _localTimestamp(self, tstamp):
-        if tstamp is None:
-            return ""
-        tUTC = pytz.utc.localize(tstamp.datetime)
-        tL = tUTC.astimezone(self.tz)
-        localFmt = "%a %b %d %Y %I:%M:%S %p %Z"
-        return tL.strftime(localFmt)
+        from eqresponse.core.TimeFormatter import TimeFormatter
+
+        return TimeFormatter(self.tz).formatOne(tstamp)
 
 
 # End of file
@@ -0,0 +1,116 @@
+# ======================================================================
+#
+#                           Brad T. Aagaard
+#                        U.S. Geological Survey
+#
+# ======================================================================
+#
+
+import os
+import json
+import hashlib
+
+import numpy
+
+from eqresponse.seismicity.EventTable import EventTable, EVENT_ID_LENGTH
+
+# Increment when the layout of the sidecar files changes.
+FORMAT_VERSION = 1
+
+# ----------------------------------------------------------------------
+class CatalogCache(object):
+    """
+    Binary sidecar files holding the event table parsed from a QuakeML
+    file.
+
+    The table is stored as a NumPy array file (memory-mapped on load) with
+    a small JSON header. The header records the size, modification time,
+    and SHA-1 hash of the QuakeML file; the sidecar is valid if the size
+    matches and either the modification time or the hash matches.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.dataFilename = filename + ".events.npy"
+        self.headerFilename = filename + ".events.json"
+        return
+
+
+    def load(self, minmag):
+        """
+        Load event table from sidecar files. Returns None if the sidecar
+        files are missing or out of date.
+        """
+        if not os.path.isfile(self.headerFilename) or not os.path.isfile(self.dataFilename):
+            return None
+        try:
+            with open(self.headerFilename, "r") as fin:
+                header = json.load(fin)
+        except ValueError:
+            return None
+
+        dtype = EventTable.makeDtype(header.get("eventid_length", EVENT_ID_LENGTH))
+        if header.get("version") != FORMAT_VERSION or header.get("dtype") != str(dtype.descr) or header.get("minmag") != minmag:
+            return None
+        stat = os.stat(self.filename)
+        source = header["source"]
+        if stat.st_size != source["size"]:
+            return None
+        if stat.st_mtime != source["mtime"]:
+            if CatalogCache._hash(self.filename) != source["sha1"]:
+                return None
+            source["mtime"] = stat.st_mtime
+            self._writeHeader(header)
+
+        data = numpy.load(self.dataFilename, mmap_mode="c")
+        creationTime = header["creation_time"]
+        if not creationTime is None:
+            from obspy.core.utcdatetime import UTCDateTime
+            creationTime = UTCDateTime(creationTime)
+        return EventTable(data, header["mag_types"], creationTime)
+
+
+    def save(self, table, minmag):
+        """
+        Write event table to sidecar files.
+        """
+        stat = os.stat(self.filename)
+        header = {
+            "version": FORMAT_VERSION,
+            "dtype": str(table.data.dtype.descr),
+            "eventid_length": EventTable.idLengthOf(table.data),
+            "minmag": minmag,
+            "source": {
+                "size": stat.st_size,
+                "mtime": stat.st_mtime,
+                "sha1": CatalogCache._hash(self.filename),
+                },
+            "mag_types": table.magTypes,
+            "creation_time": str(table.creationTime) if not table.creationTime is None else None,
+            }
+        tmpFilename = self.dataFilename + ".tmp"
+        with open(tmpFilename, "wb") as fout:
+            numpy.save(fout, numpy.ascontiguousarray(table.data))
+        os.replace(tmpFilename, self.dataFilename)
+        self._writeHeader(header)
+        return
+
+
+    def _writeHeader(self, header):
+        tmpFilename = self.headerFilename + ".tmp"
+        with open(tmpFilename, "w") as fout:
+            json.dump(header, fout)
+        os.replace(tmpFilename, self.headerFilename)
+        return
+
+
+    @staticmethod
+    def _hash(filename):
+        sha1 = hashlib.sha1()
+        with open(filename, "rb") as fin:
+            for block in iter(lambda: fin.read(1 << 20), b""):
+                sha1.update(block)
+        return sha1.hexdigest()
+
+
+# End of file
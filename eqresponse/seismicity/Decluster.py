@@ -0,0 +1,205 @@
+# ======================================================================
+#
+#                           Brad T. Aagaard
+#                        U.S. Geological Survey
+#
+# ======================================================================
+#
+
+import math
+
+import numpy
+
+from eqresponse.seismicity.SpatialIndex import SpatialIndex, EARTH_RADIUS_KM
+
+DAY_TO_SECS = 24*3600.0
+
+# Time windows with more candidates than this are intersected with a
+# spatial index query instead of computing all distances.
+MAX_SCAN_EVENTS = 512
+
+# ----------------------------------------------------------------------
+class Decluster(object):
+    """
+    Separate an event table into independent events and clusters
+    (foreshocks, mainshock, and aftershocks).
+
+    Both methods return (clusters, independent):
+      clusters: Cluster id of each event (0 for events not in a cluster).
+      independent: True for events not in a cluster and for the largest
+        event of each cluster.
+
+    Events are visited in a sweep over the sorted origin times, so each
+    event is only compared with events inside its time window; windows
+    with many events are narrowed with the spatial index. Distances are
+    great circle distances on a sphere.
+    """
+
+    def __init__(self, table, spatialIndex=None):
+        data = table.data
+        self.nevents = data.shape[0]
+        self.time = numpy.array(data["time"], dtype=numpy.float64)
+        self.mag = numpy.array(data["mag"], dtype=numpy.float64)
+        self.longitude = numpy.array(data["longitude"], dtype=numpy.float64)
+        self.latitude = numpy.array(data["latitude"], dtype=numpy.float64)
+        self.index = spatialIndex if not spatialIndex is None else SpatialIndex(table)
+
+        self.order = numpy.argsort(self.time, kind="stable")
+        self.timeSorted = self.time[self.order]
+        return
+
+
+    def run(self, method, **kwargs):
+        """
+        Decluster with method "gardner_knopoff" or "reasenberg".
+        """
+        if method == "gardner_knopoff":
+            return self.gardnerKnopoff(**kwargs)
+        elif method == "reasenberg":
+            return self.reasenberg(**kwargs)
+        raise ValueError("Unknown declustering method '%s'." % method)
+
+
+    def gardnerKnopoff(self, foreshockFraction=0.0):
+        """
+        Decluster using the space-time windows of Gardner and Knopoff
+        (1974).
+
+        Events are processed from largest to smallest magnitude. Each
+        event not yet in a cluster claims the unassigned events within
+        its distance window and within its time window after it (and
+        foreshockFraction of the time window before it).
+        """
+        clusters = numpy.zeros(self.nevents, dtype=numpy.int64)
+        independent = numpy.ones(self.nevents, dtype=bool)
+
+        magOrder = numpy.argsort(-self.mag, kind="stable")
+        nclusters = 0
+        for i in magOrder:
+            if clusters[i] != 0 or numpy.isnan(self.mag[i]):
+                continue
+            (distKm, durationDays) = Decluster.gardnerKnopoffWindow(self.mag[i])
+            duration = durationDays*DAY_TO_SECS
+            members = self._neighbors(i, self.time[i]-foreshockFraction*duration, self.time[i]+duration, distKm)
+            members = members[clusters[members] == 0]
+            if members.shape[0] <= 1:
+                continue
+            nclusters += 1
+            clusters[members] = nclusters
+            independent[members] = False
+            independent[i] = True
+        return (clusters, independent)
+
+
+    def reasenberg(self, tauMin=1.0, tauMax=10.0, p=0.95, xk=0.5, xmeff=1.5, rfact=10.0):
+        """
+        Decluster using the cluster linking algorithm of Reasenberg (1985).
+
+        Events are processed in time order. The look-ahead time of an
+        event in a cluster grows with the time since the largest event of
+        the cluster (tauMin to tauMax days, with probability p of
+        detecting the next event); the interaction distance is rfact
+        times the crack radius of the event, and at least the crack
+        radius of the largest event in the cluster. Linked events join
+        (or merge) clusters.
+        """
+        parent = numpy.arange(self.nevents)
+        # Largest event and its magnitude for each cluster root.
+        biggest = numpy.arange(self.nevents)
+        clustered = numpy.zeros(self.nevents, dtype=bool)
+
+        def root(k):
+            while parent[k] != k:
+                parent[k] = parent[parent[k]]
+                k = parent[k]
+            return k
+
+        def union(k, m):
+            rk = root(k)
+            rm = root(m)
+            if rk == rm:
+                return rk
+            parent[rm] = rk
+            if self.mag[biggest[rm]] > self.mag[biggest[rk]]:
+                biggest[rk] = biggest[rm]
+            return rk
+
+        for isorted in range(self.nevents):
+            i = self.order[isorted]
+            if numpy.isnan(self.mag[i]):
+                continue
+            radiusKm = rfact*Decluster.crackRadius(self.mag[i])
+            if clustered[i]:
+                big = biggest[root(i)]
+                mbig = self.mag[big]
+                dtDays = (self.time[i] - self.time[big])/DAY_TO_SECS
+                deltam = (1.0-xk)*mbig - xmeff
+                denom = 10.0**((deltam-1.0)*2.0/3.0)
+                tau = -math.log(1.0-p)*max(dtDays, 0.0)/denom if denom > 0.0 else tauMax
+                tau = min(max(tau, tauMin), tauMax)
+                radiusKm = max(radiusKm, Decluster.crackRadius(mbig))
+            else:
+                tau = tauMin
+
+            neighbors = self._neighbors(i, self.time[i], self.time[i]+tau*DAY_TO_SECS, radiusKm)
+            neighbors = neighbors[self.time[neighbors] > self.time[i]]
+            neighbors = neighbors[~numpy.isnan(self.mag[neighbors])]
+            for j in neighbors:
+                union(i, j)
+                clustered[j] = True
+            if neighbors.shape[0] > 0:
+                clustered[i] = True
+
+        clusters = numpy.zeros(self.nevents, dtype=numpy.int64)
+        independent = numpy.ones(self.nevents, dtype=bool)
+        roots = numpy.array([root(k) for k in range(self.nevents)], dtype=numpy.int64)
+        members = numpy.nonzero(clustered)[0]
+        if members.shape[0] > 0:
+            uniqueRoots, ids = numpy.unique(roots[members], return_inverse=True)
+            clusters[members] = ids + 1
+            independent[members] = False
+            independent[biggest[uniqueRoots]] = True
+        return (clusters, independent)
+
+
+    @staticmethod
+    def gardnerKnopoffWindow(mag):
+        """
+        Get distance (km) and time (days) windows of Gardner and Knopoff
+        (1974) for magnitude.
+        """
+        distKm = 10.0**(0.1238*mag + 0.983)
+        if mag >= 6.5:
+            durationDays = 10.0**(0.032*mag + 2.7389)
+        else:
+            durationDays = 10.0**(0.5409*mag - 0.547)
+        return (distKm, durationDays)
+
+
+    @staticmethod
+    def crackRadius(mag):
+        """
+        Crack radius (km) of Kanamori and Anderson (1975) used by
+        Reasenberg (1985).
+        """
+        return 10.0**(0.4*mag - 1.918)
+
+
+    def _neighbors(self, i, tstart, tend, distKm):
+        """
+        Get indices of events with origin times in [tstart, tend] within
+        distKm of event i (including event i).
+        """
+        istart = numpy.searchsorted(self.timeSorted, tstart, side="left")
+        iend = numpy.searchsorted(self.timeSorted, tend, side="right")
+        candidates = self.order[istart:iend]
+        if candidates.shape[0] > MAX_SCAN_EVENTS:
+            nearby = self.index.candidatesWithinRadius(self.longitude[i], self.latitude[i], distKm)
+            candidates = nearby[(self.time[nearby] >= tstart) & (self.time[nearby] <= tend)]
+        xyz = self.index.xyz
+        chord = numpy.linalg.norm(xyz[candidates] - xyz[i], axis=1)
+        dist = 2.0*EARTH_RADIUS_KM*numpy.arcsin(numpy.minimum(0.5*chord, 1.0))
+        return candidates[dist <= distKm]
+
+
+# End of file
@@ -0,0 +1,254 @@
+# ======================================================================
+#
+#                           Brad T. Aagaard
+#                        U.S. Geological Survey
+#
+# ======================================================================
+#
+
+import os
+import time
+import math
+import sqlite3
+
+import numpy
+
+from eqresponse.seismicity.EventTable import EventTable
+
+# Increment when the database schema changes.
+SCHEMA_VERSION = 1
+
+SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS events (
+        eventid TEXT PRIMARY KEY,
+        time REAL NOT NULL,
+        longitude REAL,
+        latitude REAL,
+        depth REAL,
+        mag REAL,
+        magtype TEXT,
+        updated REAL
+        )""",
+    "CREATE INDEX IF NOT EXISTS events_time ON events (time)",
+    "CREATE INDEX IF NOT EXISTS events_mag ON events (mag)",
+    "CREATE INDEX IF NOT EXISTS events_location ON events (latitude, longitude)",
+    """CREATE TABLE IF NOT EXISTS ingests (
+        filename TEXT PRIMARY KEY,
+        size INTEGER,
+        mtime REAL,
+        generated REAL,
+        ingested REAL,
+        nevents INTEGER
+        )""",
+    ]
+
+# Replace an existing event only with a more recently updated version.
+UPSERT = """INSERT INTO events (eventid, time, longitude, latitude, depth, mag, magtype, updated)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (eventid) DO UPDATE SET
+        time=excluded.time, longitude=excluded.longitude, latitude=excluded.latitude, depth=excluded.depth,
+        mag=excluded.mag, magtype=excluded.magtype, updated=excluded.updated
+    WHERE events.updated IS NULL OR excluded.updated > events.updated"""
+
+# ----------------------------------------------------------------------
+class EventStore(object):
+    """
+    Persistent store of events accumulated from downloaded feeds (USGS
+    summary GeoJSON or QuakeML files) in an SQLite database.
+
+    Each event is stored once by event id, keeping the most recently
+    updated version. The events are indexed by time, magnitude, and
+    location, so queries with the same criteria as Catalog.fetch are
+    answered locally without reading the feed files. The database uses
+    write-ahead logging, so queries are not blocked by ingests.
+    """
+
+    def __init__(self, filename):
+        self.filename = os.path.expanduser(filename)
+        directory = os.path.dirname(self.filename)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.connection = sqlite3.connect(self.filename, timeout=60.0)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        version = self.connection.execute("PRAGMA user_version").fetchone()[0]
+        if version != SCHEMA_VERSION:
+            if version != 0:
+                raise ValueError("Event store '%s' has schema version %d, expected %d." % (self.filename, version, SCHEMA_VERSION))
+            with self.connection:
+                for statement in SCHEMA:
+                    self.connection.execute(statement)
+                self.connection.execute("PRAGMA user_version=%d" % SCHEMA_VERSION)
+        return
+
+
+    def close(self):
+        self.connection.close()
+        return
+
+
+    def count(self):
+        return self.connection.execute("SELECT COUNT(*) FROM events").fetchone()[0]
+
+
+    def ingest(self, filename, force=False):
+        """
+        Add the events in a feed file (GeoJSON if the filename ends in
+        .geojson, otherwise QuakeML) to the store. Files that have not
+        changed since they were last ingested are skipped unless force is
+        True.
+
+        Returns the number of new or updated events.
+        """
+        filename = os.path.abspath(filename)
+        stat = os.stat(filename)
+        if not force:
+            row = self.connection.execute("SELECT size, mtime FROM ingests WHERE filename=?", (filename,)).fetchone()
+            if not row is None and row[0] == stat.st_size and row[1] == stat.st_mtime:
+                return 0
+
+        if filename.lower().endswith(".geojson"):
+            from eqresponse.seismicity.GeoJSONReader import GeoJSONReader
+            table = GeoJSONReader().read(filename)
+        else:
+            from eqresponse.seismicity.QuakeMLReader import QuakeMLReader
+            table = QuakeMLReader().read(filename)
+
+        generated = table.creationTime.timestamp if not table.creationTime is None else None
+        with self.connection:
+            nchanges = self._upsert(table)
+            self.connection.execute("INSERT OR REPLACE INTO ingests (filename, size, mtime, generated, ingested, nevents) VALUES (?, ?, ?, ?, ?, ?)",
+                (filename, stat.st_size, stat.st_mtime, generated, time.time(), table.count()))
+        return nchanges
+
+
+    def ingestTable(self, table):
+        """
+        Add the events in an EventTable to the store. Returns the number
+        of new or updated events.
+        """
+        with self.connection:
+            nchanges = self._upsert(table)
+        return nchanges
+
+
+    def query(self, starttime=None, endtime=None, longitude=None, latitude=None, maxdist=None, minmag=None):
+        """
+        Get EventTable of events in time order matching the same criteria
+        as Catalog.fetch (maxdist is the great circle distance in
+        degrees). Criteria that are None are not applied.
+
+        The indexed columns are searched for the time range, magnitude,
+        and bounding box of the circle; the distance criterion is then
+        applied exactly to the candidate events. The creation time of the
+        table is the generation time of the newest ingested feed.
+        """
+        from obspy.core.utcdatetime import UTCDateTime
+
+        conditions = []
+        values = []
+        if not starttime is None:
+            conditions.append("time >= ?")
+            values.append(UTCDateTime(starttime).timestamp)
+        if not endtime is None:
+            conditions.append("time <= ?")
+            values.append(UTCDateTime(endtime).timestamp)
+        if not minmag is None:
+            conditions.append("mag >= ?")
+            values.append(minmag)
+        circle = not longitude is None and not latitude is None and not maxdist is None
+        if circle:
+            (box, boxValues) = EventStore._boundingBox(longitude, latitude, maxdist)
+            conditions += box
+            values += boxValues
+
+        sql = "SELECT eventid, time, longitude, latitude, depth, mag, magtype, updated FROM events"
+        if len(conditions) > 0:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY time"
+        rows = self.connection.execute(sql, values).fetchall()
+        table = EventStore._toTable(rows)
+        if circle:
+            table = table.select(EventTable.selectionMask(table.data, longitude=longitude, latitude=latitude, maxdist=maxdist))
+
+        generated = self.connection.execute("SELECT MAX(generated) FROM ingests").fetchone()[0]
+        table.creationTime = UTCDateTime(generated) if not generated is None else None
+        return table
+
+
+    def _upsert(self, table):
+        """
+        Insert or update events in table. Must be called within a
+        transaction. Returns the number of new or updated events.
+        """
+        data = table.data
+        nan = lambda values: [None if value != value else value for value in values.tolist()]
+        rows = zip(
+            data["eventid"].tolist(),
+            data["time"].tolist(),
+            nan(data["longitude"]),
+            nan(data["latitude"]),
+            nan(data["depth"]),
+            nan(data["mag"]),
+            table.magnitudeTypes(slice(None)),
+            nan(data["updated"]),
+            )
+        rows = [row for row in rows if row[1] == row[1]] # skip events without an origin time
+        nchanges = self.connection.total_changes
+        self.connection.executemany(UPSERT, rows)
+        return self.connection.total_changes - nchanges
+
+
+    @staticmethod
+    def _boundingBox(longitude, latitude, maxdist):
+        """
+        Get SQL conditions and values for the longitude and latitude bounds
+        of a circle with radius maxdist (degrees). Longitudes are not
+        bounded if the circle contains a pole; the bounds wrap across the
+        antimeridian.
+        """
+        latMin = latitude - maxdist
+        latMax = latitude + maxdist
+        conditions = ["latitude >= ?", "latitude <= ?"]
+        values = [latMin, latMax]
+        if latMin > -90.0 and latMax < 90.0:
+            dlon = math.degrees(math.asin(min(1.0, math.sin(math.radians(maxdist))/math.cos(math.radians(latitude)))))
+            lonMin = longitude - dlon
+            lonMax = longitude + dlon
+            if lonMin < -180.0:
+                conditions.append("(longitude >= ? OR longitude <= ?)")
+                values += [lonMin+360.0, lonMax]
+            elif lonMax > 180.0:
+                conditions.append("(longitude >= ? OR longitude <= ?)")
+                values += [lonMin, lonMax-360.0]
+            else:
+                conditions += ["longitude >= ?", "longitude <= ?"]
+                values += [lonMin, lonMax]
+        return (conditions, values)
+
+
+    @staticmethod
+    def _toTable(rows):
+        """
+        Create EventTable from rows of query results.
+        """
+        nevents = len(rows)
+        eventIds = [row[0] for row in rows]
+        data = numpy.zeros((nevents,), dtype=EventTable.makeDtype(EventTable.idLength(eventIds)))
+        magTypes = []
+        if nevents > 0:
+            (eventIds, times, lons, lats, depths, mags, magTypeNames, updated) = zip(*rows)
+            codes = {}
+            data["eventid"] = eventIds
+            data["time"] = times
+            data["longitude"] = numpy.array(lons, dtype=numpy.float64)
+            data["latitude"] = numpy.array(lats, dtype=numpy.float64)
+            data["depth"] = numpy.array(depths, dtype=numpy.float64)
+            data["mag"] = numpy.array(mags, dtype=numpy.float64)
+            data["magtype"] = [EventTable._magTypeCode(magType, magTypes, codes) for magType in magTypeNames]
+            data["updated"] = numpy.array(updated, dtype=numpy.float64)
+        data["distance"] = numpy.nan
+        data["azimuth"] = numpy.nan
+        return EventTable(data, magTypes)
+
+
+# End of file
@@ -0,0 +1,260 @@
+# ======================================================================
+#
+#                           Brad T. Aagaard
+#                        U.S. Geological Survey
+#
+# ======================================================================
+#
+
+import re
+
+import numpy
+
+
+# Default length of event ids in the event table. Tables with longer ids
+# have a wider eventid column (see EventTable.makeDtype), so ids are
+# never truncated.
+EVENT_ID_LENGTH = 32
+
+# Columns of the event table. Times are POSIX timestamps (seconds), depths
+# are in meters (as in QuakeML), and distances are in meters from the
+# mainshock epicenter. Magnitude types are stored as indices into
+# EventTable.magTypes. The updated time is the creation time of the
+# event information (NaN if not available). Distance and azimuth are NaN
+# until computed.
+EVENT_DTYPE = numpy.dtype([
+    ("time", "f8"),
+    ("longitude", "f8"),
+    ("latitude", "f8"),
+    ("depth", "f8"),
+    ("mag", "f8"),
+    ("magtype", "i2"),
+    ("eventid", "U%d" % EVENT_ID_LENGTH),
+    ("updated", "f8"),
+    ("distance", "f8"),
+    ("azimuth", "f8"),
+])
+
+# ----------------------------------------------------------------------
+class EventTable(object):
+    """
+    Compact columnar table of event hypocenters and magnitudes.
+    """
+
+    def __init__(self, data=None, magTypes=None, creationTime=None):
+        if data is None:
+            data = numpy.zeros((0,), dtype=EVENT_DTYPE)
+        self.data = data
+        self.magTypes = magTypes if not magTypes is None else []
+        self.creationTime = creationTime
+        return
+
+
+    def __len__(self):
+        return self.data.shape[0]
+
+
+    def count(self):
+        return self.data.shape[0]
+
+
+    def __getitem__(self, key):
+        return self.data[key]
+
+
+    def magnitudeType(self, index):
+        code = self.data["magtype"][index]
+        if code < 0:
+            return None
+        return self.magTypes[code]
+
+
+    def magnitudeTypes(self, indices):
+        """
+        Get list of magnitude types of events (None if not available).
+        """
+        names = numpy.array(self.magTypes + [None], dtype=object)
+        return names[self.data["magtype"][indices]].tolist()
+
+
+    def select(self, mask):
+        """
+        Create table with subset of events selected by boolean mask or indices.
+        """
+        return EventTable(self.data[mask], self.magTypes, self.creationTime)
+
+
+    @staticmethod
+    def concatenate(tables):
+        """
+        Create table with rows of tables, reconciling magnitude type codes.
+        """
+        magTypes = []
+        codes = {}
+        datas = []
+        dtype = EventTable.makeDtype(max([EventTable.idLengthOf(table.data) for table in tables] + [0]))
+        for table in tables:
+            mapping = numpy.array([EventTable._magTypeCode(magType, magTypes, codes) for magType in table.magTypes] + [-1], dtype=numpy.int16)
+            data = table.data.astype(dtype)
+            data["magtype"] = mapping[data["magtype"]]
+            datas.append(data)
+        data = numpy.concatenate(datas) if len(datas) > 0 else None
+        creationTime = tables[-1].creationTime if len(tables) > 0 else None
+        return EventTable(data, magTypes, creationTime)
+
+
+    @staticmethod
+    def fromEvents(events):
+        """
+        Create table from ObsPy catalog (or list of events). Rows are in
+        the same order as the events.
+        """
+        nevents = len(events)
+        eventIds = [EventTable.eventId(event) for event in events]
+        data = numpy.zeros((nevents,), dtype=EventTable.makeDtype(EventTable.idLength(eventIds)))
+        data["eventid"] = eventIds
+        data["distance"] = numpy.nan
+        data["azimuth"] = numpy.nan
+        magTypes = []
+        codes = {}
+        for i,event in enumerate(events):
+            origin = event.preferred_origin() or (event.origins[0] if len(event.origins) > 0 else None)
+            magnitude = event.preferred_magnitude() or (event.magnitudes[0] if len(event.magnitudes) > 0 else None)
+            if not origin is None:
+                data["time"][i] = origin.time.timestamp
+                data["longitude"][i] = origin.longitude
+                data["latitude"][i] = origin.latitude
+                data["depth"][i] = origin.depth if not origin.depth is None else numpy.nan
+            else:
+                data["time"][i] = numpy.nan
+            if not magnitude is None:
+                data["mag"][i] = magnitude.mag
+                data["magtype"][i] = EventTable._magTypeCode(magnitude.magnitude_type, magTypes, codes)
+            else:
+                data["mag"][i] = numpy.nan
+                data["magtype"][i] = -1
+            if not event.creation_info is None and not event.creation_info.creation_time is None:
+                data["updated"][i] = event.creation_info.creation_time.timestamp
+            else:
+                data["updated"][i] = numpy.nan
+
+        creationTime = None
+        if hasattr(events, "creation_info") and not events.creation_info is None:
+            creationTime = events.creation_info.creation_time
+        return EventTable(data, magTypes, creationTime)
+
+
+    def toEvents(self):
+        """
+        Create ObsPy catalog with the preferred origin and magnitude of
+        each event in the table. Used for tables read from sources
+        without the full event information (GeoJSON feeds).
+        """
+        from obspy.core.event import Catalog, Event, Origin, Magnitude, CreationInfo, ResourceIdentifier
+        from obspy.core.utcdatetime import UTCDateTime
+
+        nan = lambda value: None if value != value else value
+        data = self.data
+        rows = zip(data["eventid"].tolist(), data["time"].tolist(), data["longitude"].tolist(), data["latitude"].tolist(), data["depth"].tolist(), data["mag"].tolist(), self.magnitudeTypes(slice(None)), data["updated"].tolist())
+        events = []
+        for (eventId, t, lon, lat, depth, mag, magType, updated) in rows:
+            event = Event(resource_id=ResourceIdentifier("quakeml:earthquake.usgs.gov/fdsnws/event/1/query?eventid=%s&format=quakeml" % eventId))
+            if not nan(t) is None:
+                origin = Origin(time=UTCDateTime(t), longitude=nan(lon), latitude=nan(lat), depth=nan(depth))
+                event.origins.append(origin)
+                event.preferred_origin_id = origin.resource_id
+            if not nan(mag) is None:
+                magnitude = Magnitude(mag=mag, magnitude_type=magType)
+                event.magnitudes.append(magnitude)
+                event.preferred_magnitude_id = magnitude.resource_id
+            if not nan(updated) is None:
+                event.creation_info = CreationInfo(creation_time=UTCDateTime(updated))
+            events.append(event)
+
+        creationInfo = CreationInfo(creation_time=self.creationTime) if not self.creationTime is None else None
+        return Catalog(events, creation_info=creationInfo)
+
+
+    @staticmethod
+    def selectionMask(data, starttime=None, endtime=None, longitude=None, latitude=None, maxdist=None, minmag=None):
+        """
+        Get mask of rows in table data matching event query criteria (as
+        in Catalog.fetch). Distances are great circle distances (degrees)
+        on a sphere, as in FDSN event queries. Criteria that are None are
+        not applied.
+        """
+        mask = numpy.ones(data.shape[0], dtype=bool)
+        if not starttime is None:
+            from obspy.core.utcdatetime import UTCDateTime
+            mask &= data["time"] >= UTCDateTime(starttime).timestamp
+        if not endtime is None:
+            from obspy.core.utcdatetime import UTCDateTime
+            mask &= data["time"] <= UTCDateTime(endtime).timestamp
+        if not minmag is None:
+            mask &= data["mag"] >= minmag
+        if not longitude is None and not latitude is None and not maxdist is None:
+            lat0 = numpy.radians(latitude)
+            lat = numpy.radians(data["latitude"])
+            dlon = numpy.radians(data["longitude"] - longitude)
+            h = numpy.sin(0.5*(lat-lat0))**2 + numpy.cos(lat0)*numpy.cos(lat)*numpy.sin(0.5*dlon)**2
+            mask &= numpy.degrees(2.0*numpy.arcsin(numpy.sqrt(numpy.minimum(h, 1.0)))) <= maxdist
+        return mask
+
+
+    @staticmethod
+    def makeDtype(idLength):
+        """
+        Get dtype of event table with event ids of up to idLength
+        characters (at least EVENT_ID_LENGTH).
+        """
+        if idLength <= EVENT_ID_LENGTH:
+            return EVENT_DTYPE
+        return numpy.dtype([(name, "U%d" % idLength if name == "eventid" else EVENT_DTYPE[name]) for name in EVENT_DTYPE.names])
+
+
+    @staticmethod
+    def idLength(eventIds):
+        """
+        Get length of longest event id.
+        """
+        return max([len(eventId) for eventId in eventIds] + [0])
+
+
+    @staticmethod
+    def idLengthOf(data):
+        """
+        Get maximum length of event ids in eventid column of table data.
+        """
+        return data.dtype["eventid"].itemsize // numpy.dtype("U1").itemsize
+
+
+    @staticmethod
+    def eventId(event):
+        """
+        Get data center event id from resource id of ObsPy event.
+        """
+        return EventTable.eventIdFromResourceId(event.resource_id.id)
+
+
+    @staticmethod
+    def eventIdFromResourceId(evstr):
+        """
+        Get data center event id from QuakeML resource id string.
+        """
+        match = re.search("eventid=([^&]+)", evstr)
+        if match:
+            return match.groups()[0]
+        return evstr.rstrip("/").split("/")[-1]
+
+
+    @staticmethod
+    def _magTypeCode(magType, magTypes, codes):
+        if magType is None:
+            return -1
+        if not magType in codes:
+            codes[magType] = len(magTypes)
+            magTypes.append(magType)
+        return codes[magType]
+
+
+# End of file
@@ -0,0 +1,122 @@
+# ======================================================================
+#
+#                           Brad T. Aagaard
+#                        U.S. Geological Survey
+#
+# ======================================================================
+#
+
+import math
+
+import numpy
+
+# ----------------------------------------------------------------------
+class FreqMag(object):
+    """
+    Frequency-magnitude distribution of a set of magnitudes.
+
+    Magnitudes are rounded to bins of width binWidth. Because the
+    b-value estimate depends only on the number of events in each
+    magnitude bin, bootstrap resamples are drawn as multinomial counts
+    over the bins, so all resamples are computed together as arrays.
+    """
+
+    def __init__(self, mags, binWidth=0.1):
+        mags = numpy.asarray(mags, dtype=numpy.float64)
+        self.binWidth = binWidth
+        self.mags = mags[~numpy.isnan(mags)]
+        self.binIndex = numpy.round(self.mags/binWidth).astype(numpy.int64)
+        return
+
+
+    def counts(self):
+        """
+        Get magnitude bins (bin centers), number of events in each bin,
+        and cumulative number of events with magnitudes greater than or
+        equal to each bin.
+        """
+        if self.binIndex.shape[0] == 0:
+            empty = numpy.zeros((0,), dtype=numpy.float64)
+            return (empty, empty.astype(numpy.int64), empty.astype(numpy.int64))
+        imin = numpy.min(self.binIndex)
+        incremental = numpy.bincount(self.binIndex - imin)
+        bins = self.binWidth*(imin + numpy.arange(incremental.shape[0]))
+        cumulative = numpy.cumsum(incremental[::-1])[::-1]
+        return (bins, incremental, cumulative)
+
+
+    def completeness(self, correction=0.2):
+        """
+        Estimate magnitude of completeness using the maximum curvature
+        method (bin with the most events) plus a correction.
+        """
+        (bins, incremental, cumulative) = self.counts()
+        if bins.shape[0] == 0:
+            return None
+        return bins[numpy.argmax(incremental)] + correction
+
+
+    def bValue(self, mc=None):
+        """
+        Get maximum likelihood a- and b-values (Aki, 1965; Utsu, 1966 with
+        binning correction) and the b-value uncertainty of Shi and Bolt
+        (1982) using events with magnitudes greater than or equal to
+        mc. Returns (a, b, sigmaB, nevents).
+        """
+        if mc is None:
+            mc = self.completeness()
+            if mc is None:
+                return (numpy.nan, numpy.nan, numpy.nan, 0)
+        mc = self.binWidth*round(mc/self.binWidth)
+        counts, centers = self._binCounts(mc)
+        nevents = int(numpy.sum(counts))
+        if nevents < 2:
+            return (numpy.nan, numpy.nan, numpy.nan, nevents)
+
+        magMean = numpy.sum(counts*centers)/nevents
+        b = FreqMag._bFromMean(magMean, mc, self.binWidth)
+        variance = numpy.sum(counts*(centers-magMean)**2)/(nevents*(nevents-1))
+        sigmaB = 2.3*b**2*math.sqrt(variance)
+        a = math.log10(nevents) + b*mc
+        return (a, b, sigmaB, nevents)
+
+
+    def bootstrap(self, mc=None, nsamples=1000, seed=None):
+        """
+        Get b-values of nsamples bootstrap resamples (with replacement) of
+        the events with magnitudes greater than or equal to mc.
+        """
+        if mc is None:
+            mc = self.completeness()
+            if mc is None:
+                return numpy.full(nsamples, numpy.nan)
+        mc = self.binWidth*round(mc/self.binWidth)
+        counts, centers = self._binCounts(mc)
+        nevents = int(numpy.sum(counts))
+        if nevents < 2:
+            return numpy.full(nsamples, numpy.nan)
+
+        rng = numpy.random.default_rng(seed)
+        samples = rng.multinomial(nevents, counts/float(nevents), size=nsamples)
+        magMean = samples.dot(centers)/nevents
+        return FreqMag._bFromMean(magMean, mc, self.binWidth)
+
+
+    def _binCounts(self, mc):
+        """
+        Get counts and magnitudes of bins at or above mc.
+        """
+        imc = int(round(mc/self.binWidth))
+        selected = self.binIndex[self.binIndex >= imc] - imc
+        counts = numpy.bincount(selected).astype(numpy.float64) if selected.shape[0] > 0 else numpy.zeros((0,))
+        centers = self.binWidth*(imc + numpy.arange(counts.shape[0]))
+        return (counts, centers)
+
+
+    @staticmethod
+    def _bFromMean(magMean, mc, binWidth):
+        with numpy.errstate(divide="ignore"):
+            return math.log10(math.e) / (magMean - (mc - 0.5*binWidth))
+
+
+# End of file
@@ -0,0 +1,88 @@
+# ======================================================================
+#
+#                           Brad T. Aagaard
+#                        U.S. Geological Survey
+#
+# ======================================================================
+#
+
+import numpy
+
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:
+    import json
+    _loads = json.loads
+
+from eqresponse.seismicity.EventTable import EventTable
+
+# ----------------------------------------------------------------------
+class GeoJSONReader(object):
+    """
+    Reader that extracts the events in a USGS summary GeoJSON feed (or
+    an FDSN event query with format=geojson) directly into an EventTable.
+
+    The document is decoded in one call (with orjson if it is installed)
+    and each column is built from the list of features with a single
+    array conversion. Times in the feeds are in milliseconds and depths
+    in kilometers; they are converted to the units of the event table.
+    """
+
+    def __init__(self, minmag=None):
+        self.minmag = minmag
+        return
+
+
+    def read(self, filename):
+        """
+        Read GeoJSON file into EventTable.
+        """
+        with open(filename, "rb") as fin:
+            return self.loads(fin.read())
+
+
+    def loads(self, data):
+        """
+        Read GeoJSON document (bytes or string) into EventTable.
+        """
+        document = _loads(data)
+        features = document.get("features") or []
+        properties = [feature["properties"] for feature in features]
+
+        mag = numpy.array([p.get("mag") for p in properties], dtype=numpy.float64)
+        keep = ~numpy.isnan(mag)
+        if not self.minmag is None:
+            keep &= mag >= self.minmag
+        indices = numpy.nonzero(keep)[0].tolist()
+        if len(indices) < len(features):
+            features = [features[i] for i in indices]
+            properties = [properties[i] for i in indices]
+            mag = mag[indices]
+
+        nevents = len(features)
+        coordinates = numpy.array([(feature["geometry"]["coordinates"] + [None]*3)[:3] for feature in features], dtype=numpy.float64).reshape((nevents, 3))
+
+        magTypes = []
+        codes = {}
+        eventIds = [feature.get("id") or "" for feature in features]
+        data = numpy.zeros((nevents,), dtype=EventTable.makeDtype(EventTable.idLength(eventIds)))
+        data["time"] = 1.0e-3*numpy.array([p.get("time") for p in properties], dtype=numpy.float64)
+        data["longitude"] = coordinates[:,0]
+        data["latitude"] = coordinates[:,1]
+        data["depth"] = 1.0e+3*coordinates[:,2]
+        data["mag"] = mag
+        data["magtype"] = numpy.array([EventTable._magTypeCode(p.get("magType"), magTypes, codes) for p in properties], dtype=numpy.int16)
+        data["eventid"] = eventIds
+        data["updated"] = 1.0e-3*numpy.array([p.get("updated") for p in properties], dtype=numpy.float64)
+        data["distance"] = numpy.nan
+        data["azimuth"] = numpy.nan
+
+        creationTime = (document.get("metadata") or {}).get("generated")
+        if not creationTime is None:
+            from obspy.core.utcdatetime import UTCDateTime
+            creationTime = UTCDateTime(1.0e-3*creationTime)
+        return EventTable(data, magTypes, creationTime)
+
+
+# End of file
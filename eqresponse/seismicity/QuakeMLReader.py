@@ -0,0 +1,164 @@
+# ======================================================================
+#
+#                           Brad T. Aagaard
+#                        U.S. Geological Survey
+#
+# ======================================================================
+#
+
+import numpy
+
+try:
+    from lxml import etree
+except ImportError:
+    import xml.etree.ElementTree as etree
+
+from eqresponse.seismicity.EventTable import EventTable
+
+NS_BED = "{http://quakeml.org/xmlns/bed/1.2}"
+
+# ----------------------------------------------------------------------
+class QuakeMLReader(object):
+    """
+    Streaming reader that extracts the preferred origin and magnitude of
+    each event in a QuakeML file directly into an EventTable.
+
+    Each event element is discarded as soon as it has been parsed, so
+    the full document is never held in memory.
+    """
+
+    def __init__(self, minmag=None):
+        self.minmag = minmag
+        return
+
+
+    def read(self, filename):
+        """
+        Read QuakeML file into EventTable.
+        """
+        tags = {
+            "eventParameters": NS_BED + "eventParameters",
+            "event": NS_BED + "event",
+            "creationInfo": NS_BED + "creationInfo",
+            }
+
+        times = []
+        lons = []
+        lats = []
+        depths = []
+        mags = []
+        magTypeCodes = []
+        eventIds = []
+        updated = []
+        magTypes = []
+        codes = {}
+        creationTime = None
+
+        stack = []
+        for action, elem in etree.iterparse(filename, events=("start", "end")):
+            if action == "start":
+                stack.append(elem)
+                continue
+            stack.pop()
+            parent = stack[-1] if len(stack) > 0 else None
+
+            if elem.tag == tags["creationInfo"] and not parent is None and parent.tag == tags["eventParameters"]:
+                creationTime = elem.findtext(NS_BED + "creationTime")
+            elif elem.tag == tags["event"]:
+                fields = self._parseEvent(elem)
+                if not fields is None:
+                    (evTime, lon, lat, depth, mag, magType, evUpdated) = fields
+                    times.append(evTime)
+                    lons.append(lon)
+                    lats.append(lat)
+                    depths.append(depth)
+                    mags.append(mag)
+                    magTypeCodes.append(EventTable._magTypeCode(magType, magTypes, codes))
+                    eventIds.append(EventTable.eventIdFromResourceId(elem.get("publicID", "")))
+                    updated.append(evUpdated)
+                elem.clear()
+                if not parent is None:
+                    parent.remove(elem)
+
+        nevents = len(times)
+        data = numpy.zeros((nevents,), dtype=EventTable.makeDtype(EventTable.idLength(eventIds)))
+        data["time"] = QuakeMLReader._toTimestamps(times)
+        data["longitude"] = numpy.array(lons, dtype=numpy.float64)
+        data["latitude"] = numpy.array(lats, dtype=numpy.float64)
+        data["depth"] = numpy.array(depths, dtype=numpy.float64)
+        data["mag"] = numpy.array(mags, dtype=numpy.float64)
+        data["magtype"] = numpy.array(magTypeCodes, dtype=numpy.int16)
+        data["eventid"] = eventIds
+        data["updated"] = QuakeMLReader._toTimestamps(updated)
+        data["distance"] = numpy.nan
+        data["azimuth"] = numpy.nan
+
+        if not creationTime is None:
+            from obspy.core.utcdatetime import UTCDateTime
+            creationTime = UTCDateTime(creationTime)
+        return EventTable(data, magTypes, creationTime)
+
+
+    def _parseEvent(self, elem):
+        """
+        Get time, longitude, latitude, depth, magnitude, magnitude type, and
+        creation time of preferred origin and magnitude of event element.
+
+        Returns None if the event has no origin or magnitude or the
+        magnitude is below the minimum magnitude.
+        """
+        magnitude = self._preferred(elem, "magnitude", "preferredMagnitudeID")
+        if magnitude is None:
+            return None
+        mag = QuakeMLReader._floatValue(magnitude, "mag")
+        if numpy.isnan(mag) or (not self.minmag is None and mag < self.minmag):
+            return None
+
+        origin = self._preferred(elem, "origin", "preferredOriginID")
+        if origin is None:
+            return None
+
+        return (
+            origin.findtext(NS_BED + "time/" + NS_BED + "value"),
+            QuakeMLReader._floatValue(origin, "longitude"),
+            QuakeMLReader._floatValue(origin, "latitude"),
+            QuakeMLReader._floatValue(origin, "depth"),
+            mag,
+            magnitude.findtext(NS_BED + "type"),
+            elem.findtext(NS_BED + "creationInfo/" + NS_BED + "creationTime"),
+            )
+
+
+    def _preferred(self, elem, name, preferredTag):
+        items = elem.findall(NS_BED + name)
+        if len(items) == 0:
+            return None
+        preferredId = elem.findtext(NS_BED + preferredTag)
+        if not preferredId is None:
+            preferredId = preferredId.strip()
+            for item in items:
+                if item.get("publicID") == preferredId:
+                    return item
+        return items[0]
+
+
+    @staticmethod
+    def _floatValue(elem, name):
+        value = elem.findtext(NS_BED + name + "/" + NS_BED + "value")
+        if value is None:
+            return numpy.nan
+        return float(value)
+
+
+    @staticmethod
+    def _toTimestamps(values):
+        """
+        Convert ISO 8601 UTC time strings to POSIX timestamps (NaN if missing).
+        """
+        stamps = numpy.array([v.strip().rstrip("Z") if v else "NaT" for v in values], dtype="datetime64[us]")
+        seconds = 1.0e-6*stamps.astype(numpy.int64)
+        seconds[numpy.isnat(stamps)] = numpy.nan
+        return seconds
+
+
+# End of file
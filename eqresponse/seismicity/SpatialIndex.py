@@ -0,0 +1,160 @@
+# ======================================================================
+#
+#                           Brad T. Aagaard
+#                        U.S. Geological Survey
+#
+# ======================================================================
+#
+
+import numpy
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:
+    cKDTree = None
+
+EARTH_RADIUS_KM = 6371.0
+
+# Relative difference allowed between spherical and WGS84 geodesic
+# distances when selecting candidates from the tree.
+SPHERE_TOLERANCE = 0.01
+
+# ----------------------------------------------------------------------
+class SpatialIndex(object):
+    """
+    Spatial index of epicenters in an EventTable supporting radius,
+    bounding box, and k-nearest queries.
+
+    Epicenters are stored as points on the unit sphere in a KD-tree
+    (scipy), so radius and k-nearest queries take logarithmic time and
+    work across the antimeridian and near the poles. Radius queries
+    select candidates on the sphere and then apply the exact WGS84
+    geodesic distance, consistent with Catalog.addDistanceAzimuth().
+    Without scipy, queries fall back to a linear scan.
+
+    Bounding box queries use epicenters sorted by latitude.
+    """
+
+    def __init__(self, table):
+        data = table.data
+        self.longitude = numpy.array(data["longitude"], dtype=numpy.float64)
+        self.latitude = numpy.array(data["latitude"], dtype=numpy.float64)
+        self.xyz = SpatialIndex._toUnitSphere(self.longitude, self.latitude)
+
+        # Events without an epicenter are never selected.
+        self.valid = numpy.nonzero(numpy.all(numpy.isfinite(self.xyz), axis=1))[0]
+        self.tree = None
+        if not cKDTree is None and self.valid.shape[0] > 0:
+            self.tree = cKDTree(self.xyz[self.valid])
+
+        self.latOrder = numpy.argsort(self.latitude, kind="stable")
+        self.latSorted = self.latitude[self.latOrder]
+        return
+
+
+    def withinRadius(self, longitude, latitude, radiusKm):
+        """
+        Get indices (in increasing order) of events with epicenters within
+        radiusKm of point.
+        """
+        candidates = self.candidatesWithinRadius(longitude, latitude, radiusKm)
+        if candidates.shape[0] == 0:
+            return candidates
+        dist = self._geodesicDistance(longitude, latitude, candidates)
+        return candidates[dist <= 1.0e+3*radiusKm]
+
+
+    def withinBox(self, lonMin, lonMax, latMin, latMax):
+        """
+        Get indices (in increasing order) of events with epicenters in
+        bounding box. The box crosses the antimeridian if lonMin > lonMax.
+        """
+        istart = numpy.searchsorted(self.latSorted, latMin, side="left")
+        iend = numpy.searchsorted(self.latSorted, latMax, side="right")
+        candidates = self.latOrder[istart:iend]
+        lon = SpatialIndex._wrapLongitude(self.longitude[candidates])
+        lonMin = SpatialIndex._wrapLongitude(lonMin)
+        lonMax = SpatialIndex._wrapLongitude(lonMax)
+        if lonMin <= lonMax:
+            mask = (lon >= lonMin) & (lon <= lonMax)
+        else:
+            mask = (lon >= lonMin) | (lon <= lonMax)
+        return numpy.sort(candidates[mask])
+
+
+    def nearest(self, longitude, latitude, k=1):
+        """
+        Get indices and geodesic distances (m) of the k events nearest to
+        point, ordered by distance.
+        """
+        k = min(k, self.valid.shape[0])
+        if k == 0:
+            return (numpy.zeros((0,), dtype=numpy.int64), numpy.zeros((0,), dtype=numpy.float64))
+
+        center = SpatialIndex._toUnitSphere(numpy.array([longitude]), numpy.array([latitude]))[0]
+        if not self.tree is None:
+            chords, candidates = self.tree.query(center, k=k)
+            candidates = self.valid[numpy.atleast_1d(candidates)]
+        else:
+            chords = numpy.linalg.norm(self.xyz[self.valid] - center, axis=1)
+            candidates = self.valid[numpy.argsort(chords, kind="stable")[:k]]
+
+        # The k nearest on the sphere bound the search radius for the k
+        # nearest on the ellipsoid.
+        dist = self._geodesicDistance(longitude, latitude, candidates)
+        candidates = self.candidatesWithinRadius(longitude, latitude, 1.0e-3*numpy.max(dist))
+        dist = self._geodesicDistance(longitude, latitude, candidates)
+        order = numpy.argsort(dist, kind="stable")[:k]
+        return (candidates[order], dist[order])
+
+
+    def candidatesWithinRadius(self, longitude, latitude, radiusKm):
+        """
+        Get sorted indices of events within radiusKm of point on the
+        sphere, with a margin for differences from the ellipsoid. This is
+        a superset of withinRadius() for callers that apply their own
+        distance criterion.
+        """
+        chord = SpatialIndex._chord((1.0+SPHERE_TOLERANCE)*radiusKm)
+        center = SpatialIndex._toUnitSphere(numpy.array([longitude]), numpy.array([latitude]))[0]
+        if not self.tree is None:
+            candidates = self.valid[numpy.array(self.tree.query_ball_point(center, chord), dtype=numpy.int64)]
+        else:
+            candidates = numpy.nonzero(numpy.linalg.norm(self.xyz - center, axis=1) <= chord)[0]
+        return numpy.sort(candidates)
+
+
+    def _geodesicDistance(self, longitude, latitude, indices):
+        from eqresponse.seismicity.Catalog import Catalog
+
+        geod = Catalog._geodesic()
+        npts = indices.shape[0]
+        azimuth, backAzimuth, dist = geod.inv(
+            numpy.full(npts, longitude), numpy.full(npts, latitude),
+            self.longitude[indices], self.latitude[indices])
+        return dist
+
+
+    @staticmethod
+    def _toUnitSphere(longitude, latitude):
+        lon = numpy.radians(longitude)
+        lat = numpy.radians(latitude)
+        cosLat = numpy.cos(lat)
+        return numpy.column_stack((cosLat*numpy.cos(lon), cosLat*numpy.sin(lon), numpy.sin(lat)))
+
+
+    @staticmethod
+    def _chord(distanceKm):
+        """
+        Chord length on the unit sphere for great circle distance.
+        """
+        angle = min(distanceKm/EARTH_RADIUS_KM, numpy.pi)
+        return 2.0*numpy.sin(0.5*angle)
+
+
+    @staticmethod
+    def _wrapLongitude(longitude):
+        return numpy.mod(numpy.asarray(longitude) + 180.0, 360.0) - 180.0
+
+
+# End of file
@@ -8,10 +8,15 @@
 
 
 import numpy
-import pytz
 import datetime
 import math
 
+from eqresponse.core.TimeFormatter import TimeFormatter
+from eqresponse.seismicity.EventTable import EventTable
+from eqresponse.seismicity.SummaryJSON import SummaryJSON
+from eqresponse.seismicity.Tally import Tally
+
+KM_TO_DEG = 1.0/111.0 # roughly 111 km per latitude degree
 HOUR_TO_SECS = 3600.0
 DAY_TO_SECS = 24*HOUR_TO_SECS
 YEAR_TO_SECS = 365.25*DAY_TO_SECS
@@ -24,53 +29,136 @@ class Summary(object):
         self.params = params
         self.now = now
         self.tz = tz
+        self.formatter = TimeFormatter(tz)
         self.mainshock = mainshock
         self.foreshocks = foreshocks
         self.aftershocks = aftershocks
         self.historical = historical
         self.significant = significant
 
-        self.foreshocks.addDistanceAzimuth(mainshock)
-        self.aftershocks.addDistanceAzimuth(mainshock)
-        self.historical.addDistanceAzimuth(mainshock)
-        self.significant.addDistanceAzimuth(mainshock)
+        method = self.params.get("summary/distance_method")
+        self.foreshocks.addDistanceAzimuth(mainshock, method)
+        self.aftershocks.addDistanceAzimuth(mainshock, method)
+        self.historical.addDistanceAzimuth(mainshock, method)
+        self.significant.addDistanceAzimuth(mainshock, method)
         return
 
 
     def show(self):
-        (datacenter, catalog) = self.params.get("catalog")
-        if datacenter == "USGS":
-            datacenter = "ANSS ComCat"
-        print("Source: %s %s catalog" % (datacenter, catalog))
+        print("Source: %s %s catalog" % self._source())
 
         # Mainshock
         self._printMainshock()
 
-        # Foreshocks
-        intervals = [HOUR_TO_SECS, DAY_TO_SECS, 7*DAY_TO_SECS]
-        self._printCatalog(self.foreshocks, "Foreshocks", intervals, timing="before_mainshock")
+        # Foreshocks, aftershocks, historical, significant
+        for (catalog, label, intervals, timing, duration) in self._catalogs():
+            self._printCatalog(catalog, label, intervals, timing, duration)
+        return
 
-        intervals = [DAY_TO_SECS, 7*DAY_TO_SECS, 30*DAY_TO_SECS, YEAR_TO_SECS]
 
-        # Aftershocks
-        if not self.aftershocks.events is None and self.aftershocks.events.count() > 0:
-            duration = self.aftershocks.events[-1].preferred_origin().time - self.mainshock.preferred_origin().time
-        else:
-            duration = None
-        self._printCatalog(self.aftershocks, "Aftershocks", intervals, timing="after_mainshock", duration=duration)
-            
-        # Historical
-        self._printCatalog(self.historical, "Historical", intervals, timing="before_mainshock")
+    def content(self):
+        """
+        Get summary as a dict with the same information as the text
+        summary.
+        """
+        writer = SummaryJSON(self.formatter)
+        (datacenter, catalogName) = self._source()
+
+        mainshock = writer.events(EventTable.fromEvents([self.mainshock]), [0])[0]
+        mainshock["version"] = self.mainshock.creation_info.version
+        (mainshock["updated"], mainshock["updated_local"]) = writer.timestamp(self.mainshock.creation_info.creation_time)
+
+        catalogs = []
+        for (catalog, label, intervals, timing, duration) in self._catalogs():
+            if catalog.count() == 0:
+                continue
+            key = label.lower()
+            listMinMag = self.params.get("summary/%s_list_minmag" % key)
+            minMag = self.params.get("%s/minmag" % key)
+            maxDist = self.params.get("%s/maxdist_km" % key)
+            table = self._selectTable(catalog, maxDist)
+
+            tallies = [self._tallyContent(table, intervals, timing, math.floor(minMag))]
+            if not duration is None and duration > DAY_TO_SECS:
+                tallies.append(self._tallyContent(table, intervals, "before_now", math.floor(minMag)))
+            mostRecent = None
+            if timing == "after_mainshock" and table.count() > 0:
+                mostRecent = writer.events(table, [numpy.argmax(table["time"])])[0]
+
+            entry = {
+                "label": label,
+                "minmag": minMag,
+                "maxdist_km": maxDist,
+                "years": self.params.get("%s/years" % key) if timing == "before_mainshock" else None,
+                "duration_days": duration/DAY_TO_SECS if not duration is None else None,
+                "tallies": tallies,
+                "most_recent": mostRecent,
+                "list_minmag": listMinMag,
+                "events": writer.events(table, numpy.nonzero(table["mag"] >= listMinMag)[0]),
+                }
+            (entry["as_of"], entry["as_of_local"]) = writer.timestamp(catalog.table.creationTime)
+            catalogs.append(entry)
+
+        return {
+            "source": {"datacenter": datacenter, "catalog": catalogName},
+            "generated": writer.timestamp(self.now)[0],
+            "time_zone": str(self.tz),
+            "mainshock": mainshock,
+            "catalogs": catalogs,
+            }
+
+
+    def dumps(self, format="json"):
+        """
+        Get summary as "json" or "geojson" string.
+        """
+        return SummaryJSON.dumps(self.content(), format)
+
+
+    def _source(self):
+        (datacenter, catalog) = self.params.get("catalog")
+        if datacenter == "USGS":
+            datacenter = "ANSS ComCat"
+        return (datacenter, catalog)
 
-        # Significant
-        intervals = [YEAR_TO_SECS, 5*YEAR_TO_SECS, 10*YEAR_TO_SECS]
-        self._printCatalog(self.significant, "Significant", intervals, timing="before_mainshock")
 
-        return
+    def _catalogs(self):
+        """
+        Get catalogs in summary with label, tally intervals, timing, and
+        duration of sequence.
+        """
+        if self.aftershocks.count() > 0:
+            duration = numpy.max(self.aftershocks.table["time"]) - self.mainshock.preferred_origin().time.timestamp
+        else:
+            duration = None
+        intervals = [DAY_TO_SECS, 7*DAY_TO_SECS, 30*DAY_TO_SECS, YEAR_TO_SECS]
+        return [
+            (self.foreshocks, "Foreshocks", [HOUR_TO_SECS, DAY_TO_SECS, 7*DAY_TO_SECS], "before_mainshock", None),
+            (self.aftershocks, "Aftershocks", intervals, "after_mainshock", duration),
+            (self.historical, "Historical", intervals, "before_mainshock", None),
+            (self.significant, "Significant", [YEAR_TO_SECS, 5*YEAR_TO_SECS, 10*YEAR_TO_SECS], "before_mainshock", None),
+            ]
+
+
+    def _selectTable(self, catalog, maxDist):
+        """
+        Get table of events in catalog within maxDist (km) of mainshock
+        epicenter.
+
+        Events are selected locally only if the catalog was fetched with a
+        larger radius (fetch/maxdist_scale > 1). The selection uses the
+        same great circle distance in degrees (maxDist*KM_TO_DEG) as the
+        data center query, so the counts match a fetch with maxDist.
+        """
+        if maxDist is None or self.params.get("fetch/maxdist_scale") <= 1.0:
+            return catalog.table
+        origin = self.mainshock.preferred_origin()
+        mask = EventTable.selectionMask(catalog.table.data, longitude=origin.longitude, latitude=origin.latitude, maxdist=maxDist*KM_TO_DEG)
+        return catalog.table.select(mask)
 
 
     def _printCatalog(self, catalog, label, intervals, timing, duration=None):
-        if catalog.events is None or catalog.events.count() == 0:
+        if catalog.count() == 0:
             return
 
         key = label.lower()
@@ -86,81 +174,50 @@ class Summary(object):
             'minmag': minMag,
             'dist': maxDist,
             'timespan': timespan,
-            'date': self._localTimestamp(catalog.events.creation_info.creation_time)})
+            'date': self._localTimestamp(catalog.table.creationTime)})
 
         if not duration is None:
             print("Current duration of %(label)s sequence: %(duration)3.1f days\n" % {
                 'label': label.lower(),
                 'duration': duration/DAY_TO_SECS})
 
-        self._printTally(catalog.events, intervals, timing, minmag=math.floor(minMag))
-        if duration > DAY_TO_SECS:
+        table = self._selectTable(catalog, maxDist)
+        self._printTally(table, intervals, timing, minmag=math.floor(minMag))
+        if not duration is None and duration > DAY_TO_SECS:
             print("")
-            self._printTally(catalog.events, intervals, timing="before_now", minmag=math.floor(minMag))
+            self._printTally(table, intervals, timing="before_now", minmag=math.floor(minMag))
 
-        if timing == "after_mainshock":
+        if timing == "after_mainshock" and table.count() > 0:
             print("\nMost recent earthquake")
-            self._printEvent(catalog.events[-1])
+            self._printEvents(table, [numpy.argmax(table["time"])])
 
-        eventsF = catalog.events.filter("magnitude >= %3.1f" % listMinMag)
+        indices = numpy.nonzero(table["mag"] >= listMinMag)[0]
         print("\n%(label)s M >= %(mag)3.1f" % {'label': label, 'mag': listMinMag})
-        for event in eventsF:
-            self._printEvent(event)
+        self._printEvents(table, indices)
 
         return
                             
 
     def _printMainshock(self):
         print("\nMainshock v%s (%s)" % (self.mainshock.creation_info.version, self._localTimestamp(self.mainshock.creation_info.creation_time)))
-        self._printEvent(self.mainshock)
+        self._printEvents(EventTable.fromEvents([self.mainshock]), [0])
         return
 
 
-    def _printTally(self, events, tintervals, timing, minmag=1.0):
+    def _tally(self, table, tintervals, timing, minmag=1.0):
+        """
+        Get magnitude bins, time interval labels, and number of events in
+        each magnitude bin and time interval (last column is the total).
+        """
         maxmag = math.floor(self.mainshock.preferred_magnitude().mag)
         origin = self.mainshock.preferred_origin()
         binsMag = numpy.arange(minmag, maxmag+0.001, 1.0)[::-1]
 
-        binsTime = numpy.zeros(len(tintervals)+1, dtype=object)
-        if timing == "before_mainshock":
-            for i,t in enumerate(tintervals):
-                binsTime[i] = origin.time - t
-            op = ">="
-            tdescription = "Prior"
-        elif timing == "after_mainshock":
-            for i,t in enumerate(tintervals):
-                if self.now < origin.time + t:
-                    binsTime = binsTime[:i+1]
-                    break
-                else:
-                    binsTime[i] = origin.time + t
-            binsTime[-1] = events[-1].preferred_origin().time
-            op = "<="
-            tdescription = "First"
-        elif timing == "before_now":
-            for i,t in enumerate(tintervals):
-                if self.now-t < origin.time:
-                    binsTime = binsTime[:i]
-                    break
-                else:
-                    binsTime[i] = self.now - t
-            op = ">="
-            tdescription = "Past"
-
-        count = numpy.zeros((binsMag.shape[0], binsTime.shape[0]))
-        for irow,binMag in enumerate(binsMag):
-            eventsM = events.filter('magnitude >= %3.1f' % binMag)
-            for icol,binTime in enumerate(binsTime[:-1]):
-                eventsT = eventsM.filter('time %s %s' % (op, binTime))
-                count[irow,icol] = eventsT.count()
-            icol = binsTime.shape[0]-1
-            count[irow,icol] = eventsM.count()
+        (binsTime, op, tdescription) = Tally.timeBins(timing, tintervals, origin.time.timestamp, self.now.timestamp)
+        count = Tally(table).count(binsMag, binsTime, op)
 
-        # Heading
-        hline = "    "
+        labels = []
         nintervals = binsTime.shape[0]
-        if timing == "after_mainshock":
-            nintervals -= 1
         for tinterval in tintervals[:nintervals]:
             if tinterval/DAY_TO_SECS < 0.999:
                 tlabel = "%s %3.1f hrs" % (tdescription, tinterval/HOUR_TO_SECS)
@@ -168,36 +225,62 @@ class Summary(object):
                 tlabel = "%s %3.1f days" % (tdescription, tinterval/DAY_TO_SECS)
             else:
                 tlabel = "%s %3.1f yrs" % (tdescription, tinterval/YEAR_TO_SECS)
+            labels.append(tlabel)
+        labels.append("Total")
+        return (binsMag, labels, count)
+
+
+    def _printTally(self, table, tintervals, timing, minmag=1.0):
+        (binsMag, labels, count) = self._tally(table, tintervals, timing, minmag)
+
+        # Heading
+        hline = "    "
+        for tlabel in labels:
             hline += "%16s" % tlabel
-        tlabel = "Total"
-        hline += "%16s" % tlabel
         print(hline)
         for irow,binMag in enumerate(binsMag):
             line = "M>=%1.0f" % binMag
-            for icol,binTime in enumerate(binsTime):
+            for icol in range(len(labels)):
                 line += "%16d" % count[irow,icol]
             print(line)
         return
 
+
+    def _tallyContent(self, table, tintervals, timing, minmag=1.0):
+        (binsMag, labels, count) = self._tally(table, tintervals, timing, minmag)
+        return {
+            "timing": timing,
+            "intervals": labels,
+            "minmags": binsMag.tolist(),
+            "counts": count.astype(numpy.int64).tolist(),
+            }
+
     
-    def _printEvent(self, event):
-
-        magnitude = event.preferred_magnitude()
-        origin = event.preferred_origin()
-        if hasattr(event, 'extra') and hasattr(event.extra, 'mainshock_distance'):
-            mainshockDist = 1.0e-3*event.extra.mainshock_distance.value
-            mainshockAzimuth = event.extra.mainshock_azimuth.value
-            directionStr = "(%4.1fkm %s)" % (mainshockDist, self._azimuthToString(mainshockAzimuth))
-        else:
-            directionStr = "            "
-        print("%(tstamp)s   %(lon)8.3f %(lat)6.3f %(dir)s  %(depth)4.1fkm  %(mag)4.2f %(magtype)s" % {
-            'tstamp': self._localTimestamp(origin.time),
-            'lon': origin.longitude,
-            'lat': origin.latitude,
-            'dir': directionStr,
-            'depth': 1.0e-3*origin.depth,
-            'mag': magnitude.mag,
-            'magtype': magnitude.magnitude_type})
+    def _printEvents(self, table, indices):
+        """
+        Print events in table, with the local times of all events
+        formatted together.
+        """
+        if len(indices) == 0:
+            return
+        tstamps = self.formatter.format(table["time"][indices])
+        data = table[indices]
+        rows = zip(tstamps, data["longitude"].tolist(), data["latitude"].tolist(), data["distance"].tolist(), data["azimuth"].tolist(), (1.0e-3*data["depth"]).tolist(), data["mag"].tolist(), table.magnitudeTypes(indices))
+        lines = []
+        for (tstamp, lon, lat, distance, azimuth, depth, mag, magType) in rows:
+            if not math.isnan(distance):
+                directionStr = "(%4.1fkm %s)" % (1.0e-3*distance, self._azimuthToString(azimuth))
+            else:
+                directionStr = "            "
+            lines.append("%(tstamp)s   %(lon)8.3f %(lat)6.3f %(dir)s  %(depth)4.1fkm  %(mag)4.2f %(magtype)s" % {
+                'tstamp': tstamp,
+                'lon': lon,
+                'lat': lat,
+                'dir': directionStr,
+                'depth': depth,
+                'mag': mag,
+                'magtype': magType})
+        print("\n".join(lines))
         return
 
 
@@ -217,12 +300,7 @@ class Summary(object):
     
 
     def _localTimestamp(self, tstamp):
-        if tstamp is None:
-            return ""
-        tUTC = pytz.utc.localize(tstamp.datetime)
-        tL = tUTC.astimezone(self.tz)
-        localFmt = "%a %b %d %Y %I:%M:%S %p %Z"
-        return tL.strftime(localFmt)
+        return self.formatter.formatOne(tstamp)
 
 
 # End of file
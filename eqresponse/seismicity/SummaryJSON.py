@@ -0,0 +1,126 @@
+# ======================================================================
+#
+#                           Brad T. Aagaard
+#                        U.S. Geological Survey
+#
+# ======================================================================
+#
+
+import json
+
+import numpy
+import pytz
+
+from eqresponse.core.TimeFormatter import TimeFormatter
+
+# ISO 8601 UTC time, as in the ComCat GeoJSON feeds.
+ISO_FORMAT = "%Y-%m-%dT%H:%M:%S.%fZ"
+
+# ----------------------------------------------------------------------
+class SummaryJSON(object):
+    """
+    Build JSON and GeoJSON versions of seismicity summaries.
+
+    Event lists are built column by column from the event table arrays.
+    The summary content is a dict with the same information as the
+    text summary; GeoJSON output holds the listed events (and mainshock)
+    as point features with the rest of the summary in a "metadata"
+    member.
+    """
+
+    def __init__(self, formatter):
+        self.formatter = formatter
+        self.utcFormatter = TimeFormatter(pytz.utc, ISO_FORMAT)
+        return
+
+
+    def events(self, table, indices):
+        """
+        Get list of events (dicts) in table.
+        """
+        if len(indices) == 0:
+            return []
+        data = table[indices]
+        columns = [
+            ("id", data["eventid"].tolist()),
+            ("time", self.utcFormatter.format(data["time"])),
+            ("local_time", self.formatter.format(data["time"])),
+            ("longitude", SummaryJSON._column(data["longitude"])),
+            ("latitude", SummaryJSON._column(data["latitude"])),
+            ("depth_km", SummaryJSON._column(1.0e-3*data["depth"])),
+            ("mag", SummaryJSON._column(data["mag"])),
+            ("magtype", table.magnitudeTypes(indices)),
+            ("distance_km", SummaryJSON._column(1.0e-3*data["distance"])),
+            ("azimuth", SummaryJSON._column(data["azimuth"])),
+            ]
+        names = [name for (name, values) in columns]
+        return [dict(zip(names, row)) for row in zip(*[values for (name, values) in columns])]
+
+
+    def timestamp(self, tstamp):
+        """
+        Get UTC and local time strings of UTCDateTime (None if not
+        available).
+        """
+        if tstamp is None:
+            return (None, None)
+        return (self.utcFormatter.formatOne(tstamp), self.formatter.formatOne(tstamp))
+
+
+    @staticmethod
+    def dumps(content, format="json"):
+        """
+        Serialize summary content as "json" or "geojson".
+        """
+        if format == "json":
+            return json.dumps(content, indent=1) + "\n"
+        elif format == "geojson":
+            features = []
+            if not content.get("mainshock") is None:
+                features.append(SummaryJSON._feature(content["mainshock"], "Mainshock"))
+            metadata = dict(content)
+            metadata.pop("mainshock", None)
+            metadata["catalogs"] = []
+            for catalog in content["catalogs"]:
+                features += [SummaryJSON._feature(event, catalog["label"]) for event in catalog["events"]]
+                catalogMetadata = dict(catalog)
+                del catalogMetadata["events"]
+                metadata["catalogs"].append(catalogMetadata)
+            collection = {
+                "type": "FeatureCollection",
+                "metadata": metadata,
+                "features": features,
+                }
+            return json.dumps(collection, separators=(",", ":")) + "\n"
+        raise ValueError("Unknown summary format '%s'." % format)
+
+
+    @staticmethod
+    def _feature(event, label):
+        properties = dict(event)
+        properties["catalog"] = label
+        for name in ("id", "longitude", "latitude", "depth_km"):
+            properties.pop(name, None)
+        return {
+            "type": "Feature",
+            "id": event["id"],
+            "geometry": {
+                "type": "Point",
+                "coordinates": [event["longitude"], event["latitude"], event["depth_km"]],
+                },
+            "properties": properties,
+            }
+
+
+    @staticmethod
+    def _column(values):
+        """
+        Convert array to list with None for NaN (not allowed in JSON).
+        """
+        mask = numpy.isnan(values)
+        if not numpy.any(mask):
+            return values.tolist()
+        return numpy.where(mask, None, values.astype(object)).tolist()
+
+
+# End of file
@@ -7,12 +7,15 @@
 #
 
 import numpy
-import pytz
 import datetime
 import math
 
 from obspy.core.utcdatetime import UTCDateTime
 
+from eqresponse.core.TimeFormatter import TimeFormatter
+from eqresponse.seismicity.SummaryJSON import SummaryJSON
+from eqresponse.seismicity.Tally import Tally
+
 # ----------------------------------------------------------------------
 class SummarySequences(object):
 
@@ -21,20 +24,18 @@ class SummarySequences(object):
         self.params = params
         self.now = now
         self.tz = tz
+        self.formatter = TimeFormatter(tz)
         return
 
 
     def show(self, background, sequences):
-        (datacenter, catalog) = self.params.get("catalog")
-        if datacenter == "USGS":
-            datacenter = "ANSS ComCat"
-        print("Source: %s %s catalog" % (datacenter, catalog))
+        print("Source: %s %s catalog" % self._source())
 
         print("Seismicity within %(dist)3.1f km of %(lon)8.3f %(lat)7.3f (as of %(date)s)." % {
             'dist': self.params.get("background/maxdist_km"),
             'lon': self.params.get("background/longitude"),
             'lat': self.params.get("background/latitude"),
-            'date': self._localTimestamp(background.events.creation_info.creation_time),
+            'date': self._localTimestamp(background.table.creationTime),
         })
 
         # Background
@@ -47,8 +48,68 @@ class SummarySequences(object):
         return
 
 
+    def content(self, background, sequences):
+        """
+        Get summary as a dict with the same information as the text
+        summary.
+        """
+        writer = SummaryJSON(self.formatter)
+        (datacenter, catalogName) = self._source()
+
+        catalogs = []
+        listMinMag = self.params.get("summary/list_minmag")
+        for (catalog, label) in [(background, "Background")] + [(sequence, sequence.params['label']) for sequence in sequences]:
+            if catalog.count() == 0:
+                continue
+            table = catalog.table
+            (binsMag, count) = self._tally(table, minmag=math.floor(catalog.params['minmag']))
+            entry = {
+                "label": label,
+                "minmag": catalog.params['minmag'],
+                "tallies": [{
+                    "timing": None,
+                    "intervals": ["Total"],
+                    "minmags": binsMag.tolist(),
+                    "counts": count.reshape((-1, 1)).tolist(),
+                    }],
+                "list_minmag": listMinMag,
+                "events": writer.events(table, numpy.nonzero(table["mag"] >= listMinMag)[0]),
+                }
+            (entry["start"], entry["start_local"]) = writer.timestamp(UTCDateTime(catalog.params['start']))
+            (entry["end"], entry["end_local"]) = writer.timestamp(UTCDateTime(catalog.params['end']))
+            catalogs.append(entry)
+
+        content = {
+            "source": {"datacenter": datacenter, "catalog": catalogName},
+            "generated": writer.timestamp(self.now)[0],
+            "time_zone": str(self.tz),
+            "region": {
+                "maxdist_km": self.params.get("background/maxdist_km"),
+                "longitude": self.params.get("background/longitude"),
+                "latitude": self.params.get("background/latitude"),
+                },
+            "catalogs": catalogs,
+            }
+        (content["as_of"], content["as_of_local"]) = writer.timestamp(background.table.creationTime if not background.table is None else None)
+        return content
+
+
+    def dumps(self, background, sequences, format="json"):
+        """
+        Get summary as "json" or "geojson" string.
+        """
+        return SummaryJSON.dumps(self.content(background, sequences), format)
+
+
+    def _source(self):
+        (datacenter, catalog) = self.params.get("catalog")
+        if datacenter == "USGS":
+            datacenter = "ANSS ComCat"
+        return (datacenter, catalog)
+
+
     def _printCatalog(self, catalog, label):
-        if catalog.events is None or catalog.events.count() == 0:
+        if catalog.count() == 0:
             return
 
         listMinMag = self.params.get("summary/list_minmag")
@@ -60,29 +121,27 @@ class SummarySequences(object):
             'end': self._localTimestamp(UTCDateTime(catalog.params['end'])),
         })
 
-        self._printTally(catalog.events, minmag=math.floor(catalog.params['minmag']))
+        table = catalog.table
+        self._printTally(table, minmag=math.floor(catalog.params['minmag']))
 
-        eventsF = catalog.events.filter("magnitude >= %3.1f" % listMinMag)
+        indices = numpy.nonzero(table["mag"] >= listMinMag)[0]
         print("\nM >= %3.1f" % listMinMag)
-        for event in eventsF:
-            self._printEvent(event)
+        self._printEvents(table, indices)
 
         return
                             
 
-    def _printTally(self, events, minmag=1.0):
-        maxmag = 0.0
-        for event in events:
-            mag = event.preferred_magnitude().mag
-            if mag > maxmag:
-                maxmag = mag
-        maxmag = math.floor(maxmag)
+    def _tally(self, table, minmag=1.0):
+        """
+        Get magnitude bins and number of events in each bin.
+        """
+        maxmag = math.floor(max(0.0, numpy.max(table["mag"])))
         binsMag = numpy.arange(minmag, maxmag+0.001, 1.0)[::-1]
+        return (binsMag, Tally(table).count(binsMag))
 
-        count = numpy.zeros((binsMag.shape[0],))
-        for irow,binMag in enumerate(binsMag):
-            eventsM = events.filter('magnitude >= %3.1f' % binMag)
-            count[irow] = eventsM.count()
+
+    def _printTally(self, table, minmag=1.0):
+        (binsMag, count) = self._tally(table, minmag)
 
         # Heading
         hline = "    "
@@ -94,27 +153,31 @@ class SummarySequences(object):
         return
 
     
-    def _printEvent(self, event):
-
-        magnitude = event.preferred_magnitude()
-        origin = event.preferred_origin()
-        print("%(tstamp)-32s   %(lon)8.3f %(lat)6.3f %(depth)4.1fkm  %(mag)4.2f %(magtype)s" % {
-            'tstamp': self._localTimestamp(origin.time),
-            'lon': origin.longitude,
-            'lat': origin.latitude,
-            'depth': 1.0e-3*origin.depth,
-            'mag': magnitude.mag,
-            'magtype': magnitude.magnitude_type})
+    def _printEvents(self, table, indices):
+        """
+        Print events in table, with the local times of all events
+        formatted together.
+        """
+        if len(indices) == 0:
+            return
+        tstamps = self.formatter.format(table["time"][indices])
+        data = table[indices]
+        rows = zip(tstamps, data["longitude"].tolist(), data["latitude"].tolist(), (1.0e-3*data["depth"]).tolist(), data["mag"].tolist(), table.magnitudeTypes(indices))
+        lines = []
+        for (tstamp, lon, lat, depth, mag, magType) in rows:
+            lines.append("%(tstamp)-32s   %(lon)8.3f %(lat)6.3f %(depth)4.1fkm  %(mag)4.2f %(magtype)s" % {
+                'tstamp': tstamp,
+                'lon': lon,
+                'lat': lat,
+                'depth': depth,
+                'mag': mag,
+                'magtype': magType})
+        print("\n".join(lines))
         return
 
 
     def _localTimestamp(self, tstamp):
-        if tstamp is None:
-            return ""
-        tUTC = pytz.utc.localize(tstamp.datetime)
-        tL = tUTC.astimezone(self.tz)
-        localFmt = "%a %b %d %Y %I:%M:%S %p %Z"
-        return tL.strftime(localFmt)
+        return self.formatter.formatOne(tstamp)
 
 
 # End of file
@@ -0,0 +1,116 @@
+# ======================================================================
+#
+#                           Brad T. Aagaard
+#                        U.S. Geological Survey
+#
+# ======================================================================
+#
+
+import numpy
+
+
+# ----------------------------------------------------------------------
+class Tally(object):
+    """
+    Cumulative counts of events by magnitude and time thresholds.
+
+    Each event is assigned to a (magnitude, time) cell with one binary
+    search against the sorted thresholds, so the cost is independent of
+    the number of thresholds. Cumulative counts follow from prefix sums
+    over the cell counts.
+    """
+
+    def __init__(self, table):
+        self.mag = table["mag"]
+        self.time = table["time"]
+        return
+
+
+    def count(self, binsMag, binsTime=None, op=">="):
+        """
+        Count events with magnitude >= binsMag[i] and time satisfying
+        'op' (">=" or "<=") with respect to binsTime[j].
+
+        Returns array with shape (len(binsMag), len(binsTime)+1). The last
+        column is the total number of events with magnitude >= binsMag[i].
+        Without binsTime, returns array with shape (len(binsMag),).
+        """
+        binsMag = numpy.asarray(binsMag, dtype=numpy.float64)
+        orderM = numpy.argsort(binsMag)
+        magsAsc = binsMag[orderM]
+        nmag = magsAsc.shape[0]
+
+        # Number of magnitude thresholds each event meets.
+        cellM = numpy.searchsorted(magsAsc, self.mag, side="right")
+        cellM[numpy.isnan(self.mag)] = 0
+
+        if binsTime is None:
+            countM = numpy.bincount(cellM, minlength=nmag+1)
+            cumM = numpy.cumsum(countM[::-1])[::-1][1:]
+            count = numpy.zeros(nmag, dtype=numpy.int64)
+            count[orderM] = cumM
+            return count
+
+        binsTime = numpy.asarray(binsTime, dtype=numpy.float64)
+        orderT = numpy.argsort(binsTime)
+        timesAsc = binsTime[orderT]
+        ntime = timesAsc.shape[0]
+
+        if op == ">=":
+            # Number of time thresholds <= event time.
+            cellT = numpy.searchsorted(timesAsc, self.time, side="right")
+        elif op == "<=":
+            # Number of time thresholds < event time.
+            cellT = numpy.searchsorted(timesAsc, self.time, side="left")
+        else:
+            raise ValueError("Unknown time comparison operator '%s'." % op)
+
+        cells = numpy.bincount(cellM*(ntime+1)+cellT, minlength=(nmag+1)*(ntime+1)).reshape((nmag+1, ntime+1))
+        cumM = numpy.cumsum(cells[::-1,:], axis=0)[::-1,:][1:,:]
+        if op == ">=":
+            cumT = numpy.cumsum(cumM[:,::-1], axis=1)[:,::-1][:,1:]
+        else:
+            cumT = numpy.cumsum(cumM, axis=1)[:,:-1]
+
+        count = numpy.zeros((nmag, ntime+1), dtype=numpy.int64)
+        count[numpy.ix_(orderM, orderT)] = cumT
+        count[orderM,-1] = numpy.sum(cumM, axis=1)
+        return count
+
+
+    @staticmethod
+    def timeBins(timing, tintervals, originTime, now):
+        """
+        Get time thresholds (POSIX timestamps), comparison operator, and
+        column description for timing relative to the mainshock.
+
+        timing = "before_mainshock": events within tinterval before the mainshock.
+        timing = "after_mainshock": events within tinterval after the mainshock.
+        timing = "before_now": events within tinterval before now.
+        """
+        bins = []
+        if timing == "before_mainshock":
+            for t in tintervals:
+                bins.append(originTime - t)
+            op = ">="
+            tdescription = "Prior"
+        elif timing == "after_mainshock":
+            for t in tintervals:
+                if now < originTime + t:
+                    break
+                bins.append(originTime + t)
+            op = "<="
+            tdescription = "First"
+        elif timing == "before_now":
+            for t in tintervals:
+                if now - t < originTime:
+                    break
+                bins.append(now - t)
+            op = ">="
+            tdescription = "Past"
+        else:
+            raise ValueError("Unknown timing '%s'." % timing)
+        return (numpy.array(bins, dtype=numpy.float64), op, tdescription)
+
+
+# End of file
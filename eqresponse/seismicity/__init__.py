@@ -10,8 +10,18 @@
 
 __all__ = [
     "Catalog",
+    "CatalogCache",
+    "Decluster",
+    "EventStore",
+    "EventTable",
+    "FreqMag",
+    "GeoJSONReader",
+    "QuakeMLReader",
+    "SpatialIndex",
     "Summary",
+    "SummaryJSON",
     "SummarySequences",
+    "Tally",
 ]
 
 
@@ -21,9 +21,11 @@ setup(name='eqresponse',
           'eqresponse/apps',
           'eqresponse/seismicity',
           'eqresponse/core',
+          'eqresponse/plot',
           ],
       scripts=[
           'bin/eqresponse_identify',
+          'bin/eqresponse_ingest',
           'bin/eqresponse_seismicity',
           'bin/eqresponse_sequences',
           ]
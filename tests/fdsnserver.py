@@ -0,0 +1,189 @@
+# ======================================================================
+#
+#                           Brad T. Aagaard
+#                        U.S. Geological Survey
+#
+# ======================================================================
+#
+# Stand-in FDSN event web service for tests.
+#
+# Serves the query, count, version, and application.wadl methods of
+# fdsnws/event/1 on localhost from a list of events that tests can
+# change between requests. Queries are selected by time, update time,
+# minimum magnitude, and distance (degrees) as by the data centers.
+
+import math
+import threading
+import http.server
+import socketserver
+import urllib.parse
+
+import numpy
+
+QUERY_PARAMS = ["starttime", "endtime", "updatedafter", "minlatitude", "maxlatitude", "minlongitude", "maxlongitude", "latitude", "longitude", "maxradius", "mindepth", "maxdepth", "minmagnitude", "maxmagnitude", "orderby", "catalog", "eventid", "limit", "format"]
+
+WADL = """<?xml version="1.0"?>
+<application xmlns="http://wadl.dev.java.net/2009/02" xmlns:xs="http://www.w3.org/2001/XMLSchema">
+  <resources base="%(base)s/fdsnws/event/1/">
+    <resource path="query">
+      <method id="query" name="GET">
+        <request>
+%(params)s
+        </request>
+      </method>
+    </resource>
+  </resources>
+</application>
+"""
+
+QUAKEML_HEADER = """<?xml version='1.0' encoding='utf-8'?>
+<q:quakeml xmlns:q="http://quakeml.org/xmlns/quakeml/1.2" xmlns="http://quakeml.org/xmlns/bed/1.2">
+  <eventParameters publicID="smi:local/catalog/fdsnserver">
+"""
+
+QUAKEML_EVENT = """    <event publicID="quakeml:earthquake.usgs.gov/fdsnws/event/1/query?eventid=%(eventid)s&amp;format=quakeml">
+      <preferredOriginID>smi:local/origin/%(eventid)s</preferredOriginID>
+      <preferredMagnitudeID>smi:local/magnitude/%(eventid)s</preferredMagnitudeID>
+      <origin publicID="smi:local/origin/%(eventid)s">
+        <time><value>%(time)s</value></time>
+        <longitude><value>%(longitude).5f</value></longitude>
+        <latitude><value>%(latitude).5f</value></latitude>
+        <depth><value>%(depth).1f</value></depth>
+      </origin>
+      <magnitude publicID="smi:local/magnitude/%(eventid)s">
+        <mag><value>%(mag).2f</value></mag>
+        <type>ml</type>
+      </magnitude>
+      <creationInfo><creationTime>%(updated)s</creationTime></creationInfo>
+    </event>
+"""
+
+QUAKEML_FOOTER = """    <creationInfo><creationTime>%(created)s</creationTime></creationInfo>
+  </eventParameters>
+</q:quakeml>
+"""
+
+# ----------------------------------------------------------------------
+class FDSNServer(object):
+    """
+    Stand-in FDSN event web service.
+
+    Events are dictionaries with eventid, time, longitude, latitude,
+    depth (m), mag, and updated; times are POSIX timestamps. The
+    parameters of every request are recorded in requests as (method,
+    parameters).
+    """
+
+    def __init__(self, events=None):
+        self.events = list(events or [])
+        self.requests = []
+        self._server = None
+        return
+
+
+    def start(self):
+        server = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                (code, body) = server._respond(self.path)
+                self.send_response(code)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                return
+
+            def log_message(self, *args):
+                return
+
+        self._server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return
+
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        return
+
+
+    @property
+    def url(self):
+        return "http://127.0.0.1:%d" % self._server.server_address[1]
+
+
+    def queries(self, method="query"):
+        """
+        Get parameters of requests to method.
+        """
+        return [params for (name, params) in self.requests if name == method]
+
+
+    def _respond(self, path):
+        parsed = urllib.parse.urlparse(path)
+        prefix = "/fdsnws/event/1/"
+        if not parsed.path.startswith(prefix):
+            return (404, b"")
+        method = parsed.path[len(prefix):]
+        params = dict(urllib.parse.parse_qsl(parsed.query))
+        self.requests.append((method, params))
+        if method == "version":
+            return (200, b"1.2.0")
+        elif method == "application.wadl":
+            lines = ['          <param name="%s" style="query"/>' % name for name in QUERY_PARAMS]
+            return (200, (WADL % {'base': self.url, 'params': "\n".join(lines)}).encode("utf-8"))
+        elif method == "count":
+            return (200, ("%d\n" % len(self._select(params))).encode("ascii"))
+        elif method == "query":
+            events = self._select(params)
+            if len(events) == 0:
+                return (204, b"")
+            return (200, self._quakeml(events))
+        return (404, b"")
+
+
+    def _select(self, params):
+        from obspy.core.utcdatetime import UTCDateTime
+
+        events = []
+        for event in self.events:
+            if "starttime" in params and event["time"] < UTCDateTime(params["starttime"]).timestamp:
+                continue
+            if "endtime" in params and event["time"] > UTCDateTime(params["endtime"]).timestamp:
+                continue
+            if "updatedafter" in params and event["updated"] <= UTCDateTime(params["updatedafter"]).timestamp:
+                continue
+            if "minmagnitude" in params and event["mag"] < float(params["minmagnitude"]):
+                continue
+            if "maxradius" in params and self._distance(event, float(params["longitude"]), float(params["latitude"])) > float(params["maxradius"]):
+                continue
+            events.append(event)
+        return sorted(events, key=lambda event: event["time"])
+
+
+    @staticmethod
+    def _distance(event, longitude, latitude):
+        lat0 = math.radians(latitude)
+        lat = math.radians(event["latitude"])
+        dlon = math.radians(event["longitude"] - longitude)
+        h = math.sin(0.5*(lat-lat0))**2 + math.cos(lat0)*math.cos(lat)*math.sin(0.5*dlon)**2
+        return math.degrees(2.0*math.asin(math.sqrt(min(h, 1.0))))
+
+
+    @staticmethod
+    def _quakeml(events):
+        isoformat = lambda t: numpy.datetime_as_string(numpy.datetime64(int(round(1.0e+6*t)), "us"), unit="ms") + "Z"
+        lines = [QUAKEML_HEADER]
+        for event in events:
+            values = dict(event)
+            values["time"] = isoformat(event["time"])
+            values["updated"] = isoformat(event["updated"])
+            lines.append(QUAKEML_EVENT % values)
+        lines.append(QUAKEML_FOOTER % {'created': isoformat(max([event["updated"] for event in events]))})
+        return "".join(lines).encode("utf-8")
+
+
+# End of file
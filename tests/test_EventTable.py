@@ -0,0 +1,66 @@
+# ======================================================================
+#
+#                           Brad T. Aagaard
+#                        U.S. Geological Survey
+#
+# ======================================================================
+#
+# Tests of event tables with event ids longer than the default length.
+#
+# Run with: python -m unittest discover tests
+
+import os
+import sys
+import json
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy
+
+from eqresponse.seismicity.EventTable import EventTable, EVENT_DTYPE, EVENT_ID_LENGTH
+from eqresponse.seismicity.GeoJSONReader import GeoJSONReader
+
+LONG_ID = "ci" + "0"*(2*EVENT_ID_LENGTH)
+
+# ----------------------------------------------------------------------
+class TestEventTable(unittest.TestCase):
+
+    def setUp(self):
+        features = []
+        for (eventid, mag) in [(LONG_ID, 3.0), ("ci38457511", 7.1)]:
+            features.append({
+                'id': eventid,
+                'properties': {'time': 1.562383193e+12, 'mag': mag, 'magType': "ml", 'updated': 1.562383193e+12},
+                'geometry': {'coordinates': [-117.6, 35.77, 8.0]},
+                })
+        self.table = GeoJSONReader().loads(json.dumps({'type': "FeatureCollection", 'features': features}))
+        return
+
+
+    def test_read(self):
+        self.assertEqual([LONG_ID, "ci38457511"], self.table.data["eventid"].tolist())
+        return
+
+
+    def test_concatenate(self):
+        data = numpy.zeros((1,), dtype=EVENT_DTYPE)
+        data["eventid"] = "nc73201181"
+        table = EventTable.concatenate([EventTable(data, []), self.table])
+        self.assertEqual(["nc73201181", LONG_ID, "ci38457511"], table.data["eventid"].tolist())
+        self.assertEqual(len(LONG_ID), EventTable.idLengthOf(table.data))
+        return
+
+
+    def test_makeDtype(self):
+        self.assertEqual(EVENT_DTYPE, EventTable.makeDtype(0))
+        self.assertEqual(EVENT_DTYPE, EventTable.makeDtype(EVENT_ID_LENGTH))
+        self.assertEqual(EVENT_DTYPE.names, EventTable.makeDtype(EVENT_ID_LENGTH+1).names)
+        return
+
+
+if __name__ == "__main__":
+    unittest.main()
+
+
+# End of file
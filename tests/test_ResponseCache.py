@@ -0,0 +1,152 @@
+# ======================================================================
+#
+#                           Brad T. Aagaard
+#                        U.S. Geological Survey
+#
+# ======================================================================
+#
+# Tests of the FDSN response cache against a stand-in FDSN server.
+#
+# Run with: python -m unittest discover tests
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from fdsnserver import FDSNServer
+
+from obspy.core.utcdatetime import UTCDateTime
+
+from eqresponse.core.ResponseCache import ResponseCache
+from eqresponse.seismicity.Catalog import Catalog
+
+LONGITUDE = -122.0
+LATITUDE = 37.0
+
+# Update time of events in the initial catalog (well before the cache
+# revalidation margin).
+UPDATED = UTCDateTime("2020-01-01T00:00:00").timestamp
+
+# ----------------------------------------------------------------------
+class TestResponseCache(unittest.TestCase):
+
+    def setUp(self):
+        t0 = UTCDateTime("2019-07-06T03:19:53").timestamp
+        events = []
+        for i in range(10):
+            events.append({
+                'eventid': "ts%04d" % i,
+                'time': t0 + 3600.0*i,
+                'longitude': LONGITUDE + 0.01*i,
+                'latitude': LATITUDE,
+                'depth': 8.0e+3,
+                'mag': 2.0 + 0.1*i,
+                'updated': UPDATED,
+                })
+        self.server = FDSNServer(events)
+        self.server.start()
+        self.directory = tempfile.mkdtemp()
+        self.cache = ResponseCache(self.directory)
+        return
+
+
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.directory)
+        return
+
+
+    def fetch(self, ttl, starttime="2019-07-06T00:00:00", endtime="2019-07-08T00:00:00", maxEvents=None):
+        catalog = Catalog()
+        catalog.fetch(
+            starttime=UTCDateTime(starttime),
+            endtime=UTCDateTime(endtime),
+            longitude=LONGITUDE,
+            latitude=LATITUDE,
+            maxdist=1.0,
+            minmag=0.0,
+            catalog=(self.server.url, ""),
+            maxEvents=maxEvents,
+            cache=self.cache,
+            ttl=ttl)
+        return catalog
+
+
+    def test_hit(self):
+        catalog = self.fetch(ttl=3600.0)
+        self.assertEqual(10, catalog.count())
+        nqueries = len(self.server.queries())
+
+        catalog = self.fetch(ttl=3600.0)
+        self.assertEqual(10, catalog.count())
+        self.assertEqual(nqueries, len(self.server.queries()))
+        return
+
+
+    def test_revalidate_unchanged(self):
+        self.fetch(ttl=0.0)
+        nqueries = len(self.server.queries())
+
+        catalog = self.fetch(ttl=0.0)
+        self.assertEqual(10, catalog.count())
+        queries = self.server.queries()[nqueries:]
+        self.assertEqual(1, len(queries))
+        self.assertTrue("updatedafter" in queries[0])
+        return
+
+
+    def test_revalidate_changed(self):
+        self.fetch(ttl=0.0)
+        nqueries = len(self.server.queries())
+
+        now = time.time()
+        self.server.events[3]["mag"] = 4.5
+        self.server.events[3]["updated"] = now
+        self.server.events.append({
+            'eventid': "ts0010",
+            'time': self.server.events[-1]["time"] + 60.0,
+            'longitude': LONGITUDE,
+            'latitude': LATITUDE,
+            'depth': 5.0e+3,
+            'mag': 3.0,
+            'updated': now,
+            })
+
+        catalog = self.fetch(ttl=0.0)
+        self.assertEqual(11, catalog.count())
+        self.assertEqual(4.5, catalog.table["mag"][3])
+        self.assertEqual("ts0010", catalog.table["eventid"][-1])
+        queries = self.server.queries()[nqueries:]
+        self.assertEqual(1, len(queries))
+        self.assertTrue("updatedafter" in queries[0])
+
+        # Merged response is cached.
+        catalog = self.fetch(ttl=3600.0)
+        self.assertEqual(11, catalog.count())
+        self.assertEqual(nqueries+1, len(self.server.queries()))
+        return
+
+
+    def test_empty(self):
+        # Single query and query split into time windows.
+        for (starttime, endtime, maxEvents) in [("2018-01-01", "2018-02-01", None), ("2018-03-01", "2018-04-01", 100)]:
+            catalog = self.fetch(ttl=3600.0, starttime=starttime, endtime=endtime, maxEvents=maxEvents)
+            self.assertEqual(0, catalog.count())
+            nqueries = len(self.server.queries())
+
+            catalog = self.fetch(ttl=3600.0, starttime=starttime, endtime=endtime, maxEvents=maxEvents)
+            self.assertEqual(0, catalog.count())
+            self.assertEqual(nqueries, len(self.server.queries()))
+        return
+
+
+if __name__ == "__main__":
+    unittest.main()
+
+
+# End of file